@@ -3,7 +3,9 @@ import atexit
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
-from database import init_db
+from logging_setup import setup_logging
+from database import init_db, init_app, get_pool_stats, wal_checkpointer
+from service_runner import service_runner
 from routes.auth import auth_bp
 from routes.dashboard import dashboard_bp
 from routes.settings import settings_bp
@@ -21,62 +23,30 @@ from services import (
     slippage_tracker
 )
 
+# Structured logging before anything starts logging (non-blocking queue handler)
+setup_logging()
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Release pooled DB connections at the end of every request
+init_app(app)
+
 # Enable CORS for frontend
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# Initialize database
-with app.app_context():
-    init_db()
-    # Run migrations
-    try:
-        from migrations.add_demo_mode import run_migration
-        run_migration()
-        from migrations.add_auto_close import run_migration as run_auto_close_migration
-        run_auto_close_migration()
-        from migrations.repair_database import repair_database
-        repair_database()
-        from migrations.add_risk_management import run_migration as run_risk_migration
-        run_risk_migration()
-        from migrations.add_professional_safety import run_migration as run_safety_migration
-        run_safety_migration()
-    except Exception as e:
-        print(f"⚠️ Migration warning: {str(e)}")
-
-# Start Professional Trading Services
-print("🚀 Iniciando Price Monitor...")
-try:
-    price_monitor.start()
-except Exception as e:
-    print(f"⚠️ Error iniciando Price Monitor: {str(e)}")
-
-print("🔌 Iniciando WebSocket Service (Real-Time Prices)...")
-try:
-    realtime_price_service.start()
-except Exception as e:
-    print(f"⚠️ Error iniciando WebSocket Service: {str(e)}")
-
-print("💓 Iniciando Heartbeat Monitor...")
+# Initialize database (applies only pending migrations)
 try:
-    heartbeat_monitor.start()
+    init_db()
 except Exception as e:
-    print(f"⚠️ Error iniciando Heartbeat Monitor: {str(e)}")
+    print(f"⚠️ Migration warning: {str(e)}")
 
-print("✅ Servicios profesionales iniciados")
+# Start Professional Trading Services (only in the elected process, see service_runner.py)
+service_runner.start()
 
 # Clean shutdown
-def cleanup():
-    try:
-        print("🛑 Deteniendo servicios...")
-        price_monitor.stop()
-        realtime_price_service.stop()
-    except Exception as e:
-        print(f"⚠️ Error deteniendo servicios: {str(e)}")
-
-atexit.register(cleanup)
+atexit.register(service_runner.stop)
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -90,6 +60,19 @@ app.register_blueprint(safety_bp, url_prefix='/safety')
 def health_check():
     return jsonify({'status': 'healthy'}), 200
 
+@app.route('/health/db', methods=['GET'])
+def db_health():
+    """Connection pool metrics (wait time and saturation)"""
+    return jsonify({
+        'pools': get_pool_stats(),
+        'checkpointer': wal_checkpointer.get_status()
+    }), 200
+
+@app.route('/health/services', methods=['GET'])
+def services_health():
+    """Which process owns the background loops"""
+    return jsonify(service_runner.get_status()), 200
+
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({
@@ -97,7 +80,7 @@ def root():
         'version': '2.0.0-PRO',
         'endpoints': {
             'auth': '/auth/register, /auth/login, /auth/me',
-            'dashboard': '/dashboard/stats, /dashboard/positions, /dashboard/toggle-bot',
+            'dashboard': '/dashboard/stats, /dashboard/positions, /dashboard/toggle-bot, /dashboard/snapshot, /dashboard/stream (SSE)',
             'settings': '/settings/config, /settings/broker',
             'webhook': '/webhook',
             'safety': '/safety/panic/kill-switch, /safety/heartbeat/status, /safety/cooldowns/active, /safety/slippage/stats'
@@ -0,0 +1,212 @@
+"""
+Benchmark: GET /dashboard/analytics
+Cálculo completo (recorre todos los trades cerrados y toda la equity curve en
+cada lectura) vs. analytics_state (agregados mantenidos por triggers)
+
+Historial aleatorio con trades en 0, cierres fuera de orden, pnl editados,
+reaperturas y borrados, para verificar que los dos caminos dan lo mismo.
+
+Uso:
+    python benchmarks/bench_analytics.py [--users 200] [--trades 500] [--equity 2000] [--reads 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import connect
+from migrations.runner import MIGRATIONS
+from services.analytics_service import AnalyticsService
+
+
+def full_scan(conn, user_id):
+    """Lo que hacían calculate_win_rate / calculate_drawdown / get_consecutive_wins_losses antes"""
+    pnls = [row[0] for row in conn.execute('''
+        SELECT pnl FROM positions
+        WHERE user_id = ? AND status = 'closed' AND pnl IS NOT NULL
+        ORDER BY closed_at DESC
+    ''', (user_id,))]
+    equities = [row[0] for row in conn.execute('''
+        SELECT equity FROM equity_curve WHERE user_id = ? ORDER BY timestamp ASC
+    ''', (user_id,))]
+
+    wins = [p for p in pnls if p > 0]
+    losses = [p for p in pnls if p < 0]
+    win_rate = {
+        'total_trades': len(pnls),
+        'winning_trades': len(wins),
+        'losing_trades': len(losses),
+        'win_rate': round(len(wins) / len(pnls) * 100, 2) if pnls else 0.0,
+        'avg_profit': round(sum(wins) / len(wins), 2) if wins else 0.0,
+        'avg_loss': round(sum(losses) / len(losses), 2) if losses else 0.0,
+        'largest_win': round(max(wins), 2) if wins else 0.0,
+        'largest_loss': round(min(losses), 2) if losses else 0.0,
+        'profit_factor': round(sum(wins) / abs(sum(losses)), 2) if losses else 0.0
+    }
+
+    peak, max_dd, current_dd = (equities[0] if equities else 0), 0, 0
+    for equity in equities:
+        peak = max(peak, equity)
+        current_dd = peak - equity
+        max_dd = max(max_dd, current_dd)
+    drawdown = {
+        'max_drawdown': round(max_dd, 2),
+        'max_drawdown_percent': round(max_dd / peak * 100, 2) if peak > 0 else 0.0,
+        'current_drawdown': round(current_dd, 2),
+        'current_drawdown_percent': round(current_dd / peak * 100, 2) if peak > 0 else 0.0
+    }
+
+    wins_streak = losses_streak = 0
+    first = next((p for p in pnls if p != 0), 0)
+    if first > 0:
+        wins_streak = 1 + next((i for i, p in enumerate(pnls[1:]) if p <= 0), len(pnls) - 1)
+    elif first < 0:
+        losses_streak = 1 + next((i for i, p in enumerate(pnls[1:]) if p >= 0), len(pnls) - 1)
+
+    return {**win_rate, **drawdown,
+            'consecutive_wins': wins_streak, 'consecutive_losses': losses_streak}
+
+
+def incremental(service, user_id):
+    state = service.get_state(user_id)
+    return {**service.calculate_win_rate(user_id, state),
+            **service.calculate_drawdown(user_id, state),
+            **service.get_consecutive_wins_losses(user_id, state)}
+
+
+def random_pnl():
+    return random.choice([0.0, round(random.uniform(-500, 500), 2)] + [round(random.uniform(-500, 500), 2)] * 4)
+
+
+def setup_database(path, users):
+    conn = connect(path)
+    cursor = conn.cursor()
+    for _, _, upgrade in MIGRATIONS:
+        upgrade(cursor)
+    cursor.executemany(
+        "INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')",
+        [(i, f"user{i}@bench.local") for i in range(1, users + 1)]
+    )
+    conn.commit()
+    return conn
+
+
+def load_history(conn, users, trades, equity, start_minute=0, out_of_order=0.0):
+    """Cierres y snapshots por el camino normal (abrir, cerrar, snapshot): los aplican los triggers"""
+    cursor = conn.cursor()
+    start = datetime(2025, 1, 1)
+    for user_id in range(1, users + 1):
+        for i in range(start_minute, start_minute + trades):
+            cursor.execute('''
+                INSERT INTO positions (user_id, symbol, side, quantity, entry_price, status, opened_at)
+                VALUES (?, 'BTCUSD', 'BUY', 1, 100, 'open', ?)
+            ''', (user_id, (start + timedelta(minutes=i)).isoformat()))
+            # Una fracción cierra con closed_at anterior al último cierre
+            offset = i - random.randint(1, 50) if random.random() < out_of_order else i
+            cursor.execute('''
+                UPDATE positions SET status = 'closed', pnl = ?, closed_at = ? WHERE id = ?
+            ''', (random_pnl(), (start + timedelta(minutes=offset, seconds=random.random())).isoformat(),
+                  cursor.lastrowid))
+
+        balance = 10000.0
+        for i in range(start_minute, start_minute + equity):
+            balance += random.uniform(-50, 50)
+            cursor.execute('''
+                INSERT INTO equity_curve (user_id, equity, timestamp) VALUES (?, ?, ?)
+            ''', (user_id, balance, (start + timedelta(minutes=i)).isoformat()))
+    conn.commit()
+
+
+def mutate(conn, users):
+    """Ediciones fuera del camino normal: todas marcan dirty"""
+    cursor = conn.cursor()
+    for user_id in random.sample(range(1, users + 1), max(1, users // 10)):
+        ids = [row[0] for row in cursor.execute(
+            "SELECT id FROM positions WHERE user_id = ? AND status = 'closed'", (user_id,))]
+        if not ids:
+            continue
+        action = random.choice(['edit', 'reopen', 'delete', 'equity'])
+        if action == 'edit':
+            cursor.execute("UPDATE positions SET pnl = ? WHERE id = ?", (random_pnl(), random.choice(ids)))
+        elif action == 'reopen':
+            cursor.execute("UPDATE positions SET status = 'open' WHERE id = ?", (random.choice(ids),))
+        elif action == 'delete':
+            cursor.execute("DELETE FROM positions WHERE id = ?", (random.choice(ids),))
+        else:
+            cursor.execute('''
+                DELETE FROM equity_curve WHERE id = (
+                    SELECT id FROM equity_curve WHERE user_id = ? ORDER BY RANDOM() LIMIT 1
+                )
+            ''', (user_id,))
+    conn.commit()
+
+
+def verify(conn, service, users):
+    """Usuarios con alguna métrica distinta entre los dos caminos"""
+    differences = 0
+    for user_id in range(1, users + 1):
+        expected, actual = full_scan(conn, user_id), incremental(service, user_id)
+        # Las sumas en otro orden pueden redondear distinto en el medio centavo
+        if any(abs(expected[key] - actual[key]) > 0.011 for key in expected):
+            differences += 1
+    return differences
+
+
+def timed(label, fn, users, reads):
+    timings = []
+    for _ in range(reads):
+        for user_id in range(1, users + 1):
+            start = time.perf_counter()
+            fn(user_id)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{label:<12} median {timings[len(timings) // 2]:>8.3f} ms   "
+          f"p99 {timings[int(len(timings) * 0.99)]:>8.3f} ms   max {timings[-1]:>8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--trades', type=int, default=500)
+    parser.add_argument('--equity', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.DATABASE_PATH = os.path.join(tmp, 'analytics.db')
+        print(f"users={args.users} trades={args.trades} equity={args.equity}\n")
+        conn = setup_database(Config.DATABASE_PATH, args.users)
+        service = AnalyticsService()
+
+        # Primera mitad del historial sin estado: la primera lectura lo reconstruye
+        load_history(conn, args.users, args.trades // 2, args.equity // 2)
+        print(f"verificación (reconstrucción): {verify(conn, service, args.users)} diferencias")
+
+        # Segunda mitad por los triggers, con ~0.2% de cierres fuera de orden
+        load_history(conn, args.users, args.trades - args.trades // 2, args.equity - args.equity // 2,
+                     start_minute=max(args.trades, args.equity), out_of_order=0.002)
+        dirty = conn.execute("SELECT COUNT(*) FROM analytics_state WHERE dirty = 1").fetchone()[0]
+        print(f"verificación (triggers): {dirty}/{args.users} filas dirty, "
+              f"{verify(conn, service, args.users)} diferencias")
+
+        mutate(conn, args.users)
+        dirty = conn.execute("SELECT COUNT(*) FROM analytics_state WHERE dirty = 1").fetchone()[0]
+        print(f"verificación (editar/reabrir/borrar): {dirty} filas dirty, "
+              f"{verify(conn, service, args.users)} diferencias\n")
+
+        timed('full scan', lambda user_id: full_scan(conn, user_id), args.users, args.reads)
+        timed('incremental', lambda user_id: incremental(service, user_id), args.users, args.reads)
+        print(f"\n{service.get_stats()}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
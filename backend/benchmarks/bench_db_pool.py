@@ -0,0 +1,120 @@
+"""
+Benchmark: pooled connections vs. open-per-call
+Simula el polling del dashboard desde muchos navegadores (3 queries por request)
+
+Uso:
+    python benchmarks/bench_db_pool.py [--threads 16] [--requests 500]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionPool
+
+
+def setup_database(path, users=200, positions_per_user=20):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            pnl REAL DEFAULT 0.0,
+            status TEXT DEFAULT 'open'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE trading_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_trades INTEGER DEFAULT 0,
+            total_profit REAL DEFAULT 0.0
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_positions_user ON positions(user_id, status)')
+    for user_id in range(1, users + 1):
+        cursor.execute('INSERT INTO trading_stats (user_id) VALUES (?)', (user_id,))
+        cursor.executemany(
+            'INSERT INTO positions (user_id, symbol, pnl) VALUES (?, ?, ?)',
+            [(user_id, 'BTCUSD', i * 1.5) for i in range(positions_per_user)]
+        )
+    conn.commit()
+    conn.close()
+
+
+def dashboard_queries(get_conn, release, user_id):
+    """Equivalente a /dashboard/stats + /dashboard/positions"""
+    for sql in (
+        'SELECT total_trades, total_profit FROM trading_stats WHERE user_id = ?',
+        "SELECT COUNT(*) FROM positions WHERE user_id = ? AND status = 'open'",
+        'SELECT id, symbol, pnl FROM positions WHERE user_id = ?',
+    ):
+        conn = get_conn()
+        conn.execute(sql, (user_id,)).fetchall()
+        release(conn)
+
+
+def run(label, threads, requests, worker):
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        worker(i % 200 + 1)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:<16} {requests / elapsed:>10.0f} req/s   p50 {p50:>7.3f} ms   p99 {p99:>7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--pool-size', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup_database(path)
+
+        def open_per_call(user_id):
+            def connect():
+                conn = sqlite3.connect(path)
+                conn.row_factory = sqlite3.Row
+                return conn
+            dashboard_queries(connect, lambda conn: conn.close(), user_id)
+
+        pool = ConnectionPool(path, max_size=args.pool_size, timeout=30)
+
+        def pooled(user_id):
+            # Una conexión por request, como flask.g
+            conn = pool.acquire()
+            dashboard_queries(lambda: conn, lambda c: None, user_id)
+            pool.release(conn)
+
+        print(f"threads={args.threads} requests={args.requests} pool_size={args.pool_size}\n")
+        run('open-per-call', args.threads, args.requests, open_per_call)
+        run('pooled', args.threads, args.requests, pooled)
+
+        stats = pool.stats()
+        print(f"\npool: checkouts={stats['checkouts']} waited={stats['waited_checkouts']} "
+              f"avg_wait={stats['avg_wait_ms']}ms max_wait={stats['max_wait_ms']}ms "
+              f"peak_in_use={stats['peak_in_use']}/{stats['max_size']}")
+        pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: equity curve
+- Snapshot de todos los usuarios: update_equity_snapshot por usuario vs. el
+  INSERT ... SELECT del EquitySnapshotter (con los triggers de velas/analytics)
+- GET de 30 días: todos los snapshots crudos vs. velas de la resolución
+  elegida, con y sin LTTB
+
+Uso:
+    python benchmarks/bench_equity_curve.py [--users 5000] [--days 30] [--interval 60]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import connect
+from migrations.runner import MIGRATIONS
+from services.analytics_service import AnalyticsService
+from services.equity_snapshotter import EquitySnapshotter
+
+
+def setup_database(path, users):
+    conn = connect(path)
+    cursor = conn.cursor()
+    for _, _, upgrade in MIGRATIONS:
+        upgrade(cursor)
+    cursor.executemany(
+        "INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')",
+        [(i, f"user{i}@bench.local") for i in range(1, users + 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO trading_stats (user_id, total_profit) VALUES (?, ?)",
+        [(i, round(random.uniform(-500, 500), 2)) for i in range(1, users + 1)]
+    )
+    cursor.executemany('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, status, pnl)
+        VALUES (?, 'BTCUSD', 'BUY', 1, 100, 'open', ?)
+    ''', [(i, round(random.uniform(-50, 50), 2)) for i in range(1, users + 1) if i % 3])
+    conn.commit()
+    return conn
+
+
+def per_user(conn, service, users):
+    """Lo que habría que hacer sin el snapshotter: equity y un INSERT por usuario"""
+    cursor = conn.cursor()
+    for user_id in range(1, users + 1):
+        cursor.execute('''
+            SELECT ? + COALESCE((SELECT SUM(total_profit) FROM trading_stats WHERE user_id = ?), 0)
+                     + COALESCE((SELECT SUM(pnl) FROM positions WHERE user_id = ? AND status = 'open'), 0)
+        ''', (Config.EQUITY_STARTING_BALANCE, user_id, user_id))
+        service.update_equity_snapshot(user_id, cursor.fetchone()[0])
+
+
+def load_history(conn, days, interval):
+    """Historial crudo de un usuario (id 1) a la cadencia del snapshotter"""
+    now = datetime.now()
+    points = int(days * 86400 / interval)
+    equity = 10000.0
+    rows = []
+    for i in range(points, 0, -1):
+        equity += random.uniform(-5, 5)
+        rows.append((1, equity, (now - timedelta(seconds=i * interval)).isoformat()))
+    conn.executemany("INSERT INTO equity_curve (user_id, equity, timestamp) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    return points
+
+
+def timed(label, fn, rounds):
+    timings = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{label:<28} median {timings[len(timings) // 2]:>9.2f} ms   max {timings[-1]:>9.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval', type=int, default=60)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.DATABASE_PATH = os.path.join(tmp, 'equity.db')
+        Config.EQUITY_SNAPSHOT_INTERVAL = args.interval
+        # Sin poda: el historial cargado queda entero en la tabla cruda
+        Config.EQUITY_RAW_RETENTION_DAYS = Config.EQUITY_1M_RETENTION_DAYS = 0
+        conn = setup_database(Config.DATABASE_PATH, args.users)
+        service = AnalyticsService()
+        snapshotter = EquitySnapshotter()
+
+        print(f"users={args.users}\n")
+        timed('snapshot por usuario', lambda: per_user(conn, service, args.users), args.rounds)
+        rows = timed('snapshot INSERT ... SELECT', snapshotter.snapshot, args.rounds)
+        print(f"  {rows} filas por snapshot\n")
+
+        points = load_history(conn, args.days, args.interval)
+        print(f"historial: {points} snapshots crudos ({args.days} días cada {args.interval} s)\n")
+        hours = args.days * 24
+
+        def raw():
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT equity, timestamp FROM equity_curve
+                WHERE user_id = 1 AND timestamp >= ? ORDER BY timestamp ASC
+            ''', ((datetime.now() - timedelta(hours=hours)).isoformat(),))
+            return 'raw', [{'equity': r[0], 'timestamp': r[1]} for r in cursor.fetchall()]
+
+        for label, fn in (
+            ('crudo (antes)', raw),
+            ('velas', lambda: service.load_equity_curve(1, hours)),
+            ('velas + LTTB 500', lambda: service.load_equity_curve(1, hours, max_points=500)),
+            ('24h + LTTB 200', lambda: service.load_equity_curve(1, 24, max_points=200)),
+        ):
+            resolution, curve = timed(label, fn, args.rounds)
+            print(f"  resolución {resolution}: {len(curve)} puntos")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
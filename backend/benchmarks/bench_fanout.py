@@ -0,0 +1,129 @@
+"""
+Load test: fan-out de una señal de TradingView a todos los bots demo
+Loop por bot (INSERT posición + INSERT slippage + UPDATE trading_stats por
+usuario) vs. fan-out set-based (INSERT ... SELECT desde bot_config,
+slippage y stats agregados)
+
+Uso:
+    python benchmarks/bench_fanout.py [--users 10000] [--signals 10]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect
+from migrations.runner import MIGRATIONS
+from services.signal_fanout import open_positions_for_signal, count_opened_trades
+from services.slippage_tracker import slippage_tracker
+
+
+def setup_database(path, users):
+    conn = connect(path)
+    cursor = conn.cursor()
+    for _, _, upgrade in MIGRATIONS:
+        upgrade(cursor)
+    cursor.executemany(
+        "INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')",
+        [(i, f"user{i}@bench.local") for i in range(1, users + 1)]
+    )
+    cursor.executemany('''
+        INSERT INTO bot_config (user_id, is_active, demo_mode, max_position_size)
+        VALUES (?, 1, 1, ?)
+    ''', [(i, random.choice([100, 250, 500, 1000, 2500])) for i in range(1, users + 1)])
+    cursor.executemany(
+        "INSERT INTO trading_stats (user_id) VALUES (?)",
+        [(i,) for i in range(1, users + 1)]
+    )
+    conn.commit()
+    return conn
+
+
+def per_bot(conn, ticker, signal, price):
+    """Lo que hacía process_demo_trade antes: una ronda de statements por usuario"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT user_id, max_position_size FROM bot_config
+        WHERE is_active = 1 AND demo_mode = 1
+    ''')
+    for user_id, position_size in cursor.fetchall():
+        cursor.execute('''
+            INSERT INTO positions (
+                user_id, symbol, side, quantity, entry_price,
+                current_price, pnl, status
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, ticker, signal, round(position_size / price, 2), price, price, 0.0, 'open'))
+        cursor.execute('''
+            INSERT INTO slippage_records
+            (position_id, ticker, expected_price, actual_price,
+             slippage_dollars, slippage_percent, is_acceptable, recorded_at)
+            VALUES (?, ?, ?, ?, 0, 0, 1, 'now')
+        ''', (cursor.lastrowid, ticker, price, price))
+        cursor.execute('''
+            UPDATE trading_stats SET total_trades = total_trades + 1 WHERE user_id = ?
+        ''', (user_id,))
+    conn.commit()
+
+
+def set_based(conn, ticker, signal, price):
+    cursor = conn.cursor()
+    opened = open_positions_for_signal(cursor, ticker, signal, price)
+    if opened:
+        slippage_tracker.record_slippage_batch(cursor, *opened, price, price, ticker)
+        count_opened_trades(cursor, *opened)
+    conn.commit()
+
+
+def run(label, conn, signals, fn):
+    timings = []
+    for i in range(signals):
+        ticker = f"SYM{i % 5}USD"
+        signal = random.choice(['BUY', 'SELL'])
+        price = round(random.uniform(10, 70000), 2)
+        start = time.perf_counter()
+        fn(conn, ticker, signal, price)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{label:<10} median {timings[len(timings) // 2]:>9.2f} ms   "
+          f"min {timings[0]:>9.2f} ms   max {timings[-1]:>9.2f} ms")
+
+
+def snapshot(conn):
+    """Estado comparable entre los dos caminos"""
+    return (
+        conn.execute("SELECT user_id, symbol, side, quantity, entry_price FROM positions ORDER BY id").fetchall(),
+        conn.execute("SELECT COUNT(*) FROM slippage_records").fetchone()[0],
+        conn.execute("SELECT user_id, total_trades FROM trading_stats ORDER BY user_id").fetchall()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--signals', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"users={args.users} signals={args.signals}\n")
+        results = {}
+        for label, fn in (('per-bot', per_bot), ('set-based', set_based)):
+            random.seed(args.seed)
+            conn = setup_database(os.path.join(tmp, f"{label}.db"), args.users)
+            run(label, conn, args.signals, fn)
+            results[label] = snapshot(conn)
+            conn.close()
+
+        # Verificación: mismas posiciones, slippage y stats por los dos caminos
+        (rows_a, slip_a, stats_a), (rows_b, slip_b, stats_b) = results.values()
+        quantity_diffs = sum(1 for a, b in zip(rows_a, rows_b) if tuple(a) != tuple(b))
+        print(f"\nverificación: {len(rows_b)} posiciones ({quantity_diffs} diferencias), "
+              f"slippage {slip_a}/{slip_b}, stats iguales: {stats_a == stats_b}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: repricing de posiciones abiertas
+Loop por fila en Python (UPDATE ... WHERE id = ?) vs. UPDATE set-based por
+símbolo vs. un solo UPDATE para todos los símbolos (tabla temporal de precios)
+
+Uso:
+    python benchmarks/bench_repricing.py [--positions 10000] [--symbols 50] [--rounds 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect
+from services.position_repricer import reprice_symbol, reprice_symbols
+
+
+def setup_database(path, positions, symbols):
+    conn = connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            side TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            entry_price REAL NOT NULL,
+            current_price REAL,
+            pnl REAL DEFAULT 0.0,
+            status TEXT DEFAULT 'open',
+            remaining_quantity REAL,
+            updated_at TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX idx_positions_open_symbol ON positions(symbol) WHERE status = 'open'")
+    rows = []
+    for i in range(positions):
+        symbol = f"SYM{i % symbols}USD"
+        status = 'open' if i % 10 else 'closed'  # 10% histórico cerrado
+        rows.append((i % 1000 + 1, symbol, random.choice(['BUY', 'SELL']),
+                     round(random.uniform(0.1, 5), 2), 100.0, status))
+    cursor.executemany('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, status)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    return conn
+
+
+def per_row(conn, prices):
+    """Lo que hacían PriceMonitor / WebSocket / webhook antes"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, symbol, side, quantity, entry_price, remaining_quantity
+        FROM positions WHERE status = 'open'
+    ''')
+    for pos_id, symbol, side, quantity, entry_price, remaining in cursor.fetchall():
+        price = prices[symbol]
+        qty = remaining or quantity
+        pnl = (price - entry_price) * qty if side.upper() == 'BUY' else (entry_price - price) * qty
+        cursor.execute('''
+            UPDATE positions SET current_price = ?, pnl = ?, updated_at = ? WHERE id = ?
+        ''', (price, pnl, 'now', pos_id))
+    conn.commit()
+
+
+def per_symbol(conn, prices):
+    cursor = conn.cursor()
+    for symbol, price in prices.items():
+        reprice_symbol(cursor, symbol, price, 'now')
+    conn.commit()
+
+
+def batched(conn, prices):
+    reprice_symbols(conn.cursor(), prices, 'now')
+    conn.commit()
+
+
+def run(label, conn, rounds, symbols, fn):
+    timings = []
+    for _ in range(rounds):
+        prices = {f"SYM{i}USD": random.uniform(90, 110) for i in range(symbols)}
+        start = time.perf_counter()
+        fn(conn, prices)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{label:<14} median {timings[len(timings) // 2]:>8.2f} ms   "
+          f"min {timings[0]:>8.2f} ms   max {timings[-1]:>8.2f} ms")
+    return prices
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--positions', type=int, default=10000)
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = setup_database(os.path.join(tmp, 'bench.db'), args.positions, args.symbols)
+        print(f"positions={args.positions} symbols={args.symbols} rounds={args.rounds}\n")
+
+        run('per-row', conn, args.rounds, args.symbols, per_row)
+        run('per-symbol', conn, args.rounds, args.symbols, per_symbol)
+        prices = run('batched', conn, args.rounds, args.symbols, batched)
+
+        # Verificación: el resultado set-based coincide con el cálculo por fila
+        expected = {}
+        for pos_id, symbol, side, quantity, entry_price in conn.execute(
+            "SELECT id, symbol, side, quantity, entry_price FROM positions WHERE status = 'open'"
+        ):
+            price = prices[symbol]
+            expected[pos_id] = (price - entry_price) * quantity if side == 'BUY' else (entry_price - price) * quantity
+        actual = dict(conn.execute("SELECT id, pnl FROM positions WHERE status = 'open'"))
+        mismatches = sum(1 for pos_id, pnl in expected.items() if abs(actual[pos_id] - pnl) > 1e-9)
+        print(f"\nverificación: {len(expected)} posiciones abiertas, {mismatches} diferencias")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: capacidad del risk engine (ticks por segundo)
+TradingEngine.update_symbol_risk (una transacción por símbolo) vs.
+update_position_risk_management llamado posición por posición
+
+Uso:
+    python benchmarks/bench_risk_engine.py [--sizes 1000,10000,100000] [--symbols 20] [--seconds 3]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_PATH'] = os.path.join(TMP_DIR, 'bench.db')
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from database import get_db_connection, init_db
+    from services.position_book import position_book
+    from services.trading_engine import trading_engine
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def seed(positions, symbols, users=1000):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM positions")
+    cursor.execute("DELETE FROM partial_closes")
+    cursor.execute("SELECT COUNT(*) FROM users")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany("INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')",
+                           [(i, f"user{i}@bench") for i in range(1, users + 1)])
+        cursor.executemany('''
+            INSERT INTO bot_config (user_id, is_active, demo_mode, auto_close_enabled,
+                                    stop_loss_percent, take_profit_percent)
+            VALUES (?, 1, 1, 1, 3, 8)
+        ''', [(i,) for i in range(1, users + 1)])
+        cursor.executemany("INSERT INTO trading_stats (user_id) VALUES (?)",
+                           [(i,) for i in range(1, users + 1)])
+    cursor.executemany('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, current_price, status)
+        VALUES (?, ?, ?, ?, ?, ?, 'open')
+    ''', [
+        (i % users + 1, f"SYM{i % symbols}USD", random.choice(['BUY', 'SELL']),
+         round(random.uniform(0.1, 5), 2), round(random.uniform(99, 101), 2), 100.0)
+        for i in range(positions)
+    ])
+    conn.commit()
+    conn.close()
+    position_book.load()
+
+
+def open_positions():
+    conn = get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM positions WHERE status = 'open'").fetchone()[0]
+    conn.close()
+    return count
+
+
+def warm_up(symbols):
+    """Primera pasada por símbolo: inicializa highest_price/trailing_stop de todas las filas"""
+    with quiet():
+        for i in range(symbols):
+            trading_engine.update_symbol_risk(f"SYM{i}USD", 100.0)
+
+
+def bench_batched(symbols, seconds):
+    warm_up(symbols)
+    prices = {f"SYM{i}USD": 100.0 for i in range(symbols)}
+    ticks = rows = 0
+    start = time.perf_counter()
+    with quiet():
+        while time.perf_counter() - start < seconds:
+            symbol = random.choice(list(prices))
+            prices[symbol] = 100.0 * (1 + random.gauss(0, 0.0005))  # oscila sin tendencia
+            summary = trading_engine.update_symbol_risk(symbol, prices[symbol])
+            ticks += 1
+            rows += summary['positions']
+    elapsed = time.perf_counter() - start
+    return ticks / elapsed, rows / elapsed
+
+
+def bench_per_position(symbols, seconds):
+    """Camino anterior: una transacción por posición"""
+    warm_up(symbols)
+    conn = get_db_connection()
+    ids_by_symbol = {}
+    for pos_id, symbol in conn.execute("SELECT id, symbol FROM positions WHERE status = 'open'"):
+        ids_by_symbol.setdefault(symbol, []).append(pos_id)
+    conn.close()
+
+    prices = {symbol: 100.0 for symbol in ids_by_symbol}
+    ticks = rows = 0
+    start = time.perf_counter()
+    with quiet():
+        while time.perf_counter() - start < seconds:
+            symbol = random.choice(list(prices))
+            prices[symbol] = 100.0 * (1 + random.gauss(0, 0.0005))  # oscila sin tendencia
+            for pos_id in ids_by_symbol[symbol]:
+                trading_engine.update_position_risk_management(pos_id, prices[symbol])
+            ticks += 1
+            rows += len(ids_by_symbol[symbol])
+    elapsed = time.perf_counter() - start
+    return ticks / elapsed, rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--per-position-max', type=int, default=10000,
+                        help='tamaño máximo para medir el camino por posición')
+    args = parser.parse_args()
+
+    with quiet():
+        init_db()
+
+    print(f"symbols={args.symbols} seconds={args.seconds}\n")
+    print(f"{'positions':>10}  {'mode':<13} {'ticks/s':>10} {'ms/tick':>9} {'positions/s':>13}")
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        modes = [('per-symbol', bench_batched)]
+        if size <= args.per_position_max:
+            modes.insert(0, ('per-position', bench_per_position))
+        for label, fn in modes:
+            seed(size, args.symbols)
+            ticks_per_s, rows_per_s = fn(args.symbols, args.seconds)
+            print(f"{size:>10}  {label:<13} {ticks_per_s:>10.1f} {1000 / ticks_per_s:>9.2f} {rows_per_s:>13.0f}"
+                  f"   (abiertas al final: {open_positions()})")
+
+
+if __name__ == '__main__':
+    main()
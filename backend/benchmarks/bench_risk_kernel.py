@@ -0,0 +1,125 @@
+"""
+Benchmark: risk kernel NumPy vs. TradingEngine.evaluate_risk escalar
+Verifica además que ambos den exactamente el mismo resultado (==, sin tolerancia)
+
+Uso:
+    python benchmarks/bench_risk_kernel.py [--sizes 1000,10000,100000] [--prices 20]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from services.risk_kernel import NUMPY_AVAILABLE, evaluate_risk_batch, np
+    from services.trading_engine import trading_engine
+
+
+def random_positions(n):
+    """Posiciones en todos los estados: sin highest, break-even activo, TP1 hecho, etc."""
+    positions = []
+    for i in range(n):
+        entry = round(random.uniform(95, 105), 2)
+        quantity = round(random.uniform(0.1, 10), 3)
+        tp1_closed = random.random() < 0.2
+        tp2_closed = tp1_closed and random.random() < 0.2
+        remaining = quantity * 0.5 if tp1_closed else random.choice([None, quantity])
+        positions.append({
+            'id': i + 1,
+            'user_id': i % 500 + 1,
+            'entry_price': entry,
+            'quantity': quantity,
+            'side': random.choice(['BUY', 'SELL', 'buy', 'sell']),
+            'highest_price': random.choice([None, round(entry * random.uniform(0.95, 1.06), 4)]),
+            'trailing_stop': random.choice([None, round(entry * random.uniform(0.97, 1.03), 4)]),
+            'break_even_active': random.random() < 0.2,
+            'tp1_closed': tp1_closed,
+            'tp2_closed': tp2_closed,
+            'remaining_quantity': remaining,
+            'stop_loss_percent': random.choice([1.0, 2.0, 3.5]),
+            'take_profit_percent': random.choice([1.5, 5.0, 8.0])
+        })
+    return positions
+
+
+def to_matrix(positions):
+    return np.array([
+        (p['id'], p['user_id'], p['entry_price'], p['quantity'],
+         1 if p['side'].lower() == 'buy' else 0,
+         p['highest_price'], p['trailing_stop'], p['break_even_active'],
+         p['tp1_closed'], p['tp2_closed'], p['remaining_quantity'],
+         p['stop_loss_percent'], p['take_profit_percent'])
+        for p in positions
+    ], dtype=np.float64)
+
+
+def compare(scalar, out):
+    """Cuenta diferencias campo por campo entre el resultado escalar y el vectorizado"""
+    mismatches = 0
+    for i, r in enumerate(scalar):
+        expected_partials = {reason: (qty, price, pnl) for qty, price, reason, pnl in r['partial_closes']}
+        checks = [
+            r['pnl'] == out['pnl'][i],
+            r['highest_price'] == out['highest_price'][i],
+            r['trailing_stop'] == out['trailing_stop'][i],
+            r['break_even_active'] == out['break_even_active'][i],
+            r['tp1_closed'] == out['tp1_closed'][i],
+            r['tp2_closed'] == out['tp2_closed'][i],
+            r['remaining_quantity'] == out['remaining_quantity'][i],
+            (r['close_reason'] == 'Trailing Stop') == out['stop_hit'][i],
+            (r['close_reason'] == 'TP2') == out['fully_closed'][i],
+            r['changed'] == out['changed'][i],
+        ]
+        for level in ('TP1', 'TP2'):
+            key = level.lower()
+            checks.append((level in expected_partials) == out[key][i])
+            if level in expected_partials:
+                qty, price, pnl = expected_partials[level]
+                checks += [qty == out[f'{key}_quantity'][i], price == out[f'{key}_price'][i],
+                           pnl == out[f'{key}_pnl'][i]]
+        mismatches += not all(checks)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--prices', type=int, default=20)
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("numpy no está instalado")
+        return
+
+    print(f"{'positions':>10} {'scalar ms':>11} {'numpy ms':>10} {'speedup':>9} {'mismatches':>11}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        positions = random_positions(size)
+        matrix = to_matrix(positions)
+        prices = [random.uniform(93, 107) for _ in range(args.prices)]
+
+        scalar_time = kernel_time = 0.0
+        mismatches = 0
+        for price in prices:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                scalar = [trading_engine.evaluate_risk(p, price) for p in positions]
+            scalar_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            out = evaluate_risk_batch(matrix, price)
+            kernel_time += time.perf_counter() - start
+
+            mismatches += compare(scalar, out)
+
+        scalar_ms = scalar_time / len(prices) * 1000
+        kernel_ms = kernel_time / len(prices) * 1000
+        print(f"{size:>10} {scalar_ms:>11.2f} {kernel_ms:>10.3f} {scalar_ms / kernel_ms:>8.1f}x {mismatches:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark: métricas de riesgo del reporte nocturno
+Python puro por usuario (una query por tabla y por usuario, listas) vs.
+services/risk_metrics (una query por tabla por lote, arrays NumPy)
+Verifica además que ambos caminos den lo mismo (tolerancia relativa 1e-9)
+
+Uso:
+    python benchmarks/bench_risk_metrics.py [--users 500] [--days 90] [--trades 300]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import connect
+from migrations.runner import MIGRATIONS
+from services.risk_metrics import NUMPY_AVAILABLE, SECONDS_PER_YEAR, compute_risk_report
+
+
+def setup_database(path, users, days, trades, now):
+    conn = connect(path)
+    cursor = conn.cursor()
+    for _, _, upgrade in MIGRATIONS:
+        upgrade(cursor)
+    cursor.executemany(
+        "INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')",
+        [(i, f"user{i}@bench.local") for i in range(1, users + 1)]
+    )
+
+    start = now - timedelta(days=days)
+    positions, candles = [], []
+    for user_id in range(1, users + 1):
+        for _ in range(random.randint(0, trades)):
+            closed_at = start + timedelta(seconds=random.uniform(0, days * 86400))
+            pnl = random.choice([0.0] + [round(random.gauss(5, 100), 2)] * 9)
+            positions.append((user_id, closed_at.isoformat(), pnl))
+        # Velas 1h directas (el trigger ya está medido en bench_equity_curve)
+        equity = 10000.0
+        for hour in range(days * 24):
+            if random.random() < 0.05:
+                continue  # horas sin snapshots
+            equity = max(equity + random.gauss(1, 40), 1.0)
+            bucket = (start + timedelta(hours=hour)).strftime('%Y-%m-%dT%H:00')
+            candles.append((user_id, bucket, equity, bucket))
+    cursor.executemany('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, status, closed_at, pnl)
+        VALUES (?, 'BTCUSD', 'BUY', 1, 100, 'closed', ?, ?)
+    ''', positions)
+    cursor.executemany('''
+        INSERT INTO equity_rollups (user_id, resolution, bucket, open, high, low, close, samples, first_at, last_at)
+        VALUES (?, '1h', ?, ?3, ?3, ?3, ?3, 1, ?4, ?4)
+    ''', candles)
+    conn.commit()
+    return conn
+
+
+def per_user(conn, user_id, since, rolling_days):
+    """Las mismas métricas con listas de Python, un usuario por vez"""
+    pnls = [row[0] for row in conn.execute('''
+        SELECT pnl FROM positions
+        WHERE user_id = ? AND status = 'closed' AND pnl IS NOT NULL AND closed_at >= ?
+        ORDER BY closed_at
+    ''', (user_id, since.isoformat()))]
+    rows = conn.execute('''
+        SELECT bucket, close FROM equity_rollups
+        WHERE user_id = ? AND resolution = '1h' AND bucket >= ? ORDER BY bucket
+    ''', (user_id, since.strftime('%Y-%m-%dT%H:00'))).fetchall()
+    times = [datetime.fromisoformat(row[0]).timestamp() for row in rows]
+    equity = [row[1] for row in rows]
+
+    wins = [p for p in pnls if p > 0]
+    losses = [p for p in pnls if p < 0]
+    metrics = {
+        'expectancy': sum(pnls) / len(pnls) if pnls else None,
+        'profit_factor': sum(wins) / -sum(losses) if losses else None
+    }
+
+    returns = [b / a - 1 for a, b in zip(equity, equity[1:])]
+    if len(returns) > 1:
+        mean = sum(returns) / len(returns)
+        std = math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+        downside = math.sqrt(sum(min(r, 0) ** 2 for r in returns) / len(returns))
+        metrics['sharpe'] = mean / std * math.sqrt(SECONDS_PER_YEAR / 3600)
+        metrics['sortino'] = mean / downside * math.sqrt(SECONDS_PER_YEAR / 3600)
+
+    peak, peak_time, max_dd, max_tuw = 0.0, None, 0.0, 0.0
+    window = rolling_days * 24
+    max_rolling = 0.0
+    for i, (t, e) in enumerate(zip(times, equity)):
+        if e >= peak:
+            peak, peak_time = e, t
+        max_dd = max(max_dd, 1 - e / peak)
+        max_tuw = max(max_tuw, t - peak_time)
+        max_rolling = max(max_rolling, 1 - e / max(equity[max(0, i - window + 1):i + 1]))
+    metrics['max_drawdown'] = max_dd
+    metrics['max_rolling_drawdown'] = max_rolling
+    metrics['max_time_under_water_hours'] = max_tuw / 3600
+    elapsed = times[-1] - times[0]
+    cagr = (equity[-1] / equity[0]) ** (SECONDS_PER_YEAR / elapsed) - 1
+    metrics['calmar'] = cagr / max_dd if max_dd > 0 else None
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--trades', type=int, default=300)
+    parser.add_argument('--rolling-days', type=int, default=30)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    if not NUMPY_AVAILABLE:
+        print("numpy no está instalado")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.DATABASE_PATH = os.path.join(tmp, 'risk.db')
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+        conn = setup_database(Config.DATABASE_PATH, args.users, args.days, args.trades, now)
+        since = now - timedelta(days=args.days)
+        user_ids = list(range(1, args.users + 1))
+        print(f"users={args.users} days={args.days} (velas 1h) trades<= {args.trades}\n")
+
+        start = time.perf_counter()
+        expected = {user_id: per_user(conn, user_id, since, args.rolling_days) for user_id in user_ids}
+        python_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        report = []
+        for i in range(0, len(user_ids), args.batch):
+            report += compute_risk_report(conn.cursor(), user_ids[i:i + args.batch], args.days, '1h',
+                                          args.rolling_days, now=now)
+        numpy_ms = (time.perf_counter() - start) * 1000
+
+        mismatches = 0
+        for row in report:
+            for key, value in expected[row['user_id']].items():
+                actual = row[key]
+                if value is None or actual is None:
+                    mismatches += (value is None) != (actual is None)
+                elif not math.isclose(value, actual, rel_tol=1e-9, abs_tol=1e-6):
+                    mismatches += 1
+
+        print(f"python por usuario   {python_ms:>9.1f} ms")
+        print(f"numpy por lote       {numpy_ms:>9.1f} ms   ({python_ms / numpy_ms:.1f}x)")
+        print(f"verificación: {mismatches} diferencias en {len(report)} usuarios")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
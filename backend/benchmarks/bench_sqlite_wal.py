@@ -0,0 +1,141 @@
+"""
+Benchmark: concurrencia lectura/escritura, rollback journal vs WAL
+Writers simulan PriceMonitor / ticks de WebSocket, readers simulan el dashboard
+
+Uso:
+    python benchmarks/bench_sqlite_wal.py [--seconds 5] [--writers 2] [--readers 8]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect, storage_settings
+
+SYMBOLS = ['BTCUSD', 'ETHUSD', 'AAPL', 'TSLA', 'SPX']
+
+# Antes: defaults de SQLite (rollback journal, sin busy_timeout)
+BEFORE = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT',
+    'busy_timeout': 0
+}
+
+
+def setup_database(path, positions=5000):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            side TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            entry_price REAL NOT NULL,
+            current_price REAL,
+            pnl REAL DEFAULT 0.0,
+            status TEXT DEFAULT 'open'
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_positions_symbol ON positions(symbol, status)')
+    conn.execute('CREATE INDEX idx_positions_user ON positions(user_id, status)')
+    conn.executemany(
+        'INSERT INTO positions (user_id, symbol, side, quantity, entry_price) VALUES (?, ?, ?, ?, ?)',
+        [(i % 500, SYMBOLS[i % len(SYMBOLS)], 'buy', 1.0, 100.0) for i in range(positions)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(label, settings, seconds, writers, readers):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup_database(path)
+
+        stop = threading.Event()
+        counts = {'writes': 0, 'reads': 0, 'locked': 0}
+        read_latencies = []
+        lock = threading.Lock()
+
+        def writer(n):
+            conn = connect(path, settings)
+            price = 100.0
+            while not stop.is_set():
+                symbol = SYMBOLS[n % len(SYMBOLS)]
+                price += 0.01
+                try:
+                    conn.execute('''
+                        UPDATE positions SET current_price = ?, pnl = (? - entry_price) * quantity
+                        WHERE symbol = ? AND status = 'open'
+                    ''', (price, price, symbol))
+                    conn.commit()
+                    with lock:
+                        counts['writes'] += 1
+                except sqlite3.OperationalError:
+                    conn.rollback()
+                    with lock:
+                        counts['locked'] += 1
+            conn.close()
+
+        def reader(n):
+            conn = connect(path, settings)
+            user_id = n
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    conn.execute(
+                        "SELECT COUNT(*), SUM(pnl) FROM positions WHERE user_id = ? AND status = 'open'",
+                        (user_id % 500,)
+                    ).fetchone()
+                    conn.execute(
+                        "SELECT id, symbol, current_price, pnl FROM positions WHERE user_id = ?",
+                        (user_id % 500,)
+                    ).fetchall()
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        counts['reads'] += 1
+                        read_latencies.append(elapsed)
+                except sqlite3.OperationalError:
+                    with lock:
+                        counts['locked'] += 1
+                user_id += 7
+            conn.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        read_latencies.sort()
+        p99 = read_latencies[int(len(read_latencies) * 0.99) - 1] * 1000 if read_latencies else 0
+        print(f"{label:<22} writes/s {counts['writes'] / seconds:>8.0f}   "
+              f"reads/s {counts['reads'] / seconds:>8.0f}   "
+              f"read p99 {p99:>7.3f} ms   locked errors {counts['locked']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"writers={args.writers} readers={args.readers} seconds={args.seconds}\n")
+    run('rollback journal', BEFORE, args.seconds, args.writers, args.readers)
+    run('WAL + tuned pragmas', storage_settings(), args.seconds, args.writers, args.readers)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
-import sqlite3
+from database import get_db_connection
 
-conn = sqlite3.connect('trading.db')
+conn = get_db_connection()
 cursor = conn.cursor()
 
 cursor.execute('SELECT id, symbol, side, quantity, entry_price, status FROM positions')
@@ -8,3 +8,101 @@ class Config:
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'trading.db')
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     PORT = int(os.getenv('PORT', 5000))
+
+    # SQLite connection pool
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+
+    # SQLite storage initialization (applied to every connection)
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -20000))  # negative = KiB
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))
+    SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CHECKPOINT_INTERVAL = float(os.getenv('SQLITE_CHECKPOINT_INTERVAL', 60))
+    SQLITE_CHECKPOINT_MODE = os.getenv('SQLITE_CHECKPOINT_MODE', 'PASSIVE')
+
+    # Background services: auto (leader election) | on | off (use service_runner.py)
+    BACKGROUND_SERVICES = os.getenv('BACKGROUND_SERVICES', 'auto')
+    SERVICE_LEADER_RETRY_INTERVAL = float(os.getenv('SERVICE_LEADER_RETRY_INTERVAL', 15))
+
+    # PriceMonitor fetch: bounded thread pool + per-cycle deadline (seconds)
+    PRICE_FETCH_WORKERS = int(os.getenv('PRICE_FETCH_WORKERS', 8))
+    PRICE_FETCH_DEADLINE = float(os.getenv('PRICE_FETCH_DEADLINE', 4))
+
+    # Shared price cache: freshness per asset class (ms); entries older than
+    # PRICE_CACHE_MAX_AGE (seconds) are dropped
+    PRICE_TTL_CRYPTO_MS = int(os.getenv('PRICE_TTL_CRYPTO_MS', 2000))
+    PRICE_TTL_FOREX_MS = int(os.getenv('PRICE_TTL_FOREX_MS', 5000))
+    PRICE_TTL_INDEX_MS = int(os.getenv('PRICE_TTL_INDEX_MS', 15000))
+    PRICE_TTL_STOCK_MS = int(os.getenv('PRICE_TTL_STOCK_MS', 15000))
+    PRICE_CACHE_MAX_AGE = int(os.getenv('PRICE_CACHE_MAX_AGE', 600))
+
+    # Binance combined-stream WebSocket (point at tools/fake_binance_ws.py to test offline)
+    BINANCE_WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443')
+    BINANCE_SUBSCRIPTION_REFRESH = float(os.getenv('BINANCE_SUBSCRIPTION_REFRESH', 5))
+    BINANCE_RECONNECT_BASE = float(os.getenv('BINANCE_RECONNECT_BASE', 1))
+    BINANCE_RECONNECT_MAX = float(os.getenv('BINANCE_RECONNECT_MAX', 60))
+
+    # WebSocket ticks: latest tick per symbol is persisted in one batch every N ms
+    TICK_FLUSH_INTERVAL_MS = int(os.getenv('TICK_FLUSH_INTERVAL_MS', 250))
+
+    # In-memory position book (SL/TP/trailing levels): full resync from SQLite every N seconds
+    POSITION_BOOK_RESYNC_INTERVAL = int(os.getenv('POSITION_BOOK_RESYNC_INTERVAL', 60))
+
+    # Risk engine (trailing stop, break-even, TP1/TP2) on every price tick,
+    # serialized per symbol on a bounded worker pool. Only touches positions of
+    # users with auto_close_enabled, using their own stop_loss/take_profit_percent
+    RISK_ENGINE_ENABLED = os.getenv('RISK_ENGINE_ENABLED', 'true').lower() == 'true'
+    RISK_DISPATCH_WORKERS = int(os.getenv('RISK_DISPATCH_WORKERS', 4))
+
+    # TradingView webhooks: durable queue drained by the leader, in order per ticker
+    WEBHOOK_QUEUE_WORKERS = int(os.getenv('WEBHOOK_QUEUE_WORKERS', 4))
+    WEBHOOK_QUEUE_POLL_MS = int(os.getenv('WEBHOOK_QUEUE_POLL_MS', 50))
+    WEBHOOK_QUEUE_BATCH = int(os.getenv('WEBHOOK_QUEUE_BATCH', 100))
+    WEBHOOK_QUEUE_RETENTION_HOURS = float(os.getenv('WEBHOOK_QUEUE_RETENTION_HOURS', 24))
+    WEBHOOK_QUEUE_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_QUEUE_MAX_ATTEMPTS', 5))  # transient SQLite errors
+    WEBHOOK_QUEUE_RETRY_BASE_MS = int(os.getenv('WEBHOOK_QUEUE_RETRY_BASE_MS', 100))  # doubles per retry
+    WEBHOOK_MAX_BATCH = int(os.getenv('WEBHOOK_MAX_BATCH', 500))  # signals per request (JSON array / NDJSON)
+
+    # Webhook journal: hot table keeps N days, older days go to gzip NDJSON archives
+    WEBHOOK_RETENTION_DAYS = int(os.getenv('WEBHOOK_RETENTION_DAYS', 7))
+    WEBHOOK_ARCHIVE_DIR = os.getenv(
+        'WEBHOOK_ARCHIVE_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'webhook_archive')
+    )
+    WEBHOOK_ARCHIVE_RETENTION_DAYS = int(os.getenv('WEBHOOK_ARCHIVE_RETENTION_DAYS', 0))  # 0 = keep forever
+    WEBHOOK_ARCHIVE_INTERVAL = int(os.getenv('WEBHOOK_ARCHIVE_INTERVAL', 3600))  # seconds
+    WEBHOOK_ARCHIVE_DELETE_BATCH = int(os.getenv('WEBHOOK_ARCHIVE_DELETE_BATCH', 5000))
+
+    # Structured logging (logging_setup.py): non-blocking queue handler, per-module levels
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # e.g. routes.webhook=WARNING,services.trading_engine=DEBUG
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # json | text
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', 100))  # 1 of N per-position lines
+
+    # Dashboard push channel (GET /dashboard/stream, Server-Sent Events): one poller
+    # per process diffs prices/positions/connection status every N ms for all clients
+    EVENT_STREAM_INTERVAL_MS = int(os.getenv('EVENT_STREAM_INTERVAL_MS', 500))
+    EVENT_STREAM_HEARTBEAT = int(os.getenv('EVENT_STREAM_HEARTBEAT', 15))  # seconds
+    EVENT_STREAM_QUEUE_SIZE = int(os.getenv('EVENT_STREAM_QUEUE_SIZE', 256))  # events per client
+
+    # Equity curve: snapshot of every user's equity (starting balance + realized +
+    # unrealized pnl) each N seconds, 1m/1h/1d OHLC rollups, pruning per resolution
+    EQUITY_SNAPSHOT_INTERVAL = int(os.getenv('EQUITY_SNAPSHOT_INTERVAL', 60))  # seconds
+    EQUITY_STARTING_BALANCE = float(os.getenv('EQUITY_STARTING_BALANCE', 10000))
+    EQUITY_RAW_RETENTION_DAYS = int(os.getenv('EQUITY_RAW_RETENTION_DAYS', 2))  # 0 = keep forever
+    EQUITY_1M_RETENTION_DAYS = int(os.getenv('EQUITY_1M_RETENTION_DAYS', 14))
+    EQUITY_1H_RETENTION_DAYS = int(os.getenv('EQUITY_1H_RETENTION_DAYS', 365))
+    EQUITY_1D_RETENTION_DAYS = int(os.getenv('EQUITY_1D_RETENTION_DAYS', 0))
+    EQUITY_PRUNE_INTERVAL = int(os.getenv('EQUITY_PRUNE_INTERVAL', 3600))  # seconds
+    EQUITY_CURVE_TARGET_POINTS = int(os.getenv('EQUITY_CURVE_TARGET_POINTS', 500))
+    EQUITY_CURVE_MAX_POINTS = int(os.getenv('EQUITY_CURVE_MAX_POINTS', 5000))  # cap for ?max_points=
+
+    # Webhook idempotency: alert_id or hash(ticker, signal, price, time bucket)
+    WEBHOOK_DEDUP_ENABLED = os.getenv('WEBHOOK_DEDUP_ENABLED', 'true').lower() == 'true'
+    WEBHOOK_DEDUP_TTL = int(os.getenv('WEBHOOK_DEDUP_TTL', 300))  # seconds
+    WEBHOOK_DEDUP_BUCKET = int(os.getenv('WEBHOOK_DEDUP_BUCKET', 60))  # seconds
+    WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv('WEBHOOK_DEDUP_CACHE_SIZE', 100000))
@@ -1,15 +1,416 @@
+"""
+Storage facade
+Single entry point to the SQLite database (Config.DATABASE_PATH) for routes,
+background services, migrations and scripts: one path, one connection setup,
+one pool.
+"""
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context
 from config import Config
 
-def get_db_connection():
-    conn = sqlite3.connect(Config.DATABASE_PATH)
+
+_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+_SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+_TEMP_STORES = {'DEFAULT', 'FILE', 'MEMORY'}
+_CHECKPOINT_MODES = {'PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'}
+
+
+def storage_settings():
+    """Pragmas applied to every connection, from Config"""
+    return {
+        'journal_mode': Config.SQLITE_JOURNAL_MODE,
+        'synchronous': Config.SQLITE_SYNCHRONOUS,
+        'cache_size': Config.SQLITE_CACHE_SIZE,
+        'mmap_size': Config.SQLITE_MMAP_SIZE,
+        'temp_store': Config.SQLITE_TEMP_STORE,
+        'busy_timeout': Config.SQLITE_BUSY_TIMEOUT_MS
+    }
+
+
+def configure_connection(conn, settings=None):
+    """
+    Storage initialization stage, run on every new connection.
+    WAL lets readers proceed while a writer commits; busy_timeout makes writers
+    wait for the lock instead of failing with "database is locked".
+    """
+    settings = settings or storage_settings()
+
+    journal_mode = settings['journal_mode'].upper()
+    synchronous = settings['synchronous'].upper()
+    temp_store = settings['temp_store'].upper()
+    if journal_mode not in _JOURNAL_MODES:
+        raise ValueError(f"Invalid SQLITE_JOURNAL_MODE: {journal_mode}")
+    if synchronous not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {synchronous}")
+    if temp_store not in _TEMP_STORES:
+        raise ValueError(f"Invalid SQLITE_TEMP_STORE: {temp_store}")
+
+    # busy_timeout first so the journal_mode switch itself waits for other writers
+    conn.execute(f"PRAGMA busy_timeout = {int(settings['busy_timeout'])}")
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.execute(f"PRAGMA cache_size = {int(settings['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings['mmap_size'])}")
+    conn.execute(f"PRAGMA temp_store = {temp_store}")
+    return conn
+
+
+def connect(path=None, settings=None):
+    """Opens a raw connection with the shared connection setup"""
+    settings = settings or storage_settings()
+    conn = sqlite3.connect(
+        path or Config.DATABASE_PATH,
+        timeout=int(settings['busy_timeout']) / 1000,
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
+    configure_connection(conn, settings)
     return conn
 
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """No connection became available before the pool timeout"""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of SQLite connections for one database file.
+    Connections are created lazily up to max_size and reused afterwards.
+    """
+
+    def __init__(self, path, max_size=None, timeout=None):
+        self.path = path
+        self.max_size = max_size or Config.DB_POOL_SIZE
+        self.timeout = timeout if timeout is not None else Config.DB_POOL_TIMEOUT
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+        # Metrics
+        self._checkouts = 0
+        self._waited_checkouts = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._peak_in_use = 0
+
+    def _connect(self):
+        return connect(self.path)
+
+    def acquire(self):
+        """Checks out a connection, waiting up to `timeout` seconds if the pool is saturated"""
+        start = time.perf_counter()
+        create = False
+
+        with self._cond:
+            waited = False
+            deadline = start + self.timeout
+            while not self._idle and self._created >= self.max_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Connection pool exhausted ({self.max_size} connections in use)"
+                    )
+                waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = None
+                create = True
+                self._created += 1
+
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            wait = time.perf_counter() - start
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            if waited:
+                self._waited_checkouts += 1
+
+        if create:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool, discarding any uncommitted work"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection: drop it and let the pool open a new one
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            conn = None
+
+        with self._cond:
+            self._in_use -= 1
+            if conn is None:
+                self._created -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        """Closes idle connections (used on shutdown)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Pool metrics: wait time and saturation"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'path': self.path,
+                'max_size': self.max_size,
+                'open_connections': self._created,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'peak_in_use': self._peak_in_use,
+                'saturation': round(self._in_use / self.max_size, 3),
+                'checkouts': checkouts,
+                'waited_checkouts': self._waited_checkouts,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': round(self._total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3)
+            }
+
+
+class PooledConnection:
+    """
+    Proxy around a pooled sqlite3 connection.
+    close() hands the connection back to the pool instead of closing it;
+    request-bound connections are released at app-context teardown instead.
+    """
+
+    def __init__(self, pool, conn, release_on_close=True):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_release_on_close', release_on_close)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a released connection")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        if self._release_on_close:
+            self.release()
+
+    def release(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, '_conn', None)
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Safety net for code paths that return early without close()
+        try:
+            self.release()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    """Returns the process-wide pool for a database file"""
+    path = path or Config.DATABASE_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+_thread_scope = threading.local()
+
+
+def get_db_connection(path=None):
+    """
+    Returns a pooled connection.
+    Inside a Flask app context the connection is checked out once and bound to
+    flask.g, so every call during the same request reuses it. Outside Flask
+    (background services) each call checks out a connection and close() returns it.
+    """
+    pool = get_pool(path)
+
+    scoped = getattr(_thread_scope, 'conns', None)
+    if scoped is not None:
+        conn = scoped.get(pool.path)
+        if conn is None:
+            conn = scoped[pool.path] = PooledConnection(pool, pool.acquire(), release_on_close=False)
+        return conn
+
+    if has_app_context():
+        conns = g.setdefault('_db_conns', {})
+        conn = conns.get(pool.path)
+        if conn is None:
+            conn = conns[pool.path] = PooledConnection(pool, pool.acquire(), release_on_close=False)
+        return conn
+
+    return PooledConnection(pool, pool.acquire())
+
+
+@contextmanager
+def connection_scope():
+    """
+    Binds connections to the current thread for the duration of the block,
+    the same way a Flask request binds them to flask.g: nested helpers that
+    call get_db_connection() share one connection (and one transaction)
+    instead of competing for the write lock. Used by background workers.
+    """
+    if getattr(_thread_scope, 'conns', None) is not None:
+        yield  # Nested scope: reuse the outer one
+        return
+
+    _thread_scope.conns = {}
+    try:
+        yield
+    finally:
+        conns, _thread_scope.conns = _thread_scope.conns, None
+        for conn in conns.values():
+            conn.release()
+
+
+def close_db(exception=None):
+    """Releases the connections bound to the current app context"""
+    conns = g.pop('_db_conns', None)
+    if conns:
+        for conn in conns.values():
+            conn.release()
+
+
+def init_app(app):
+    """Registers pool teardown on the Flask app"""
+    app.teardown_appcontext(close_db)
+
+
+def get_pool_stats():
+    """Metrics for every open pool"""
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+class WalCheckpointer:
+    """
+    Periodic WAL checkpoints so the -wal file does not grow without bound
+    while readers keep old snapshots open.
+    """
+
+    def __init__(self, interval=None, mode=None):
+        self.interval = interval or Config.SQLITE_CHECKPOINT_INTERVAL
+        self.mode = (mode or Config.SQLITE_CHECKPOINT_MODE).upper()
+        self.running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+        self.last_result = None
+
+        if self.mode not in _CHECKPOINT_MODES:
+            raise ValueError(f"Invalid SQLITE_CHECKPOINT_MODE: {self.mode}")
+
+    def checkpoint(self):
+        """Runs one checkpoint; returns (busy, wal_frames, checkpointed_frames)"""
+        conn = connect()
+        try:
+            start = time.perf_counter()
+            busy, wal_frames, checkpointed = conn.execute(
+                f"PRAGMA wal_checkpoint({self.mode})"
+            ).fetchone()
+            self.last_result = {
+                'busy': bool(busy),
+                'wal_frames': wal_frames,
+                'checkpointed_frames': checkpointed,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                'at': time.time()
+            }
+            return busy, wal_frames, checkpointed
+        finally:
+            conn.close()
+
+    def checkpoint_loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print(f"⚠️ Error en WAL checkpoint: {str(e)}")
+
+    def start(self):
+        if self.running:
+            return
+        if Config.SQLITE_JOURNAL_MODE.upper() != 'WAL':
+            print("ℹ️ WAL checkpointer deshabilitado (journal_mode != WAL)")
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self.checkpoint_loop, daemon=True)
+        self.thread.start()
+        print(f"✅ WAL checkpointer iniciado (cada {self.interval}s, {self.mode})")
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def get_status(self):
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'mode': self.mode,
+            'last_result': self.last_result
+        }
+
+
+wal_checkpointer = WalCheckpointer()
+
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    """Brings the schema up to date; applies only pending migrations"""
+    from migrations.runner import run_migrations
+    return run_migrations()
+
+def create_schema(cursor):
+    """Base schema (migration 1)"""
     # Users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -88,6 +489,4 @@ def init_db():
             received_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
         )
     ''')
-    
-    conn.commit()
-    conn.close()
+
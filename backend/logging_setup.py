@@ -0,0 +1,151 @@
+"""
+Structured logging
+Los módulos del hot path (webhook, webhook queue, trading engine, risk
+dispatcher, price monitor, cooldowns, slippage) loguean con
+logging.getLogger(__name__) en vez de print():
+
+- QueueHandler no bloqueante: el request sólo encola el record; un
+  QueueListener escribe a stdout en su propio thread. Si la cola está llena
+  el record se descarta y se cuenta (dropped) en vez de frenar el request
+- Niveles por módulo: LOG_LEVELS="routes.webhook=WARNING,services.trading_engine=DEBUG"
+- Sampling de líneas repetitivas (una por posición): los records con
+  extra={'sample_key': ...} pasan 1 de cada LOG_SAMPLE_EVERY por clave
+- LOG_FORMAT=json (una línea JSON por record) o text
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from threading import Lock
+from config import Config
+
+# Atributos estándar de LogRecord: todo lo demás viene de extra={...}
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por record; los campos de extra={...} van al nivel raíz"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar el 1er record de cada `every` por sample_key"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = Lock()
+        self.sampled_out = 0
+
+    def filter(self, record):
+        key = getattr(record, 'sample_key', None)
+        if key is None or self.every == 1:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+            if count % self.every:
+                self.sampled_out += 1
+                return False
+        record.sample_every = self.every
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que descarta (y cuenta) en vez de bloquear o volcar errores a stderr"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self._counter_lock = Lock()
+        self.enqueued = 0
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            with self._counter_lock:
+                self.enqueued += 1
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+
+
+_state = {'handler': None, 'listener': None, 'sampler': None}
+_setup_lock = Lock()
+
+
+def parse_levels(spec):
+    """'routes.webhook=WARNING,services=INFO' -> {'routes.webhook': 'WARNING', 'services': 'INFO'}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """Instala el QueueHandler en el root logger (idempotente, una vez por proceso)"""
+    with _setup_lock:
+        if _state['handler'] is not None:
+            return
+
+        if Config.LOG_FORMAT == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        handler = NonBlockingQueueHandler(log_queue)
+        sampler = SamplingFilter(Config.LOG_SAMPLE_EVERY)
+        handler.addFilter(sampler)
+
+        root = logging.getLogger()
+        root.setLevel(Config.LOG_LEVEL)
+        root.addHandler(handler)
+        for name, level in parse_levels(Config.LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)  # vacía la cola al salir
+
+        _state.update(handler=handler, listener=listener, sampler=sampler)
+
+
+def get_logging_stats():
+    handler = _state['handler']
+    if handler is None:
+        return {'configured': False}
+    return {
+        'configured': True,
+        'format': Config.LOG_FORMAT,
+        'level': logging.getLevelName(logging.getLogger().level),
+        'module_levels': parse_levels(Config.LOG_LEVELS),
+        'enqueued': handler.enqueued,
+        'dropped': handler.dropped,
+        'sampled_out': _state['sampler'].sampled_out,
+        'sample_every': _state['sampler'].every,
+        'queue_size': handler.queue.qsize(),
+        'queue_capacity': handler.queue.maxsize
+    }
@@ -0,0 +1,173 @@
+"""
+Migration: Incremental analytics (analytics_state)
+Una fila por usuario con los agregados que antes se recalculaban leyendo todo
+el historial en cada GET /dashboard/analytics:
+
+- Cierres: cantidad, ganadoras/perdedoras, sumas, extremos y la racha actual
+  (lead_zeros / run_sign / run_len: ceros al tope y la corrida de igual signo
+  que sigue, suficiente para reproducir get_consecutive_wins_losses)
+- Equity curve: peak, max drawdown y último equity
+
+Los triggers aplican el caso normal (una posición que cierra, un snapshot de
+equity nuevo, en orden cronológico). Cualquier otra cosa (pnl editado después
+del cierre, reapertura, borrado, cierre con closed_at anterior al último)
+marca la fila dirty y AnalyticsService la reconstruye desde las tablas en la
+próxima lectura. seq cambia en cada evento para que una reconstrucción
+concurrente no pise un cambio más nuevo.
+
+No hace backfill: una fila que no existe se construye en la primera lectura.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+
+# Una posición cuenta para analytics si está cerrada y tiene pnl
+COUNTED = "{row}.status = 'closed' AND {row}.pnl IS NOT NULL"
+
+TOUCH_STATE = """
+    INSERT INTO analytics_state (user_id) VALUES ({user_id})
+    ON CONFLICT(user_id) DO NOTHING;
+    UPDATE analytics_state SET seq = seq + 1 WHERE user_id = {user_id};
+"""
+
+MARK_DIRTY = """
+    UPDATE analytics_state SET dirty = 1
+    WHERE user_id = {user_id} AND dirty = 0 AND ({condition});
+"""
+
+# Trade nuevo al tope del historial (ORDER BY closed_at DESC)
+APPLY_CLOSE = """
+    UPDATE analytics_state SET
+        closed_count = closed_count + 1,
+        win_count = win_count + (NEW.pnl > 0),
+        loss_count = loss_count + (NEW.pnl < 0),
+        win_sum = win_sum + (CASE WHEN NEW.pnl > 0 THEN NEW.pnl ELSE 0 END),
+        loss_sum = loss_sum + (CASE WHEN NEW.pnl < 0 THEN NEW.pnl ELSE 0 END),
+        largest_win = CASE WHEN NEW.pnl > largest_win THEN NEW.pnl ELSE largest_win END,
+        largest_loss = CASE WHEN NEW.pnl < largest_loss THEN NEW.pnl ELSE largest_loss END,
+        lead_zeros = CASE WHEN NEW.pnl = 0 THEN lead_zeros + 1 ELSE 0 END,
+        run_len = CASE
+            WHEN NEW.pnl = 0 THEN run_len
+            WHEN lead_zeros = 0 AND run_sign = (CASE WHEN NEW.pnl > 0 THEN 1 ELSE -1 END) THEN run_len + 1
+            ELSE 1
+        END,
+        run_sign = CASE WHEN NEW.pnl = 0 THEN run_sign WHEN NEW.pnl > 0 THEN 1 ELSE -1 END,
+        last_closed_at = NEW.closed_at,
+        last_closed_id = NEW.id
+    WHERE user_id = NEW.user_id AND dirty = 0
+    AND NOT (OLD.status = 'closed' AND OLD.pnl IS NOT NULL) AND (
+        closed_count = 0
+        OR NEW.closed_at >= last_closed_at
+        OR (last_closed_at IS NULL AND NEW.closed_at IS NOT NULL)
+    );
+"""
+
+# Snapshot nuevo al final de la curva (ORDER BY timestamp ASC)
+APPLY_EQUITY = """
+    UPDATE analytics_state SET
+        peak = CASE WHEN equity_count = 0 OR NEW.equity > peak THEN NEW.equity ELSE peak END,
+        max_drawdown = MAX(max_drawdown,
+            (CASE WHEN equity_count = 0 OR NEW.equity > peak THEN NEW.equity ELSE peak END) - NEW.equity),
+        last_equity = NEW.equity,
+        last_equity_at = NEW.timestamp,
+        last_equity_id = NEW.id,
+        equity_count = equity_count + 1
+    WHERE user_id = NEW.user_id AND dirty = 0 AND (
+        equity_count = 0 OR NEW.timestamp >= last_equity_at
+    );
+"""
+
+# (trigger, evento, tabla, condición WHEN, cuerpo)
+TRIGGERS = [
+    ('trg_positions_analytics_insert', 'INSERT', 'positions',
+     COUNTED.format(row='NEW'),
+     TOUCH_STATE.format(user_id='NEW.user_id')
+     + MARK_DIRTY.format(user_id='NEW.user_id', condition='1')),
+    ('trg_positions_analytics_update', 'UPDATE OF status, pnl, closed_at', 'positions',
+     f"({COUNTED.format(row='NEW')} AND NOT ({COUNTED.format(row='OLD')})) OR "
+     f"({COUNTED.format(row='OLD')} AND (NEW.status IS NOT OLD.status OR NEW.pnl IS NOT OLD.pnl "
+     f"OR NEW.closed_at IS NOT OLD.closed_at OR NEW.user_id IS NOT OLD.user_id))",
+     TOUCH_STATE.format(user_id='NEW.user_id')
+     + APPLY_CLOSE
+     + MARK_DIRTY.format(user_id='NEW.user_id', condition=(
+         f"({COUNTED.format(row='OLD')}) OR last_closed_id IS NOT NEW.id"))
+     + TOUCH_STATE.format(user_id='OLD.user_id')
+     + MARK_DIRTY.format(user_id='OLD.user_id', condition='OLD.user_id IS NOT NEW.user_id')),
+    ('trg_positions_analytics_delete', 'DELETE', 'positions',
+     COUNTED.format(row='OLD'),
+     TOUCH_STATE.format(user_id='OLD.user_id')
+     + MARK_DIRTY.format(user_id='OLD.user_id', condition='1')),
+    ('trg_equity_curve_analytics_insert', 'INSERT', 'equity_curve',
+     None,
+     TOUCH_STATE.format(user_id='NEW.user_id')
+     + APPLY_EQUITY
+     + MARK_DIRTY.format(user_id='NEW.user_id', condition='last_equity_id IS NOT NEW.id')),
+    ('trg_equity_curve_analytics_update', 'UPDATE', 'equity_curve',
+     None,
+     TOUCH_STATE.format(user_id='NEW.user_id')
+     + MARK_DIRTY.format(user_id='NEW.user_id', condition='1')
+     + TOUCH_STATE.format(user_id='OLD.user_id')
+     + MARK_DIRTY.format(user_id='OLD.user_id', condition='1')),
+    ('trg_equity_curve_analytics_delete', 'DELETE', 'equity_curve',
+     None,
+     TOUCH_STATE.format(user_id='OLD.user_id')
+     + MARK_DIRTY.format(user_id='OLD.user_id', condition='1')),
+]
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_state (
+            user_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL DEFAULT 0,
+            dirty INTEGER NOT NULL DEFAULT 1,
+            closed_count INTEGER NOT NULL DEFAULT 0,
+            win_count INTEGER NOT NULL DEFAULT 0,
+            loss_count INTEGER NOT NULL DEFAULT 0,
+            win_sum REAL NOT NULL DEFAULT 0,
+            loss_sum REAL NOT NULL DEFAULT 0,
+            largest_win REAL NOT NULL DEFAULT 0,
+            largest_loss REAL NOT NULL DEFAULT 0,
+            lead_zeros INTEGER NOT NULL DEFAULT 0,
+            run_sign INTEGER NOT NULL DEFAULT 0,
+            run_len INTEGER NOT NULL DEFAULT 0,
+            last_closed_at TEXT,
+            last_closed_id INTEGER,
+            equity_count INTEGER NOT NULL DEFAULT 0,
+            peak REAL NOT NULL DEFAULT 0,
+            max_drawdown REAL NOT NULL DEFAULT 0,
+            last_equity REAL NOT NULL DEFAULT 0,
+            last_equity_at TEXT,
+            last_equity_id INTEGER
+        )
+    """)
+    print("✅ Tabla analytics_state creada")
+
+    for name, event, table, condition, body in TRIGGERS:
+        when = f"WHEN {condition}" if condition else ""
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            AFTER {event} ON {table}
+            {when}
+            BEGIN
+                {body}
+            END
+        """)
+    print(f"✅ {len(TRIGGERS)} triggers de analytics_state creados")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
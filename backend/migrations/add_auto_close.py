@@ -1,44 +1,32 @@
 """
 Migration: Add auto_close_enabled column to bot_config table
 """
-import sqlite3
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import Config
+from database import get_db_connection
+from migrations.helpers import add_column_if_missing
 
-def run_migration():
+def upgrade(cursor):
     """Add auto_close_enabled column to bot_config if it doesn't exist"""
+    if add_column_if_missing(cursor, 'bot_config', 'auto_close_enabled BOOLEAN DEFAULT 1'):
+        print("✅ Migration completed: auto_close_enabled column added")
+    else:
+        print("ℹ️ Column auto_close_enabled already exists, skipping migration")
+
+def run_migration():
+    """Standalone run (outside the migration runner)"""
+    conn = get_db_connection()
     try:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Check if column already exists
-        cursor.execute("PRAGMA table_info(bot_config)")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        if 'auto_close_enabled' not in columns:
-            print("Adding auto_close_enabled column to bot_config...")
-            cursor.execute('''
-                ALTER TABLE bot_config 
-                ADD COLUMN auto_close_enabled BOOLEAN DEFAULT 1
-            ''')
-            conn.commit()
-            print("✅ Migration completed: auto_close_enabled column added")
-        else:
-            print("ℹ️ Column auto_close_enabled already exists, skipping migration")
-        
-        conn.close()
-        
-    except sqlite3.OperationalError as e:
-        if "duplicate column" in str(e).lower():
-            print("ℹ️ Column auto_close_enabled already exists (caught duplicate error)")
-        else:
-            print(f"⚠️ Migration error (non-critical): {str(e)}")
+        upgrade(conn.cursor())
+        conn.commit()
     except Exception as e:
+        conn.rollback()
         print(f"⚠️ Migration error (non-critical): {str(e)}")
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
     run_migration()
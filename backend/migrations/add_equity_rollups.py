@@ -0,0 +1,149 @@
+"""
+Migration: Equity curve rollups (1m / 1h / 1d OHLC)
+equity_rollups guarda una vela por usuario, resolución y bucket, mantenida
+por un trigger sobre equity_curve: /dashboard/equity-curve sirve ventanas
+largas desde la resolución más gruesa que alcanza en vez de mandar cada
+snapshot crudo.
+
+Los snapshots crudos viejos se podan (EquitySnapshotter). Lo podado se
+acumula en analytics_state.base_* (peak, max drawdown, último equity) para
+que una reconstrucción de analytics siga cubriendo todo el historial, y el
+trigger de borrado de analytics ignora esas filas (timestamp <=
+base_last_equity_at): podar no marca el estado dirty.
+
+Incluye el backfill de las velas desde los snapshots existentes.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from migrations.helpers import add_column_if_missing
+from migrations.add_analytics_state import TOUCH_STATE, MARK_DIRTY
+
+# (resolución, bucket en SQL sobre un timestamp ISO, bucket en strftime, segundos)
+ROLLUP_RESOLUTIONS = (
+    ('1m', "substr({ts}, 1, 16)", '%Y-%m-%dT%H:%M', 60),
+    ('1h', "substr({ts}, 1, 13) || ':00'", '%Y-%m-%dT%H:00', 3600),
+    ('1d', "substr({ts}, 1, 10) || 'T00:00'", '%Y-%m-%dT00:00', 86400),
+)
+
+# Un snapshot entra en las tres velas; fuera de orden sólo mueve open/close
+# si es más viejo/nuevo que lo que ya tiene la vela
+UPSERT_ROLLUPS = """
+    INSERT INTO equity_rollups (user_id, resolution, bucket, open, high, low, close, samples, first_at, last_at)
+    VALUES {values}
+    ON CONFLICT(user_id, resolution, bucket) DO UPDATE SET
+        open = CASE WHEN excluded.first_at < first_at THEN excluded.open ELSE open END,
+        high = MAX(high, excluded.high),
+        low = MIN(low, excluded.low),
+        close = CASE WHEN excluded.last_at >= last_at THEN excluded.close ELSE close END,
+        samples = samples + 1,
+        first_at = MIN(first_at, excluded.first_at),
+        last_at = MAX(last_at, excluded.last_at);
+""".format(values=', '.join(
+    f"(NEW.user_id, '{name}', {bucket.format(ts='NEW.timestamp')}, "
+    "NEW.equity, NEW.equity, NEW.equity, NEW.equity, 1, NEW.timestamp, NEW.timestamp)"
+    for name, bucket, _, _ in ROLLUP_RESOLUTIONS
+))
+
+BASE_COLUMNS = [
+    'base_equity_count INTEGER NOT NULL DEFAULT 0',
+    'base_peak REAL NOT NULL DEFAULT 0',
+    'base_max_drawdown REAL NOT NULL DEFAULT 0',
+    'base_last_equity REAL NOT NULL DEFAULT 0',
+    'base_last_equity_at TEXT',
+]
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS equity_rollups (
+            user_id INTEGER NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            first_at TEXT NOT NULL,
+            last_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, resolution, bucket)
+        ) WITHOUT ROWID
+    """)
+    print("✅ Tabla equity_rollups creada")
+
+    # Ventanas por usuario (curva cruda) y poda por usuario
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_equity_curve_user_timestamp
+        ON equity_curve(user_id, timestamp)
+    """)
+    print("✅ Índice idx_equity_curve_user_timestamp creado")
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_equity_curve_rollups_insert
+        AFTER INSERT ON equity_curve
+        BEGIN
+            {body}
+        END
+    """.format(body=UPSERT_ROLLUPS))
+    print("✅ Trigger trg_equity_curve_rollups_insert creado")
+
+    # Backfill: open/close del primer/último snapshot de cada vela (empates por id,
+    # igual que el trigger)
+    for name, bucket, _, _ in ROLLUP_RESOLUTIONS:
+        cursor.execute(f"""
+            INSERT INTO equity_rollups (user_id, resolution, bucket, open, high, low, close, samples, first_at, last_at)
+            SELECT g.user_id, '{name}', g.bucket,
+                (SELECT equity FROM equity_curve e
+                 WHERE e.user_id = g.user_id AND e.timestamp = g.first_at ORDER BY id LIMIT 1),
+                g.high, g.low,
+                (SELECT equity FROM equity_curve e
+                 WHERE e.user_id = g.user_id AND e.timestamp = g.last_at ORDER BY id DESC LIMIT 1),
+                g.samples, g.first_at, g.last_at
+            FROM (
+                SELECT user_id, {bucket.format(ts='timestamp')} AS bucket,
+                       MAX(equity) AS high, MIN(equity) AS low, COUNT(*) AS samples,
+                       MIN(timestamp) AS first_at, MAX(timestamp) AS last_at
+                FROM equity_curve
+                GROUP BY user_id, bucket
+            ) g
+            WHERE true
+            ON CONFLICT(user_id, resolution, bucket) DO NOTHING
+        """)
+        print(f"✅ Velas {name}: {cursor.rowcount} creadas desde equity_curve")
+
+    # Historial podado de la equity curve, acumulado por usuario
+    for column_def in BASE_COLUMNS:
+        if add_column_if_missing(cursor, 'analytics_state', column_def):
+            print(f"✅ Añadida columna analytics_state.{column_def.split()[0]}")
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_equity_curve_analytics_delete")
+    cursor.execute("""
+        CREATE TRIGGER trg_equity_curve_analytics_delete
+        AFTER DELETE ON equity_curve
+        WHEN OLD.timestamp > COALESCE(
+            (SELECT base_last_equity_at FROM analytics_state WHERE user_id = OLD.user_id), '')
+        BEGIN
+            {touch}
+            {dirty}
+        END
+    """.format(touch=TOUCH_STATE.format(user_id='OLD.user_id'),
+               dirty=MARK_DIRTY.format(user_id='OLD.user_id', condition='1')))
+    print("✅ Trigger trg_equity_curve_analytics_delete recreado (ignora lo podado)")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
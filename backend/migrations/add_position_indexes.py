@@ -0,0 +1,33 @@
+"""
+Migration: Partial index on open positions by symbol
+Repricing (PriceMonitor, tick buffer, webhook) updates every open position
+of a symbol in one statement; without this index each UPDATE scans the table
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_positions_open_symbol
+        ON positions(symbol) WHERE status = 'open'
+    """)
+    print("✅ Índice idx_positions_open_symbol creado")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,32 @@
+"""
+Migration: Add updated_at / exit_price columns to positions
+PriceMonitor, RealTimePriceService, TradingEngine and PanicModeService write
+these columns but the base schema never created them
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from migrations.helpers import add_column_if_missing
+
+def upgrade(cursor):
+    for column in ("updated_at TEXT", "exit_price REAL"):
+        if add_column_if_missing(cursor, 'positions', column):
+            print(f"✅ Añadida columna: {column.split()[0]}")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,33 @@
+"""
+Migration: Composite index for the positions listing
+/dashboard/positions filters by (user_id, status) and pages by opened_at
+(keyset: opened_at, id); the index serves both the filter and the order
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_positions_user_status_opened
+        ON positions(user_id, status, opened_at)
+    """)
+    print("✅ Índice idx_positions_user_status_opened creado")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
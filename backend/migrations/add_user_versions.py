@@ -0,0 +1,103 @@
+"""
+Migration: Per-user change counter (ETag of /dashboard/snapshot)
+user_versions.version = valor de una secuencia global (MAX(version) + 1) en el
+último cambio de cualquier dato del dashboard de ese usuario. Lo mantienen
+triggers, así que ningún write path tiene que acordarse de incrementarlo.
+user_id = 0 es el estado global (connection_status).
+
+Un solo índice sobre version sirve para las dos cosas: MAX(version) O(log n)
+y "qué usuarios cambiaron desde la versión X" (ChangeTracker).
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+
+GLOBAL_USER_ID = 0
+
+BUMP_VERSION = """
+    INSERT INTO user_versions (user_id, version)
+    VALUES ({user_id}, (SELECT COALESCE(MAX(version), 0) + 1 FROM user_versions))
+    ON CONFLICT(user_id) DO UPDATE SET version = excluded.version;
+"""
+
+# Columnas de positions que cambian el estado del dashboard: los UPDATE de otras
+# columnas (trailing stop, highest_price, updated_at) ni siquiera disparan el trigger.
+# current_price/pnl quedan fuera: cambian en cada tick (flush del tick buffer,
+# reprice, fan-out), así que un trigger por fila duplicaría el costo de esos
+# writes y el ETag de cualquier usuario con posiciones abiertas nunca daría 304.
+# Los precios en vivo llegan por SSE y /dashboard/realtime-prices
+POSITION_COLUMNS = (
+    'symbol', 'side', 'quantity', 'remaining_quantity', 'entry_price',
+    'status', 'opened_at', 'closed_at'
+)
+
+# (trigger, evento, tabla, de quién es la fila, condición)
+TRIGGERS = [
+    ('trg_positions_version_insert', 'INSERT', 'positions', 'NEW.user_id', None),
+    ('trg_positions_version_update', f"UPDATE OF {', '.join(POSITION_COLUMNS)}", 'positions', 'NEW.user_id',
+     ' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in POSITION_COLUMNS)),
+    ('trg_positions_version_delete', 'DELETE', 'positions', 'OLD.user_id', None),
+    ('trg_trading_stats_version_insert', 'INSERT', 'trading_stats', 'NEW.user_id', None),
+    ('trg_trading_stats_version_update', 'UPDATE', 'trading_stats', 'NEW.user_id', None),
+    ('trg_bot_config_version_insert', 'INSERT', 'bot_config', 'NEW.user_id', None),
+    ('trg_bot_config_version_update', 'UPDATE', 'bot_config', 'NEW.user_id', None),
+    ('trg_equity_curve_version_insert', 'INSERT', 'equity_curve', 'NEW.user_id', None),
+    ('trg_connection_status_version_insert', 'INSERT', 'connection_status', str(GLOBAL_USER_ID), None),
+    ('trg_connection_status_version_update', 'UPDATE', 'connection_status', str(GLOBAL_USER_ID), None),
+]
+
+def create_trigger(cursor, name, event, table, user_id, condition):
+    when = f"WHEN {condition}" if condition else ""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {name}
+        AFTER {event} ON {table}
+        {when}
+        BEGIN
+            {BUMP_VERSION.format(user_id=user_id)}
+        END
+    """)
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_versions_version
+        ON user_versions(version)
+    """)
+    print("✅ Tabla user_versions creada")
+
+    for trigger in TRIGGERS:
+        create_trigger(cursor, *trigger)
+    print(f"✅ {len(TRIGGERS)} triggers de user_versions creados")
+
+    # Estado inicial: todos los usuarios existentes arrancan en la versión 1
+    cursor.execute("""
+        INSERT OR IGNORE INTO user_versions (user_id, version)
+        SELECT id, 1 FROM users
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO user_versions (user_id, version)
+        VALUES (?, 1)
+    """, (GLOBAL_USER_ID,))
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
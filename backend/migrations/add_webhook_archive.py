@@ -0,0 +1,53 @@
+"""
+Migration: Webhook journal retention
+Index on webhooks.received_at (listings ORDER BY received_at DESC LIMIT n
+without scanning the table) and the catalog of daily archive files written
+by WebhookArchiver
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_webhooks_received_at
+        ON webhooks(received_at)
+    """)
+    print("✅ Índice idx_webhooks_received_at creado")
+
+    # Una fila por archivo: un día puede tener más de un archivo si se re-archiva
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_archives (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            day TEXT NOT NULL,
+            path TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            first_id INTEGER,
+            last_id INTEGER,
+            bytes INTEGER,
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_webhook_archives_day
+        ON webhook_archives(day)
+    """)
+    print("✅ Tabla webhook_archives creada")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
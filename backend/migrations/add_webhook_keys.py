@@ -0,0 +1,40 @@
+"""
+Migration: Webhook idempotency keys
+Unique index behind services.idempotency: a retried or duplicated
+TradingView alert is rejected before any trading work
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+
+def upgrade(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_keys (
+            idempotency_key TEXT PRIMARY KEY,
+            webhook_id INTEGER,
+            received_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_webhook_keys_received_at
+        ON webhook_keys(received_at)
+    """)
+    print("✅ Tabla webhook_keys creada")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
@@ -0,0 +1,17 @@
+"""
+Shared helpers for migrations (operate on a cursor, never commit)
+"""
+
+
+def get_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+def add_column_if_missing(cursor, table, column_def):
+    """ALTER TABLE ... ADD COLUMN only if the column does not exist yet"""
+    column = column_def.split()[0]
+    if column in get_columns(cursor, table):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column_def}")
+    return True
@@ -2,9 +2,13 @@
 PostgreSQL Migration Script
 Migrates SQLite database to PostgreSQL for production reliability
 """
-import sqlite3
+import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+
 def generate_postgresql_schema():
     """
     Genera el schema SQL completo para PostgreSQL
@@ -232,7 +236,7 @@ def export_data_to_sql():
     Exporta datos de SQLite a SQL statements para PostgreSQL
     """
     try:
-        conn = sqlite3.connect('trading_bot.db')
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Obtener todos los datos
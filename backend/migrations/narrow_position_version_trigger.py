@@ -0,0 +1,36 @@
+"""
+Migration: positions version trigger without current_price/pnl
+Las bases migradas con la versión 13 tienen el trigger viejo, que se disparaba
+por fila en cada tick (reprice, flush del tick buffer) y mantenía el ETag de
+/dashboard/snapshot siempre invalidado. Se recrea con las columnas actuales de
+add_user_versions.POSITION_COLUMNS.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection
+from migrations.add_user_versions import TRIGGERS, create_trigger
+
+POSITION_UPDATE_TRIGGER = 'trg_positions_version_update'
+
+def upgrade(cursor):
+    cursor.execute(f"DROP TRIGGER IF EXISTS {POSITION_UPDATE_TRIGGER}")
+    create_trigger(cursor, *next(t for t in TRIGGERS if t[0] == POSITION_UPDATE_TRIGGER))
+    print(f"✅ Trigger {POSITION_UPDATE_TRIGGER} recreado (sin current_price/pnl)")
+
+def run_migration():
+    """Ejecución standalone (fuera del migration runner)"""
+    conn = get_db_connection()
+    try:
+        upgrade(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error en migración: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    run_migration()
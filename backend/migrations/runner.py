@@ -0,0 +1,126 @@
+"""
+Versioned migration runner
+Each migration runs once; applied versions are recorded in schema_version.
+Boot-time cost when the schema is current is a single version check.
+"""
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import connect, create_schema
+from file_lock import FileLock
+from migrations import (
+    add_demo_mode,
+    add_auto_close,
+    repair_database,
+    add_risk_management,
+    add_professional_safety,
+    add_position_tracking,
+    add_position_indexes,
+    add_webhook_queue,
+    add_webhook_keys,
+    add_webhook_archive,
+    add_user_positions_index,
+    add_user_versions,
+    add_analytics_state,
+    add_equity_rollups,
+    narrow_position_version_trigger
+)
+
+# (version, name, upgrade(cursor)) - append only, never renumber
+MIGRATIONS = [
+    (1, 'base_schema', create_schema),
+    (2, 'add_demo_mode', add_demo_mode.upgrade),
+    (3, 'add_auto_close', add_auto_close.upgrade),
+    (4, 'repair_database', repair_database.upgrade),
+    (5, 'add_risk_management', add_risk_management.upgrade),
+    (6, 'add_professional_safety', add_professional_safety.upgrade),
+    (7, 'add_position_tracking', add_position_tracking.upgrade),
+    (8, 'add_position_indexes', add_position_indexes.upgrade),
+    (9, 'add_webhook_queue', add_webhook_queue.upgrade),
+    (10, 'add_webhook_keys', add_webhook_keys.upgrade),
+    (11, 'add_webhook_archive', add_webhook_archive.upgrade),
+    (12, 'add_user_positions_index', add_user_positions_index.upgrade),
+    (13, 'add_user_versions', add_user_versions.upgrade),
+    (14, 'add_analytics_state', add_analytics_state.upgrade),
+    (15, 'add_equity_rollups', add_equity_rollups.upgrade),
+    (16, 'narrow_position_version_trigger', narrow_position_version_trigger.upgrade),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Current schema version, 0 if the database has never been migrated"""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except Exception:
+        return 0
+    return row[0] or 0
+
+
+def _apply_pending(conn):
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT DEFAULT (datetime('now'))
+            )
+        ''')
+        current = get_schema_version(conn)
+        pending = [m for m in MIGRATIONS if m[0] > current]
+
+        for version, name, upgrade in pending:
+            print(f"🔧 Migración {version:03d}: {name}")
+            upgrade(cursor)
+            cursor.execute(
+                'INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                (version, name)
+            )
+
+        conn.commit()
+        return [name for _, name, _ in pending]
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def run_migrations(lock_timeout=60):
+    """
+    Applies pending migrations in one transaction.
+    A file lock next to the database makes sure only one gunicorn worker
+    migrates; the others wait and then see the new version.
+    """
+    conn = connect()
+    try:
+        if get_schema_version(conn) >= LATEST_VERSION:
+            return []
+
+        lock = FileLock(f"{Config.DATABASE_PATH}.migrate.lock")
+        if not lock.acquire(timeout=lock_timeout):
+            raise TimeoutError("Timed out waiting for the migration lock")
+
+        try:
+            # Another worker may have migrated while we waited for the lock
+            if get_schema_version(conn) >= LATEST_VERSION:
+                return []
+
+            start = time.perf_counter()
+            applied = _apply_pending(conn)
+            print(f"✅ Schema en versión {LATEST_VERSION} "
+                  f"({len(applied)} migraciones, {(time.perf_counter() - start) * 1000:.0f} ms)")
+            return applied
+        finally:
+            lock.release()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    run_migrations()
@@ -1,15 +1,14 @@
 """
 Script para resetear y ver usuarios en la base de datos
 """
-import sqlite3
 from auth_utils import hash_password
 from config import Config
+from database import get_db_connection
 
 def list_users():
     """Lista todos los usuarios en la base de datos"""
     try:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('SELECT id, email, created_at FROM users')
@@ -34,7 +33,7 @@ def list_users():
 def delete_user(email):
     """Elimina un usuario por email"""
     try:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Get user_id first
@@ -67,7 +66,7 @@ def delete_user(email):
 def create_user(email, password):
     """Crea un nuevo usuario"""
     try:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Check if user exists
@@ -106,7 +105,7 @@ def create_user(email, password):
 def reset_all():
     """Elimina TODOS los usuarios (usar con precaución)"""
     try:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM positions')
@@ -0,0 +1,85 @@
+"""
+Reporte nocturno de riesgo: Sharpe, Sortino, Calmar, expectancy, drawdown
+móvil y tiempo bajo el agua de todos los usuarios (services/risk_metrics).
+Los usuarios se procesan en lotes: dos queries y un cálculo NumPy por lote.
+
+Uso (cron):
+    python risk_report.py [--days 90] [--resolution 1h] [--rolling-days 30]
+                          [--risk-free 0.0] [--batch 500] [--output report.ndjson|report.csv]
+Sin --output escribe NDJSON a stdout.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from database import get_db_connection
+from services.risk_metrics import (
+    NUMPY_AVAILABLE, RESOLUTIONS, DRAWDOWN_KEYS, DEFAULT_DAYS, DEFAULT_ROLLING_DAYS,
+    compute_risk_report, default_resolution
+)
+
+COLUMNS = ('user_id', 'trades', 'win_rate', 'expectancy', 'avg_win', 'avg_loss', 'payoff_ratio',
+           'profit_factor', 'periods', 'mean_return', 'volatility', 'sharpe', 'sortino') + DRAWDOWN_KEYS
+
+
+def user_batches(batch_size):
+    conn = get_db_connection()
+    try:
+        user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id').fetchall()]
+    finally:
+        conn.close()
+    for i in range(0, len(user_ids), batch_size):
+        yield user_ids[i:i + batch_size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reporte de métricas de riesgo por usuario')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS)
+    parser.add_argument('--resolution', choices=RESOLUTIONS, default=None)
+    parser.add_argument('--rolling-days', type=int, default=DEFAULT_ROLLING_DAYS)
+    parser.add_argument('--risk-free', type=float, default=0.0, help='tasa libre de riesgo anual (0.04 = 4%%)')
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("❌ numpy no disponible", file=sys.stderr)
+        return 1
+
+    resolution = args.resolution or default_resolution(args.days)
+    now = datetime.now()
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    as_csv = bool(args.output and args.output.endswith('.csv'))
+    writer = csv.DictWriter(out, fieldnames=COLUMNS) if as_csv else None
+    if writer:
+        writer.writeheader()
+
+    start = time.perf_counter()
+    users = 0
+    try:
+        for user_ids in user_batches(args.batch):
+            conn = get_db_connection()
+            try:
+                report = compute_risk_report(conn.cursor(), user_ids, args.days, resolution,
+                                             args.rolling_days, args.risk_free, now)
+            finally:
+                conn.close()
+            for row in report:
+                if writer:
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(row) + '\n')
+            users += len(report)
+    finally:
+        if args.output:
+            out.close()
+
+    print(f"✅ Reporte de riesgo: {users} usuarios, {args.days} días ({resolution}) "
+          f"en {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
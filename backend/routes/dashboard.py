@@ -1,64 +1,49 @@
-from flask import Blueprint, request, jsonify
-from auth_utils import token_required
+from flask import Blueprint, Response, request, jsonify
+from auth_utils import token_required, decode_token
+from config import Config
 from database import get_db_connection
+from datetime import datetime, timedelta
+import base64
+import json
+from services.webhook_archiver import webhook_archiver
+from services.event_hub import event_hub
+from services.change_tracker import change_tracker
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
-@dashboard_bp.route('/stats', methods=['GET'])
-@token_required
-def get_stats(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get trading stats - create if missing
+def read_user_stats(cursor, user_id):
+    """Stats del dashboard, sólo lectura. Returns: dict, o None si faltan las filas del usuario"""
     cursor.execute('''
         SELECT total_trades, winning_trades, losing_trades, total_profit
         FROM trading_stats WHERE user_id = ?
     ''', (user_id,))
     stats = cursor.fetchone()
     
-    if not stats:
-        # Create trading stats if missing
-        cursor.execute('INSERT INTO trading_stats (user_id) VALUES (?)', (user_id,))
-        conn.commit()
-        cursor.execute('''
-            SELECT total_trades, winning_trades, losing_trades, total_profit
-            FROM trading_stats WHERE user_id = ?
-        ''', (user_id,))
-        stats = cursor.fetchone()
-    
-    # Get bot status - create if missing
     cursor.execute('SELECT is_active, demo_mode FROM bot_config WHERE user_id = ?', (user_id,))
     bot_config = cursor.fetchone()
     
-    if not bot_config:
-        # Create bot config if missing
-        cursor.execute('INSERT INTO bot_config (user_id, is_active, demo_mode) VALUES (?, ?, ?)',
-                       (user_id, 0, 1))
-        conn.commit()
-        bot_config = {'is_active': 0, 'demo_mode': 1}
+    if not stats or not bot_config:
+        return None
     
-    # Get open positions count
+    # Open / closed positions count (index-only: idx_positions_user_status_opened)
     cursor.execute('''
-        SELECT COUNT(*) as open_count FROM positions 
-        WHERE user_id = ? AND status = 'open'
+        SELECT status, COUNT(*) as count FROM positions 
+        WHERE user_id = ? AND status IN ('open', 'closed')
+        GROUP BY status
     ''', (user_id,))
-    positions_data = cursor.fetchone()
-    
-    conn.close()
+    positions_data = {row['status']: row['count'] for row in cursor.fetchall()}
     
     win_rate = 0
     if stats['total_trades'] > 0:
         win_rate = (stats['winning_trades'] / stats['total_trades']) * 100
     
     # Handle demo_mode field - might not exist in old databases
-    demo_mode = bot_config.get('demo_mode', 1) if isinstance(bot_config, dict) else 1
     try:
         demo_mode = bool(bot_config['demo_mode'])
     except (KeyError, TypeError):
         demo_mode = True
     
-    return jsonify({
+    return {
         'total_trades': stats['total_trades'],
         'winning_trades': stats['winning_trades'],
         'losing_trades': stats['losing_trades'],
@@ -66,42 +51,116 @@ def get_stats(user_id):
         'total_profit': stats['total_profit'],
         'bot_active': bool(bot_config['is_active']),
         'demo_mode': demo_mode,
-        'open_positions': positions_data['open_count']
-    }), 200
+        'open_positions': positions_data.get('open', 0),
+        'closed_positions': positions_data.get('closed', 0)
+    }
+
+@dashboard_bp.route('/stats', methods=['GET'])
+@token_required
+def get_stats(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    stats = read_user_stats(cursor, user_id)
+    
+    if stats is None:
+        # Create trading stats / bot config if missing
+        cursor.execute('SELECT 1 FROM trading_stats WHERE user_id = ?', (user_id,))
+        if not cursor.fetchone():
+            cursor.execute('INSERT INTO trading_stats (user_id) VALUES (?)', (user_id,))
+        cursor.execute('SELECT 1 FROM bot_config WHERE user_id = ?', (user_id,))
+        if not cursor.fetchone():
+            cursor.execute('INSERT INTO bot_config (user_id, is_active, demo_mode) VALUES (?, ?, ?)',
+                           (user_id, 0, 1))
+        conn.commit()
+        stats = read_user_stats(cursor, user_id)
+    
+    conn.close()
+    
+    return jsonify(stats), 200
+
+POSITION_STATUSES = ('open', 'closed', 'all')
+POSITIONS_PAGE_DEFAULT = 100
+POSITIONS_PAGE_MAX = 500
+
+
+def encode_cursor(opened_at, position_id):
+    """Opaque keyset cursor: last (opened_at, id) of the page"""
+    raw = json.dumps([opened_at, position_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    opened_at, position_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return opened_at, int(position_id)
+
 
 @dashboard_bp.route('/positions', methods=['GET'])
 @token_required
 def get_positions(user_id):
+    """
+    Keyset-paginated positions, newest first.
+    ?status=open (default) | closed | all  &symbol=  &limit=  &cursor=<next_cursor>
+    """
+    status = request.args.get('status', 'open').lower()
+    if status not in POSITION_STATUSES:
+        return jsonify({'error': f"status must be one of {', '.join(POSITION_STATUSES)}"}), 400
+    
+    limit = request.args.get('limit', POSITIONS_PAGE_DEFAULT, type=int)
+    limit = max(1, min(limit, POSITIONS_PAGE_MAX))
+    
+    conditions = ['user_id = ?']
+    params = [user_id]
+    if status != 'all':
+        conditions.append('status = ?')
+        params.append(status)
+    
+    symbol = request.args.get('symbol')
+    if symbol:
+        conditions.append('symbol = ?')
+        params.append(symbol)
+    
+    # Keyset: rows strictly after the last (opened_at, id) of the previous page
+    cursor_arg = request.args.get('cursor')
+    if cursor_arg:
+        try:
+            after_opened_at, after_id = decode_cursor(cursor_arg)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        conditions.append('(opened_at < ? OR (opened_at = ? AND id < ?))')
+        params += [after_opened_at, after_opened_at, after_id]
+    
     conn = get_db_connection()
-    cursor = conn.cursor()
+    page = query_positions(conn.cursor(), conditions, params, limit)
+    conn.close()
     
-    cursor.execute('''
+    return jsonify({**page, 'status': status}), 200
+
+def query_positions(cursor, conditions, params, limit):
+    """Una página keyset: {positions, has_more, next_cursor}"""
+    cursor.execute(f'''
         SELECT id, symbol, side, quantity, entry_price, current_price, 
                pnl, status, opened_at, closed_at
         FROM positions 
-        WHERE user_id = ?
-        ORDER BY opened_at DESC
-    ''', (user_id,))
+        WHERE {' AND '.join(conditions)}
+        ORDER BY opened_at DESC, id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
     
     positions = cursor.fetchall()
-    conn.close()
     
-    positions_list = []
-    for pos in positions:
-        positions_list.append({
-            'id': pos['id'],
-            'symbol': pos['symbol'],
-            'side': pos['side'],
-            'quantity': pos['quantity'],
-            'entry_price': pos['entry_price'],
-            'current_price': pos['current_price'],
-            'pnl': pos['pnl'],
-            'status': pos['status'],
-            'opened_at': pos['opened_at'],
-            'closed_at': pos['closed_at']
-        })
-    
-    return jsonify({'positions': positions_list}), 200
+    has_more = len(positions) > limit
+    positions_list = [dict(pos) for pos in positions[:limit]]
+    next_cursor = None
+    if has_more:
+        last = positions_list[-1]
+        next_cursor = encode_cursor(last['opened_at'], last['id'])
+    
+    return {
+        'positions': positions_list,
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }
 
 @dashboard_bp.route('/toggle-bot', methods=['POST'])
 @token_required
@@ -157,7 +216,7 @@ def get_webhooks(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get last 50 webhooks
+    # Get last 50 webhooks (idx_webhooks_received_at: reads 50 index entries, no sort)
     cursor.execute('''
         SELECT id, payload, received_at
         FROM webhooks 
@@ -178,6 +237,25 @@ def get_webhooks(user_id):
     
     return jsonify({'webhooks': webhooks_list}), 200
 
+@dashboard_bp.route('/webhooks/archives', methods=['GET'])
+@token_required
+def get_webhook_archives(user_id):
+    """Archived webhook days (older than WEBHOOK_RETENTION_DAYS)"""
+    return jsonify({'archives': webhook_archiver.list_archives()}), 200
+
+@dashboard_bp.route('/webhooks/archives/<day>', methods=['GET'])
+@token_required
+def get_archived_webhooks(user_id, day):
+    """Webhooks of an archived day (YYYY-MM-DD), newest first; ?ticker=&limit="""
+    try:
+        datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'day must be YYYY-MM-DD'}), 400
+    
+    limit = min(request.args.get('limit', 50, type=int), 1000)
+    webhooks = webhook_archiver.query_archive(day, limit=limit, ticker=request.args.get('ticker'))
+    return jsonify({'day': day, 'count': len(webhooks), 'webhooks': webhooks}), 200
+
 @dashboard_bp.route('/close-position/<int:position_id>', methods=['POST'])
 @token_required
 def close_position(user_id, position_id):
@@ -266,15 +344,24 @@ def get_advanced_analytics(user_id):
 @dashboard_bp.route('/equity-curve', methods=['GET'])
 @token_required
 def get_equity_curve(user_id):
-    """Obtiene la equity curve para el gráfico"""
+    """
+    Obtiene la equity curve para el gráfico
+    ?hours=24 &max_points= (LTTB). Ventanas largas salen de las velas 1m/1h/1d.
+    """
     from services.analytics_service import analytics_service
     
     try:
         period_hours = request.args.get('hours', 24, type=int)
-        equity_curve = analytics_service.get_equity_curve(user_id, period_hours)
+        max_points = request.args.get('max_points', type=int)
+        if max_points is not None:
+            max_points = max(3, min(max_points, Config.EQUITY_CURVE_MAX_POINTS))
+        resolution, equity_curve = analytics_service.load_equity_curve(
+            user_id, period_hours, max_points=max_points
+        )
         
         return jsonify({
             'success': True,
+            'resolution': resolution,
             'equity_curve': equity_curve
         }), 200
         
@@ -285,39 +372,108 @@ def get_equity_curve(user_id):
         }), 500
 
 
+@dashboard_bp.route('/risk-metrics', methods=['GET'])
+@token_required
+def get_risk_metrics(user_id):
+    """
+    Métricas ajustadas por riesgo de los últimos N días
+    ?days=90 &resolution=raw|1m|1h|1d (default: 1h, o 1d si la ventana pasa la retención de 1h)
+    """
+    from services.analytics_service import analytics_service
+    from services.risk_metrics import NUMPY_AVAILABLE, RESOLUTIONS, default_resolution
+    
+    if not NUMPY_AVAILABLE:
+        return jsonify({'success': False, 'error': 'numpy no disponible'}), 503
+    
+    days = max(1, request.args.get('days', 90, type=int))
+    resolution = request.args.get('resolution')
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+    resolution = resolution or default_resolution(days)
+    
+    try:
+        metrics = analytics_service.get_risk_metrics(user_id, days, resolution)
+        return jsonify({
+            'success': True,
+            'days': days,
+            'resolution': resolution,
+            'metrics': metrics
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@dashboard_bp.route('/stream', methods=['GET'])
+def stream():
+    """Server-Sent Events: precios, posiciones y connection status en vivo
+    Reemplaza el polling de realtime-prices / connection-status / positions.
+    EventSource no puede mandar headers: el token va en ?token=
+    """
+    token = request.args.get('token')
+    if not token and 'Authorization' in request.headers:
+        token = request.headers['Authorization'].split(' ')[-1]
+
+    user_id = decode_token(token) if token else None
+    if user_id is None:
+        return jsonify({'error': 'Token is invalid or expired'}), 401
+
+    def generate():
+        # La suscripción nace con el primer chunk: si el cliente corta antes, no queda colgada
+        subscriber = event_hub.subscribe(user_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscriber.closed:
+                message = subscriber.get(timeout=Config.EVENT_STREAM_HEARTBEAT)
+                # Comentario SSE como keepalive (proxies cortan conexiones mudas)
+                yield message if message is not None else ': keepalive\n\n'
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def read_connection_status(cursor):
+    """Último status de conexión (Binance/PriceMonitor), o desconectado si nunca hubo"""
+    cursor.execute("""
+        SELECT source, status, last_update, latency_ms
+        FROM connection_status
+        ORDER BY last_update DESC
+        LIMIT 1
+    """)
+    
+    status = cursor.fetchone()
+    if status:
+        return {
+            'source': status['source'],
+            'status': status['status'],
+            'last_update': status['last_update'],
+            'latency_ms': status['latency_ms']
+        }
+    return {
+        'source': 'Unknown',
+        'status': 'disconnected',
+        'last_update': None,
+        'latency_ms': 0
+    }
+
+
 @dashboard_bp.route('/connection-status', methods=['GET'])
 def get_connection_status():
     """Obtiene el status de conexión para el LED indicator"""
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            SELECT source, status, last_update, latency_ms
-            FROM connection_status
-            ORDER BY last_update DESC
-            LIMIT 1
-        """)
-        
-        status = cursor.fetchone()
+        status = read_connection_status(conn.cursor())
         conn.close()
         
-        if status:
-            return jsonify({
-                'success': True,
-                'source': status['source'],
-                'status': status['status'],
-                'last_update': status['last_update'],
-                'latency_ms': status['latency_ms']
-            }), 200
-        else:
-            return jsonify({
-                'success': True,
-                'source': 'Unknown',
-                'status': 'disconnected',
-                'last_update': None,
-                'latency_ms': 0
-            }), 200
+        return jsonify({'success': True, **status}), 200
             
     except Exception as e:
         return jsonify({
@@ -329,43 +485,36 @@ def get_connection_status():
 @dashboard_bp.route('/realtime-prices', methods=['GET'])
 def get_realtime_prices():
     """Obtiene los últimos precios con colores (verde/rojo)
-    Combina datos de WebSocket (cryptos) y PriceMonitor (stocks)
+    Lee del price cache compartido (WebSocket, PriceMonitor y webhooks);
+    sólo consulta la base de datos si este proceso no tiene precios en cache
     """
-    from services.websocket_service import realtime_price_service
+    from services.price_cache import price_cache
     
     try:
-        # Obtener precios del WebSocket service (cryptos en tiempo real)
-        ws_prices = realtime_price_service.get_last_prices()
-        
-        # Obtener precios de la base de datos (actualizados por PriceMonitor)
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT symbol, current_price, updated_at
-            FROM positions
-            WHERE status = 'open' AND current_price IS NOT NULL
-        """)
+        prices = price_cache.snapshot()
         
-        db_positions = cursor.fetchall()
-        conn.close()
-        
-        # Combinar ambas fuentes
-        prices = {}
-        
-        # Primero agregar precios de la base de datos
-        for symbol, current_price, updated_at in db_positions:
-            if current_price:
-                # Calcular color basado en el cambio de precio (simplificado)
-                prices[symbol] = {
-                    'price': float(current_price),
-                    'color': 'gray',  # Será actualizado por el frontend
-                    'timestamp': updated_at
-                }
-        
-        # Sobrescribir con precios del WebSocket si están disponibles (más recientes)
-        for ticker, data in ws_prices.items():
-            prices[ticker] = data
+        if not prices:
+            # Worker sin servicios de fondo: último precio persistido por el líder
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT symbol, current_price, updated_at
+                FROM positions
+                WHERE status = 'open' AND current_price IS NOT NULL
+            """)
+            
+            for symbol, current_price, updated_at in cursor.fetchall():
+                if current_price:
+                    prices[symbol] = {
+                        'price': float(current_price),
+                        'color': 'gray',  # Será actualizado por el frontend
+                        'source': 'db',
+                        'timestamp': updated_at,
+                        'stale': True
+                    }
+            
+            conn.close()
         
         return jsonify({
             'success': True,
@@ -379,6 +528,96 @@ def get_realtime_prices():
         }), 500
 
 
+EMPTY_STATS = {
+    'total_trades': 0,
+    'winning_trades': 0,
+    'losing_trades': 0,
+    'win_rate': 0,
+    'total_profit': 0.0,
+    'bot_active': False,
+    'demo_mode': True,
+    'open_positions': 0,
+    'closed_positions': 0
+}
+
+
+@dashboard_bp.route('/snapshot', methods=['GET'])
+@token_required
+def get_snapshot(user_id):
+    """
+    Todo lo que carga el dashboard en un request y UNA transacción de lectura:
+    stats, posiciones abiertas, analytics, equity curve, connection status y precios.
+    ETag = versión del usuario + versión global (user_versions) + ventana de la
+    curva: un If-None-Match vigente devuelve 304 sin consultar ninguna tabla.
+    Los ticks (current_price/pnl) no cambian el ETag: el cliente los recibe por SSE.
+    ?hours=24: ventana de la equity curve, alineada a la hora
+    ?max_points=: LTTB sobre la equity curve
+    """
+    from services.analytics_service import analytics_service
+    
+    hours = max(1, request.args.get('hours', 24, type=int))
+    since = (datetime.now() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+    max_points = request.args.get('max_points', type=int)
+    if max_points is not None:
+        max_points = max(3, min(max_points, Config.EQUITY_CURVE_MAX_POINTS))
+    
+    # Versión ANTES que los datos: si algo cambia en el medio el ETag queda
+    # atrasado (el próximo poll baja todo de nuevo), nunca adelantado
+    etag = change_tracker.etag_for(user_id, f"{hours}h{since:%Y%m%d%H}-p{max_points or 0}")
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            if not conn.in_transaction:
+                conn.execute('BEGIN')  # una sola vista consistente de todas las tablas
+            
+            stats = read_user_stats(cursor, user_id) or dict(EMPTY_STATS)
+            positions = query_positions(cursor, ['user_id = ?', 'status = ?'],
+                                        [user_id, 'open'], POSITIONS_PAGE_MAX)
+            
+            # Último precio persistido de cada símbolo abierto (el tick buffer lo escribe)
+            cursor.execute("""
+                SELECT symbol, current_price, MAX(updated_at) AS updated_at
+                FROM positions
+                WHERE user_id = ? AND status = 'open' AND current_price IS NOT NULL
+                GROUP BY symbol
+            """, (user_id,))
+            prices = {
+                row['symbol']: {
+                    'price': float(row['current_price']),
+                    'color': 'gray',
+                    'source': 'db',
+                    'timestamp': row['updated_at'],
+                    'stale': True
+                }
+                for row in cursor.fetchall()
+            }
+            
+            analytics = analytics_service.get_full_analytics(user_id, include_equity_curve=False)
+            equity_curve = analytics_service.get_equity_curve(user_id, since=since, max_points=max_points)
+            connection = read_connection_status(cursor)
+        finally:
+            conn.commit()  # cierra la transacción de lectura
+        
+        response = jsonify({
+            'stats': stats,
+            'positions': {**positions, 'status': 'open'},
+            'analytics': analytics,
+            'equity_curve': equity_curve,
+            'connection': connection,
+            'prices': prices,
+            'version': etag
+        })
+    
+    response.set_etag(etag)
+    # El browser revalida siempre (If-None-Match) y reusa su copia con el 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @dashboard_bp.route('/partial-closes/<int:position_id>', methods=['GET'])
 @token_required
 def get_partial_closes(user_id, position_id):
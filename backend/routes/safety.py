@@ -8,6 +8,20 @@ from services.panic_mode import panic_service
 from services.heartbeat_monitor import heartbeat_monitor
 from services.cooldown_manager import cooldown_manager
 from services.slippage_tracker import slippage_tracker
+from services.price_monitor import price_monitor
+from services.price_cache import price_cache
+from services.websocket_service import realtime_price_service
+from services.tick_buffer import tick_buffer
+from services.position_book import position_book
+from services.risk_dispatcher import risk_dispatcher
+from services.webhook_queue import webhook_queue
+from services.idempotency import idempotency_index
+from services.webhook_archiver import webhook_archiver
+from services.event_hub import event_hub
+from services.change_tracker import change_tracker
+from services.analytics_service import analytics_service
+from services.equity_snapshotter import equity_snapshotter
+from logging_setup import get_logging_stats
 
 safety_bp = Blueprint('safety', __name__)
 
@@ -71,6 +85,104 @@ def get_panic_history(user_id):
 # HEARTBEAT MONITOR
 # ============================================================================
 
+@safety_bp.route('/price-monitor/stats', methods=['GET'])
+def get_price_monitor_stats():
+    """
+    Métricas de fetch del Price Monitor (sólo el proceso líder tiene ciclos)
+    """
+    return jsonify(price_monitor.get_stats()), 200
+
+@safety_bp.route('/price-cache/stats', methods=['GET'])
+def get_price_cache_stats():
+    """
+    Estado del price cache compartido de este proceso
+    """
+    return jsonify(price_cache.get_stats()), 200
+
+@safety_bp.route('/websocket/status', methods=['GET'])
+def get_websocket_status():
+    """
+    Estado de la conexión combined-stream de Binance
+    """
+    return jsonify(realtime_price_service.get_status()), 200
+
+@safety_bp.route('/tick-buffer/stats', methods=['GET'])
+def get_tick_buffer_stats():
+    """
+    Contadores del tick buffer: flush latency, ticks conflacionados, filas escritas
+    """
+    return jsonify(tick_buffer.get_stats()), 200
+
+@safety_bp.route('/position-book/stats', methods=['GET'])
+def get_position_book_stats():
+    """
+    Tamaño del position book (SL/TP/trailing) y contadores de chequeos
+    """
+    return jsonify(position_book.get_stats()), 200
+
+@safety_bp.route('/risk/stats', methods=['GET'])
+def get_risk_stats():
+    """
+    Contadores del risk dispatcher (pasadas por símbolo, ticks conflacionados, cierres)
+    """
+    return jsonify(risk_dispatcher.get_stats()), 200
+
+@safety_bp.route('/webhook-queue/stats', methods=['GET'])
+def get_webhook_queue_stats():
+    """
+    Profundidad de la cola de webhooks y latencia enqueue -> ejecución
+    """
+    return jsonify(webhook_queue.get_stats()), 200
+
+@safety_bp.route('/idempotency/stats', methods=['GET'])
+def get_idempotency_stats():
+    """
+    Alertas duplicadas rechazadas (memoria / índice único) y tamaño del LRU
+    """
+    return jsonify(idempotency_index.get_stats()), 200
+
+@safety_bp.route('/webhook-archive/stats', methods=['GET'])
+def get_webhook_archive_stats():
+    """
+    Retención del journal de webhooks: días archivados, archivos y páginas libres
+    """
+    return jsonify(webhook_archiver.get_stats()), 200
+
+@safety_bp.route('/stream/stats', methods=['GET'])
+def get_stream_stats():
+    """
+    Canal push del dashboard (SSE) en este proceso: clientes, ticks y lecturas evitadas
+    """
+    return jsonify(event_hub.get_stats()), 200
+
+@safety_bp.route('/change-tracker/stats', methods=['GET'])
+def get_change_tracker_stats():
+    """
+    ETag de /dashboard/snapshot: chequeos, relecturas de user_versions y usuarios en memoria
+    """
+    return jsonify(change_tracker.get_stats()), 200
+
+@safety_bp.route('/analytics/stats', methods=['GET'])
+def get_analytics_state_stats():
+    """
+    Analytics incremental: lecturas de analytics_state y reconstrucciones (filas nuevas o dirty)
+    """
+    return jsonify(analytics_service.get_stats()), 200
+
+@safety_bp.route('/equity-snapshotter/stats', methods=['GET'])
+def get_equity_snapshotter_stats():
+    """
+    Equity curve: snapshots grabados, filas por snapshot y poda por retención
+    """
+    return jsonify(equity_snapshotter.get_stats()), 200
+
+@safety_bp.route('/logging/stats', methods=['GET'])
+def get_logging_status():
+    """
+    Logging estructurado: records encolados, descartados (cola llena) y muestreados
+    """
+    return jsonify(get_logging_stats()), 200
+
 @safety_bp.route('/heartbeat/status', methods=['GET'])
 def get_heartbeat_status():
     """
@@ -1,12 +1,24 @@
 from flask import Blueprint, request, jsonify
 from auth_utils import token_required
 from database import get_db_connection
+from config import Config
 from datetime import datetime
 import json
+import logging
 from services.cooldown_manager import cooldown_manager
 from services.slippage_tracker import slippage_tracker
+from services.price_cache import price_cache
+from services.position_repricer import reprice_symbol
+from services.position_book import position_book
+from services.trading_engine import trading_engine
+from services.webhook_queue import webhook_queue
+from services.idempotency import idempotency_index
+from services.signal_fanout import (
+    ACTIVE_DEMO_USERS, active_demo_user_ids, has_active_demo_bots, open_positions_for_signal, count_opened_trades
+)
 
 webhook_bp = Blueprint('webhook', __name__)
+logger = logging.getLogger(__name__)
 
 @webhook_bp.route('/test', methods=['GET', 'POST'], strict_slashes=False)
 def webhook_test():
@@ -64,83 +76,198 @@ def recent_webhooks():
 @webhook_bp.route('', methods=['POST', 'GET'], strict_slashes=False)
 def tradingview_webhook():
     """
-    TradingView webhook endpoint - accepts any JSON payload
-    Logs all incoming webhooks to database
+    TradingView webhook endpoint - accepts any JSON payload, a JSON array of
+    signals or NDJSON (one signal per line)
+    Logs all incoming webhooks to database and enqueues valid trading signals
+    in one transaction; the trades run in the WebhookQueue workers (leader
+    process), in order per ticker
     """
-    # Log everything for debugging
-    print(f"🔔 WEBHOOK RECEIVED - Method: {request.method}")
-    print(f"📋 Headers: {dict(request.headers)}")
-    print(f"📦 Raw Data: {request.data}")
-    print(f"🔍 Content-Type: {request.content_type}")
+    # Full request dump only when debugging (LOG_LEVELS=routes.webhook=DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔔 WEBHOOK RECEIVED", extra={
+            'method': request.method,
+            'headers': dict(request.headers),
+            'body': request.get_data(as_text=True),
+            'content_type': request.content_type
+        })
     
-    # Accept both JSON and form data
-    if request.is_json:
-        data = request.get_json()
-    else:
-        # Try to get raw data
-        try:
-            data = json.loads(request.data.decode('utf-8'))
-        except:
-            data = {
-                'raw_message': request.data.decode('utf-8'),
-                'content_type': request.content_type,
-                'method': request.method
-            }
+    items, is_batch = parse_webhook_body()
     
-    if not data:
-        data = {'empty': True, 'method': request.method}
+    if len(items) > Config.WEBHOOK_MAX_BATCH:
+        return jsonify({
+            'status': 'rejected',
+            'error': f"Batch too large: {len(items)} signals (max {Config.WEBHOOK_MAX_BATCH})"
+        }), 413
     
-    # Save webhook to database
-    webhook_id = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO webhooks (payload) VALUES (?)',
-            (json.dumps(data),)
-        )
-        conn.commit()
-        webhook_id = cursor.lastrowid
-        conn.close()
-        
-        # Log to console
-        print(f"✅ Webhook #{webhook_id} received and saved: {data}")
-        
-    except Exception as e:
-        print(f"❌ Error saving webhook: {str(e)}")
-        # Still return success to TradingView
+    # ✅ IDEMPOTENCY: retried / duplicated alerts are rejected before any DB write
+    results = [None] * len(items)
+    pending = []
+    for index, data in enumerate(items):
+        ticker = validate_trading_signal(data)
+        idempotency_key = idempotency_index.make_key(data) if ticker else None
+        if idempotency_key and idempotency_index.seen(idempotency_key):
+            results[index] = duplicate_result(data, idempotency_key)
+        else:
+            pending.append((index, data, ticker, idempotency_key))
     
-    # Process trading signal if bot is active in DEMO mode
-    try:
-        process_demo_trade(data)
-    except Exception as e:
-        print(f"⚠️ Error processing demo trade: {str(e)}")
+    # Save webhooks + enqueue the trading signals in one transaction
+    if pending:
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            if not conn.in_transaction:
+                cursor.execute('BEGIN')
+            for index, data, ticker, idempotency_key in pending:
+                results[index] = store_webhook(cursor, data, ticker, idempotency_key)
+            conn.commit()
+            conn.close()
+            
+            for result in results:
+                if result['status'] != 'duplicate' and result['idempotency_key']:
+                    idempotency_index.remember(result['idempotency_key'])
+            
+            # Log to console
+            logger.info("✅ Webhook(s) received and saved", extra={'count': len(pending)})
+            
+        except Exception as e:
+            logger.error("❌ Error saving webhook: %s", e)
+            # Still return success to TradingView
+            for index, data, ticker, idempotency_key in pending:
+                if results[index] is None or results[index]['status'] != 'duplicate':
+                    results[index] = {'status': 'error', 'error': str(e), 'ticker': ticker}
+    
+    if any(result.get('job_id') for result in results):
+        webhook_queue.notify()
+    
+    if not is_batch:
+        result = results[0]
+        return jsonify({
+            'status': result['status'],
+            'message': WEBHOOK_MESSAGES.get(result['status'], 'Webhook received'),
+            'data': items[0],
+            'webhook_id': result.get('webhook_id'),
+            'job_id': result.get('job_id'),
+            'idempotency_key': result.get('idempotency_key')
+        }), 200
     
+    statuses = [result['status'] for result in results]
     return jsonify({
         'status': 'received',
-        'message': 'Webhook processed successfully',
-        'data': data,
-        'webhook_id': webhook_id
+        'count': len(results),
+        'queued': statuses.count('queued'),
+        'duplicates': statuses.count('duplicate'),
+        'results': [dict(result, index=index) for index, result in enumerate(results)]
     }), 200
 
 
+WEBHOOK_MESSAGES = {
+    'queued': 'Webhook queued for processing',
+    'received': 'Webhook received (no trading signal)',
+    'duplicate': 'Duplicate alert ignored',
+    'error': 'Webhook received but could not be saved'
+}
+
+
+def parse_webhook_body():
+    """
+    Returns (items, is_batch): a JSON object is one item, a JSON array or
+    NDJSON body is a batch. Anything else is logged as a raw message.
+    """
+    body = request.get_data(as_text=True)
+    
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is None:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            # NDJSON: one JSON document per line
+            lines = [line for line in body.splitlines() if line.strip()]
+            try:
+                data = [json.loads(line) for line in lines] if len(lines) > 1 else None
+            except ValueError:
+                data = None
+    
+    if isinstance(data, list):
+        return data, True
+    
+    if data is None and body:
+        data = {
+            'raw_message': body,
+            'content_type': request.content_type,
+            'method': request.method
+        }
+    
+    if not data:
+        data = {'empty': True, 'method': request.method}
+    
+    return [data], False
+
+
+def store_webhook(cursor, data, ticker, idempotency_key):
+    """
+    Logs one payload and enqueues it if it is a trading signal, inside the
+    caller's transaction. A savepoint per item lets a duplicate be undone
+    without losing the rest of the batch.
+    """
+    cursor.execute('SAVEPOINT webhook_item')
+    cursor.execute(
+        'INSERT INTO webhooks (payload) VALUES (?)',
+        (json.dumps(data),)
+    )
+    webhook_id = cursor.lastrowid
+    
+    # Another worker (or an earlier item of this batch) may have the same key:
+    # the unique index decides
+    if idempotency_key and not idempotency_index.claim(cursor, idempotency_key, webhook_id):
+        cursor.execute('ROLLBACK TO webhook_item')
+        cursor.execute('RELEASE webhook_item')
+        return duplicate_result(data, idempotency_key)
+    
+    job_id = webhook_queue.enqueue(cursor, webhook_id, ticker, data) if ticker else None
+    cursor.execute('RELEASE webhook_item')
+    
+    return {
+        'status': 'queued' if job_id else 'received',
+        'webhook_id': webhook_id,
+        'job_id': job_id,
+        'ticker': ticker,
+        'idempotency_key': idempotency_key
+    }
+
+
+def duplicate_result(data, idempotency_key):
+    """Duplicates still get 200 so TradingView does not retry again"""
+    logger.info("♻️ Duplicate webhook ignored", extra={'idempotency_key': idempotency_key, 'ticker': data.get('ticker')})
+    return {
+        'status': 'duplicate',
+        'ticker': data.get('ticker'),
+        'idempotency_key': idempotency_key
+    }
+
+
+def validate_trading_signal(data):
+    """Returns the ticker if the payload is a processable trading signal, else None"""
+    if not isinstance(data, dict):
+        return None
+    ticker = data.get('ticker')
+    try:
+        price = float(data.get('price', 0))
+    except (TypeError, ValueError):
+        return None
+    if not ticker or not isinstance(ticker, str) or not price:
+        return None
+    return ticker
+
+
 def process_demo_trade(webhook_data):
     """Process trading signal in DEMO mode (without real broker API)"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get all active users with demo mode enabled
-    cursor.execute('''
-        SELECT user_id, max_position_size, stop_loss_percent, take_profit_percent, auto_close_enabled
-        FROM bot_config 
-        WHERE is_active = 1 AND demo_mode = 1
-    ''')
-    
-    active_bots = cursor.fetchall()
-    
-    if not active_bots:
+    # Any active user with demo mode enabled?
+    if not has_active_demo_bots(cursor):
         conn.close()
-        print("ℹ️ No active bots in demo mode")
+        logger.info("ℹ️ No active bots in demo mode")
         return
     
     # Extract trading signal from webhook
@@ -150,140 +277,79 @@ def process_demo_trade(webhook_data):
     
     if not ticker or not price:
         conn.close()
-        print(f"⚠️ Invalid trading signal: {webhook_data}")
+        logger.warning("⚠️ Invalid trading signal", extra={'payload': webhook_data})
         return
     
+    # El precio de la alerta sólo alimenta el cache si no hay uno fresco de un feed en vivo
+    if price_cache.get(ticker) is None:
+        price_cache.set(ticker, price, 'tradingview')
+    
     # ✅ CHECK COOLDOWN BEFORE PROCESSING SIGNAL
-    cooldown_status = cooldown_manager.is_ticker_in_cooldown(ticker)
+    # Cooldown helpers write through this cursor: nothing commits before the end of
+    # the trade, so a failed (and retried) queue job never sees a half-applied cooldown
+    cooldown_status = cooldown_manager.is_ticker_in_cooldown(ticker, cursor)
     if cooldown_status['in_cooldown']:
-        print(f"❄️ COOLDOWN ACTIVE - {ticker} is in cooldown for {cooldown_status['time_remaining_minutes']} minutes. Skipping signal.")
+        logger.info("❄️ COOLDOWN ACTIVE - %s is in cooldown for %s minutes. Skipping signal.",
+                    ticker, cooldown_status['time_remaining_minutes'])
         conn.close()
         return
     
-    # Process for each active bot
-    for bot in active_bots:
-        user_id = bot['user_id']
-        position_size = bot['max_position_size']
-        stop_loss_pct = bot['stop_loss_percent']
-        take_profit_pct = bot['take_profit_percent']
-        
-        # First, update existing open positions for this ticker and check SL/TP
-        cursor.execute('''
-            SELECT id, symbol, side, quantity, entry_price, current_price, pnl
-            FROM positions 
-            WHERE user_id = ? AND symbol = ? AND status = 'open'
-        ''', (user_id, ticker))
-        
-        open_positions = cursor.fetchall()
-        
-        for pos in open_positions:
-            old_price = pos['current_price'] or pos['entry_price']
-            
-            # Update current price and calculate new PnL
-            if pos['side'] == 'BUY':
-                # For long positions: profit when price goes up
-                pnl = (price - pos['entry_price']) * pos['quantity']
-                pnl_percent = ((price - pos['entry_price']) / pos['entry_price']) * 100
-            else:  # SELL
-                # For short positions: profit when price goes down
-                pnl = (pos['entry_price'] - price) * pos['quantity']
-                pnl_percent = ((pos['entry_price'] - price) / pos['entry_price']) * 100
-            
-            # Update position with new price and PnL
-            cursor.execute('''
-                UPDATE positions 
-                SET current_price = ?, pnl = ?
-                WHERE id = ?
-            ''', (price, pnl, pos['id']))
-            
-            # Check if Stop Loss or Take Profit is triggered (only if auto-close is enabled)
-            should_close = False
-            close_reason = ""
-            auto_close_enabled = bot['auto_close_enabled']
-            
-            if auto_close_enabled:
-                if pnl_percent <= -stop_loss_pct:
-                    should_close = True
-                    close_reason = f"Stop Loss ({pnl_percent:.2f}%)"
-                elif pnl_percent >= take_profit_pct:
-                    should_close = True
-                    close_reason = f"Take Profit ({pnl_percent:.2f}%)"
-            
-            if should_close:
-                # Close the position
-                cursor.execute('''
-                    UPDATE positions 
-                    SET status = 'closed', closed_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (pos['id'],))
-                
-                # ✅ ACTIVATE COOLDOWN IF STOP LOSS
-                if "Stop Loss" in close_reason:
-                    cooldown_result = cooldown_manager.activate_cooldown(
-                        ticker=ticker,
-                        reason=f"Stop Loss triggered at ${price}",
-                        duration_minutes=60
-                    )
-                    print(f"❄️ COOLDOWN ACTIVATED - {ticker} locked for 60 minutes after Stop Loss")
-                
-                # Update trading stats
-                if pnl >= 0:
-                    cursor.execute('''
-                        UPDATE trading_stats 
-                        SET winning_trades = winning_trades + 1,
-                            total_profit = total_profit + ?
-                        WHERE user_id = ?
-                    ''', (pnl, user_id))
-                else:
-                    cursor.execute('''
-                        UPDATE trading_stats 
-                        SET losing_trades = losing_trades + 1,
-                            total_profit = total_profit + ?
-                        WHERE user_id = ?
-                    ''', (pnl, user_id))
-                
-                print(f"🔴 CLOSED Position - User {user_id}: {pos['symbol']} ${price} | {close_reason} | PnL: ${pnl:.2f}")
-            else:
-                print(f"📊 UPDATED Position - User {user_id}: {pos['symbol']} ${old_price} → ${price} | PnL: ${pnl:.2f} ({pnl_percent:+.2f}%)")
+    # Reprice the open positions of this ticker in one UPDATE. Like the signal itself,
+    # the webhook only manages users with an active demo bot
+    reprice_symbol(cursor, ticker, price, users_sql=ACTIVE_DEMO_USERS)
+    
+    # SL/TP/Trailing Stop: reload this ticker into the position book and close
+    # only the positions whose levels this price crossed
+    position_book.reload_symbol(ticker, cursor)
+    closed_positions = trading_engine.close_triggered_positions(
+        cursor, ticker, price, user_ids=active_demo_user_ids(cursor)
+    )
+    
+    for pos in closed_positions:
+        logger.info("🔴 CLOSED Position", extra={
+            'sample_key': 'webhook.position_closed',
+            'user_id': pos['user_id'], 'position_id': pos['id'], 'ticker': ticker, 'price': price,
+            'reason': pos['reason'], 'pnl': pos['pnl'], 'pnl_percent': pos['pnl_percent']
+        })
+    if closed_positions:
+        logger.info("🔴 %d positions closed on %s @ %s", len(closed_positions), ticker, price)
+    
+    # ✅ ACTIVATE COOLDOWN IF STOP LOSS
+    if any(pos['reason'] == 'Stop Loss' for pos in closed_positions):
+        cooldown_manager.activate_cooldown(
+            ticker=ticker,
+            reason=f"Stop Loss triggered at ${price}",
+            duration_minutes=60,
+            cursor=cursor
+        )
+        logger.info("❄️ COOLDOWN ACTIVATED - %s locked for 60 minutes after Stop Loss", ticker)
+    
+    # Open the signal for every active demo bot at once (INSERT ... SELECT from bot_config)
+    if signal in ['BUY', 'SELL']:
+        opened = open_positions_for_signal(cursor, ticker, signal, price)
         
-        # Create new position if signal is provided
-        if signal in ['BUY', 'SELL']:
-            # Calculate quantity based on position size
-            quantity = round(position_size / price, 2)
-            
-            # Create demo position
-            cursor.execute('''
-                INSERT INTO positions (
-                    user_id, symbol, side, quantity, entry_price, 
-                    current_price, pnl, status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                user_id, ticker, signal, quantity, price,
-                price, 0.0, 'open'
-            ))
-            
-            position_id = cursor.lastrowid
+        if opened:
+            first_id, last_id = opened
             
             # ✅ RECORD SLIPPAGE (TradingView expected price vs actual execution)
             # In DEMO mode, expected = actual, but in LIVE this would capture real slippage
             try:
-                slippage_tracker.record_slippage(
-                    position_id=position_id,
-                    ticker=ticker,
+                slippage_tracker.record_slippage_batch(
+                    cursor, first_id, last_id,
                     expected_price=price,  # From TradingView
-                    actual_price=price     # In DEMO, same. In LIVE, broker execution price
+                    actual_price=price,    # In DEMO, same. In LIVE, broker execution price
+                    ticker=ticker
                 )
             except Exception as e:
-                print(f"⚠️ Error recording slippage: {str(e)}")
+                logger.warning("⚠️ Error recording slippage: %s", e)
             
-            # Update stats
-            cursor.execute('''
-                UPDATE trading_stats 
-                SET total_trades = total_trades + 1
-                WHERE user_id = ?
-            ''', (user_id,))
+            # Update stats (aggregated per user)
+            count_opened_trades(cursor, first_id, last_id)
             
-            print(f"💰 OPENED Position - User {user_id}: {signal} {quantity} {ticker} @ ${price}")
+            logger.info("💰 OPENED %d Positions: %s %s @ %s", last_id - first_id + 1, signal, ticker, price,
+                        extra={'first_id': first_id, 'last_id': last_id})
     
     conn.commit()
     conn.close()
+    # Only now: on rollback the closed positions must stay in the book
+    trading_engine.release_closed_positions(closed_positions)
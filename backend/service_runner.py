@@ -0,0 +1,141 @@
+"""
+Background Service Runner
+Los loops de fondo (precios, WebSocket, heartbeat, checkpoints) deben correr
+en UN solo proceso por deployment, no en cada worker de gunicorn.
+
+Modos (Config.BACKGROUND_SERVICES):
+    auto - leader election con lock file: el primer worker que toma el lock
+           corre los servicios, el resto sólo sirve HTTP (y toma el relevo
+           si el líder muere)
+    off  - el proceso web nunca corre servicios; usar `python service_runner.py`
+    on   - siempre corre servicios (desarrollo, un solo proceso)
+"""
+import os
+import signal
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from logging_setup import setup_logging
+from database import init_db, wal_checkpointer
+from file_lock import FileLock
+from services import price_monitor, realtime_price_service, heartbeat_monitor, tick_buffer, risk_dispatcher, webhook_queue, webhook_archiver, equity_snapshotter
+
+# (mensaje de arranque, servicio) - el orden de arranque importa
+BACKGROUND_SERVICES = [
+    ("🚀 Iniciando Price Monitor...", price_monitor),
+    ("🧮 Iniciando Tick Buffer (write-behind)...", tick_buffer),
+    ("🛡️ Iniciando Risk Dispatcher...", risk_dispatcher),
+    ("📥 Iniciando Webhook Queue...", webhook_queue),
+    ("🔌 Iniciando WebSocket Service (Real-Time Prices)...", realtime_price_service),
+    ("💓 Iniciando Heartbeat Monitor...", heartbeat_monitor),
+    ("🗄️ Iniciando Webhook Archiver...", webhook_archiver),
+    ("📈 Iniciando Equity Snapshotter...", equity_snapshotter),
+    ("🗂️ Iniciando WAL checkpointer...", wal_checkpointer),
+]
+
+
+class ServiceRunner:
+    def __init__(self, lock_path=None, retry_interval=None):
+        self.lock = FileLock(lock_path or f"{Config.DATABASE_PATH}.services.lock")
+        self.retry_interval = retry_interval or Config.SERVICE_LEADER_RETRY_INTERVAL
+        self.is_leader = False
+        self.mode = None
+        self._standby_thread = None
+        self._stop_event = threading.Event()
+
+    def _start_services(self):
+        for message, service in BACKGROUND_SERVICES:
+            print(message)
+            try:
+                service.start()
+            except Exception as e:
+                print(f"⚠️ Error iniciando {type(service).__name__}: {str(e)}")
+        print(f"✅ Servicios profesionales iniciados (pid {os.getpid()})")
+
+    def _become_leader(self):
+        self.is_leader = True
+        self._start_services()
+
+    def _standby_loop(self):
+        """Reintenta tomar el lock por si el líder actual muere"""
+        while not self._stop_event.wait(self.retry_interval):
+            if self.lock.acquire(blocking=False):
+                print(f"👑 Worker {os.getpid()} tomó el liderazgo de servicios")
+                self._become_leader()
+                return
+
+    def start(self, mode=None):
+        """Arranca los servicios según el modo; devuelve True si este proceso es líder"""
+        self.mode = (mode or Config.BACKGROUND_SERVICES).lower()
+
+        if self.mode == 'off':
+            print("ℹ️ Servicios de fondo deshabilitados en este proceso (BACKGROUND_SERVICES=off)")
+            return False
+
+        if self.mode == 'on':
+            self._become_leader()
+            return True
+
+        if self.lock.acquire(blocking=False):
+            print(f"👑 Worker {os.getpid()} es líder de servicios")
+            self._become_leader()
+            return True
+
+        print(f"ℹ️ Worker {os.getpid()} sólo sirve HTTP (otro proceso corre los servicios)")
+        self._standby_thread = threading.Thread(target=self._standby_loop, daemon=True)
+        self._standby_thread.start()
+        return False
+
+    def stop(self):
+        self._stop_event.set()
+        if not self.is_leader:
+            return
+
+        print("🛑 Deteniendo servicios...")
+        for _, service in reversed(BACKGROUND_SERVICES):
+            try:
+                service.stop()
+            except Exception as e:
+                print(f"⚠️ Error deteniendo {type(service).__name__}: {str(e)}")
+        self.is_leader = False
+        self.lock.release()
+
+    def get_status(self):
+        return {
+            'pid': os.getpid(),
+            'mode': self.mode,
+            'is_leader': self.is_leader,
+            'services': {
+                type(service).__name__: bool(getattr(service, 'running', False))
+                for _, service in BACKGROUND_SERVICES
+            }
+        }
+
+
+service_runner = ServiceRunner()
+
+
+def main():
+    """Entry point dedicado: `python service_runner.py` (web con BACKGROUND_SERVICES=off)"""
+    setup_logging()
+    init_db()
+
+    print("⏳ Esperando lock de servicios...")
+    service_runner.lock.acquire()
+    service_runner.start(mode='on')
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    while not stop_event.is_set():
+        stop_event.wait(1)
+
+    service_runner.stop()
+
+
+if __name__ == '__main__':
+    main()
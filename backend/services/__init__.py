@@ -1,22 +1,42 @@
 """
 Services package
 """
+from .price_cache import price_cache
 from .price_monitor import price_monitor
+from .position_book import position_book
 from .trading_engine import trading_engine
+from .tick_buffer import tick_buffer
+from .risk_dispatcher import risk_dispatcher
+from .idempotency import idempotency_index
+from .webhook_queue import webhook_queue
+from .webhook_archiver import webhook_archiver
+from .event_hub import event_hub
+from .change_tracker import change_tracker
 from .websocket_service import realtime_price_service
 from .notification_service import notification_service
 from .analytics_service import analytics_service
+from .equity_snapshotter import equity_snapshotter
 from .panic_mode import panic_service
 from .heartbeat_monitor import heartbeat_monitor
 from .cooldown_manager import cooldown_manager
 from .slippage_tracker import slippage_tracker
 
 __all__ = [
+    'price_cache',
     'price_monitor',
+    'position_book',
     'trading_engine',
+    'tick_buffer',
+    'risk_dispatcher',
+    'idempotency_index',
+    'webhook_queue',
+    'webhook_archiver',
+    'event_hub',
+    'change_tracker',
     'realtime_price_service',
     'notification_service',
     'analytics_service',
+    'equity_snapshotter',
     'panic_service',
     'heartbeat_monitor',
     'cooldown_manager',
@@ -1,33 +1,279 @@
 """
 Advanced Analytics Service
 Calcula Win Rate, Drawdown, Average Profit/Loss, Equity Curve
+
+Win rate, rachas y drawdown salen de analytics_state (una fila por usuario,
+mantenida por triggers al cerrar posiciones y al escribir snapshots de
+equity): leerlos es O(1) en vez de recorrer todo el historial. Si la fila no
+existe o quedó dirty (historial editado), se reconstruye desde las tablas con
+la misma semántica que el cálculo completo y se guarda para la próxima.
 """
+import logging
 import sqlite3
 from datetime import datetime, timedelta
+from threading import Lock
 from typing import Dict, List, Tuple
+from config import Config
+from database import get_db_connection, connect
+from migrations.add_equity_rollups import ROLLUP_RESOLUTIONS
+from services.risk_metrics import compute_risk_report, DEFAULT_DAYS
 
-class AnalyticsService:
-    def __init__(self, db_path='trading_bot.db'):
-        self.db_path = db_path
+logger = logging.getLogger(__name__)
+
+# La reconstrucción se guarda de forma oportunista: si la base está ocupada
+# más de esto, se devuelve igual y se reintenta en la próxima lectura
+PERSIST_BUSY_TIMEOUT_MS = 100
+
+STATE_FIELDS = (
+    'closed_count', 'win_count', 'loss_count', 'win_sum', 'loss_sum',
+    'largest_win', 'largest_loss', 'lead_zeros', 'run_sign', 'run_len',
+    'last_closed_at', 'last_closed_id',
+    'equity_count', 'peak', 'max_drawdown', 'last_equity', 'last_equity_at', 'last_equity_id'
+)
+
+
+def empty_state():
+    state = {field: 0 for field in STATE_FIELDS}
+    state.update(win_sum=0.0, loss_sum=0.0, largest_win=0.0, largest_loss=0.0,
+                 peak=0.0, max_drawdown=0.0, last_equity=0.0,
+                 last_closed_at=None, last_closed_id=None,
+                 last_equity_at=None, last_equity_id=None)
+    return state
+
+
+def apply_close(state, pnl):
+    """Un trade nuevo al tope del historial (mismo cálculo que el trigger)"""
+    state['closed_count'] += 1
+    if pnl > 0:
+        state['win_count'] += 1
+        state['win_sum'] += pnl
+        state['largest_win'] = max(state['largest_win'], pnl)
+    elif pnl < 0:
+        state['loss_count'] += 1
+        state['loss_sum'] += pnl
+        state['largest_loss'] = min(state['largest_loss'], pnl)
+
+    if pnl == 0:
+        state['lead_zeros'] += 1
+    else:
+        sign = 1 if pnl > 0 else -1
+        if state['lead_zeros'] == 0 and state['run_sign'] == sign:
+            state['run_len'] += 1
+        else:
+            state['run_len'] = 1
+        state['run_sign'] = sign
+        state['lead_zeros'] = 0
+
+
+def apply_equity(state, equity):
+    """Un snapshot nuevo al final de la curva (mismo cálculo que el trigger)"""
+    if state['equity_count'] == 0 or equity > state['peak']:
+        state['peak'] = equity
+    state['max_drawdown'] = max(state['max_drawdown'], state['peak'] - equity)
+    state['last_equity'] = equity
+    state['equity_count'] += 1
+
+
+def equity_retention_days():
+    """Días que se conserva cada resolución de la equity curve (0 = siempre)"""
+    return {
+        'raw': Config.EQUITY_RAW_RETENTION_DAYS,
+        '1m': Config.EQUITY_1M_RETENTION_DAYS,
+        '1h': Config.EQUITY_1H_RETENTION_DAYS,
+        '1d': Config.EQUITY_1D_RETENTION_DAYS
+    }
+
+
+def choose_resolution(start: datetime, now: datetime, target_points: int) -> str:
+    """
+    La resolución más gruesa que todavía da target_points puntos en la ventana,
+    sin pasar de EQUITY_CURVE_MAX_POINTS, entre las que cubren `start` según
+    su retención. Si ninguna llega al target, la más fina dentro del tope.
+    """
+    retention = equity_retention_days()
+    window = max((now - start).total_seconds(), 0)
+    # De fina a gruesa; la cruda "vale" un punto por snapshot
+    candidates = [('raw', Config.EQUITY_SNAPSHOT_INTERVAL)] + [
+        (name, seconds) for name, _, _, seconds in ROLLUP_RESOLUTIONS
+    ]
+    available = [
+        (name, window / seconds) for name, seconds in candidates
+        if not retention[name] or start >= now - timedelta(days=retention[name])
+    ] or [(candidates[-1][0], window / candidates[-1][1])]
     
+    fits = [(name, points) for name, points in available
+            if points <= Config.EQUITY_CURVE_MAX_POINTS] or available[-1:]
+    enough = [name for name, points in fits if points >= target_points]
+    return enough[-1] if enough else fits[0][0]
+
+
+def lttb(points: List[Dict], threshold: int) -> List[Dict]:
+    """
+    Largest-Triangle-Three-Buckets: reduce la curva a `threshold` puntos
+    conservando la forma (picos y valles). Siempre incluye el primero y el último.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return points
+    
+    xs = [datetime.fromisoformat(p['timestamp']).timestamp() for p in points]
+    ys = [p['equity'] for p in points]
+    
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Promedio del bucket siguiente (tercer vértice del triángulo)
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+        
+        # El punto del bucket actual con el triángulo más grande
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    
+    sampled.append(points[-1])
+    return sampled
+
+
+class AnalyticsService:
+    def __init__(self):
+        self._persist_lock = Lock()
+        self._persist_conn = None
+        self.stats = {'reads': 0, 'rebuilds': 0, 'rebuilds_persisted': 0, 'persist_skipped': 0}
+
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        return get_db_connection()
     
-    def calculate_win_rate(self, user_id: int) -> Dict:
-        """Calcula Win Rate y estadísticas relacionadas"""
+    # ------------------------------------------------------------------
+    # Estado incremental
+    # ------------------------------------------------------------------
+    
+    def get_state(self, user_id: int) -> Dict:
+        """Agregados del usuario; reconstruye si faltan o quedaron dirty"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Obtener todas las operaciones cerradas
+        cursor.execute("SELECT * FROM analytics_state WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        self.stats['reads'] += 1
+        
+        if row is not None and not row['dirty']:
+            conn.close()
+            return dict(row)
+        
+        # Fila, historial y base podada en una sola vista; seq se lee ANTES que
+        # el historial: cualquier cambio posterior lo incrementa y el guardado
+        # condicional no pisa nada más nuevo
+        started = not conn.in_transaction
+        if started:
+            conn.execute('BEGIN')
+        try:
+            cursor.execute("SELECT * FROM analytics_state WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            seq = row['seq'] if row is not None else 0
+            state = self.build_state(cursor, user_id, row)
+        finally:
+            if started:
+                conn.commit()
+            conn.close()
+        
+        self.stats['rebuilds'] += 1
+        self._persist_state(user_id, seq, state)
+        return state
+    
+    def build_state(self, cursor, user_id: int, row=None) -> Dict:
+        """Estado completo desde positions y equity_curve (mismo orden que el cálculo original)"""
+        state = empty_state()
+        
         cursor.execute("""
-            SELECT pnl FROM positions 
+            SELECT id, pnl, closed_at FROM positions 
             WHERE user_id = ? AND status = 'closed' AND pnl IS NOT NULL
+            ORDER BY closed_at DESC
         """, (user_id,))
-        
         trades = cursor.fetchall()
-        conn.close()
         
-        if not trades:
+        # Del más viejo al más nuevo: cada trade entra al tope, como en el trigger
+        for trade in reversed(trades):
+            apply_close(state, trade['pnl'])
+        if trades:
+            state['last_closed_at'] = trades[0]['closed_at']
+            state['last_closed_id'] = trades[0]['id']
+        
+        # Snapshots ya podados: la curva sigue desde lo acumulado en base_*
+        if row is not None and row['base_equity_count']:
+            state.update(
+                equity_count=row['base_equity_count'],
+                peak=row['base_peak'],
+                max_drawdown=row['base_max_drawdown'],
+                last_equity=row['base_last_equity'],
+                last_equity_at=row['base_last_equity_at']
+            )
+        
+        cursor.execute("""
+            SELECT id, equity, timestamp 
+            FROM equity_curve 
+            WHERE user_id = ?
+            ORDER BY timestamp ASC
+        """, (user_id,))
+        equity_data = cursor.fetchall()
+        
+        for equity_row in equity_data:
+            apply_equity(state, equity_row['equity'])
+        if equity_data:
+            state['last_equity_at'] = equity_data[-1]['timestamp']
+            state['last_equity_id'] = equity_data[-1]['id']
+        
+        return state
+    
+    def _persist_state(self, user_id: int, seq: int, state: Dict):
+        """Guarda un estado reconstruido si nadie lo cambió desde que se leyó seq"""
+        columns = ', '.join(STATE_FIELDS)
+        placeholders = ', '.join('?' for _ in STATE_FIELDS)
+        updates = ', '.join(f"{field} = excluded.{field}" for field in STATE_FIELDS)
+        
+        # Conexión propia con timeout corto: nunca espera detrás del write lock
+        # de la transacción del caller ni de otro proceso
+        with self._persist_lock:
+            try:
+                if self._persist_conn is None:
+                    self._persist_conn = connect()
+                    self._persist_conn.execute(f"PRAGMA busy_timeout = {PERSIST_BUSY_TIMEOUT_MS}")
+                self._persist_conn.execute(f"""
+                    INSERT INTO analytics_state (user_id, seq, dirty, {columns})
+                    VALUES (?, ?, 0, {placeholders})
+                    ON CONFLICT(user_id) DO UPDATE SET dirty = 0, {updates}
+                    WHERE analytics_state.seq = excluded.seq
+                """, [user_id, seq] + [state[field] for field in STATE_FIELDS])
+                self._persist_conn.commit()
+                self.stats['rebuilds_persisted'] += 1
+            except sqlite3.Error as e:
+                self.stats['persist_skipped'] += 1
+                try:
+                    self._persist_conn.rollback()
+                except Exception:
+                    self._persist_conn = None
+                logger.debug("analytics_state de user %s no guardado: %s", user_id, e)
+    
+    # ------------------------------------------------------------------
+    # Métricas (mismos resultados que recorrer todo el historial)
+    # ------------------------------------------------------------------
+    
+    def calculate_win_rate(self, user_id: int, state: Dict = None) -> Dict:
+        """Calcula Win Rate y estadísticas relacionadas"""
+        state = state or self.get_state(user_id)
+        
+        if not state['closed_count']:
             return {
                 'total_trades': 0,
                 'winning_trades': 0,
@@ -40,25 +286,20 @@ class AnalyticsService:
                 'profit_factor': 0.0
             }
         
-        pnls = [trade[0] for trade in trades]
-        
-        winning_trades = [pnl for pnl in pnls if pnl > 0]
-        losing_trades = [pnl for pnl in pnls if pnl < 0]
-        
-        total_trades = len(pnls)
-        num_wins = len(winning_trades)
-        num_losses = len(losing_trades)
+        total_trades = state['closed_count']
+        num_wins = state['win_count']
+        num_losses = state['loss_count']
         
         win_rate = (num_wins / total_trades * 100) if total_trades > 0 else 0
         
-        avg_profit = sum(winning_trades) / num_wins if num_wins > 0 else 0
-        avg_loss = sum(losing_trades) / num_losses if num_losses > 0 else 0
+        avg_profit = state['win_sum'] / num_wins if num_wins > 0 else 0
+        avg_loss = state['loss_sum'] / num_losses if num_losses > 0 else 0
         
-        largest_win = max(winning_trades) if winning_trades else 0
-        largest_loss = min(losing_trades) if losing_trades else 0
+        largest_win = state['largest_win'] if num_wins else 0
+        largest_loss = state['largest_loss'] if num_losses else 0
         
-        total_profit = sum(winning_trades)
-        total_loss = abs(sum(losing_trades))
+        total_profit = state['win_sum']
+        total_loss = abs(state['loss_sum'])
         
         profit_factor = total_profit / total_loss if total_loss > 0 else 0
         
@@ -74,26 +315,14 @@ class AnalyticsService:
             'profit_factor': round(profit_factor, 2)
         }
     
-    def calculate_drawdown(self, user_id: int) -> Dict:
+    def calculate_drawdown(self, user_id: int, state: Dict = None) -> Dict:
         """
         Calcula Maximum Drawdown y Current Drawdown
         Drawdown = caída desde el peak más alto
         """
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        state = state or self.get_state(user_id)
         
-        # Obtener equity curve
-        cursor.execute("""
-            SELECT equity, timestamp 
-            FROM equity_curve 
-            WHERE user_id = ?
-            ORDER BY timestamp ASC
-        """, (user_id,))
-        
-        equity_data = cursor.fetchall()
-        conn.close()
-        
-        if not equity_data:
+        if not state['equity_count']:
             return {
                 'max_drawdown': 0.0,
                 'max_drawdown_percent': 0.0,
@@ -101,22 +330,9 @@ class AnalyticsService:
                 'current_drawdown_percent': 0.0
             }
         
-        equities = [row[0] for row in equity_data]
-        
-        peak = equities[0]
-        max_dd = 0
-        current_dd = 0
-        
-        for equity in equities:
-            if equity > peak:
-                peak = equity
-            
-            dd = peak - equity
-            
-            if dd > max_dd:
-                max_dd = dd
-            
-            current_dd = dd
+        peak = state['peak']
+        max_dd = state['max_drawdown']
+        current_dd = peak - state['last_equity']
         
         max_dd_percent = (max_dd / peak * 100) if peak > 0 else 0
         current_dd_percent = (current_dd / peak * 100) if peak > 0 else 0
@@ -128,28 +344,56 @@ class AnalyticsService:
             'current_drawdown_percent': round(current_dd_percent, 2)
         }
     
-    def get_equity_curve(self, user_id: int, period_hours: int = 24) -> List[Dict]:
-        """Obtiene la equity curve de las últimas X horas para el gráfico"""
+    def get_equity_curve(self, user_id: int, period_hours: int = 24, since: datetime = None,
+                         max_points: int = None) -> List[Dict]:
+        """Obtiene la equity curve de las últimas X horas (o desde `since`) para el gráfico"""
+        return self.load_equity_curve(user_id, period_hours, since, max_points)[1]
+    
+    def load_equity_curve(self, user_id: int, period_hours: int = 24, since: datetime = None,
+                          max_points: int = None) -> Tuple[str, List[Dict]]:
+        """
+        (resolución, puntos) de la ventana pedida.
+        Snapshots crudos si la ventana es corta; si no, el close de las velas
+        de la resolución más gruesa que da suficientes puntos (con open/high/low).
+        max_points: LTTB sobre el resultado.
+        """
+        now = datetime.now()
+        start = since or now - timedelta(hours=period_hours)
+        resolution = choose_resolution(start, now, max_points or Config.EQUITY_CURVE_TARGET_POINTS)
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Calcular timestamp de inicio
-        start_time = (datetime.now() - timedelta(hours=period_hours)).isoformat()
+        if resolution == 'raw':
+            cursor.execute("""
+                SELECT equity, timestamp 
+                FROM equity_curve 
+                WHERE user_id = ? AND timestamp >= ?
+                ORDER BY timestamp ASC
+            """, (user_id, start.isoformat()))
+            points = [
+                {'equity': row[0], 'timestamp': row[1]}
+                for row in cursor.fetchall()
+            ]
+        else:
+            bucket_format = next(fmt for name, _, fmt, _ in ROLLUP_RESOLUTIONS if name == resolution)
+            cursor.execute("""
+                SELECT bucket, open, high, low, close
+                FROM equity_rollups
+                WHERE user_id = ? AND resolution = ? AND bucket >= ?
+                ORDER BY bucket ASC
+            """, (user_id, resolution, start.strftime(bucket_format)))
+            points = [
+                {'equity': row['close'], 'timestamp': row['bucket'],
+                 'open': row['open'], 'high': row['high'], 'low': row['low']}
+                for row in cursor.fetchall()
+            ]
         
-        cursor.execute("""
-            SELECT equity, timestamp 
-            FROM equity_curve 
-            WHERE user_id = ? AND timestamp >= ?
-            ORDER BY timestamp ASC
-        """, (user_id, start_time))
-        
-        data = cursor.fetchall()
         conn.close()
         
-        return [
-            {'equity': row[0], 'timestamp': row[1]}
-            for row in data
-        ]
+        if max_points:
+            points = lttb(points, max_points)
+        return resolution, points
     
     def update_equity_snapshot(self, user_id: int, current_equity: float):
         """Guarda un snapshot del equity actual para la curva"""
@@ -164,71 +408,53 @@ class AnalyticsService:
         conn.commit()
         conn.close()
     
-    def get_consecutive_wins_losses(self, user_id: int) -> Dict:
-        """Calcula rachas actuales de victorias/derrotas consecutivas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT pnl FROM positions 
-            WHERE user_id = ? AND status = 'closed' AND pnl IS NOT NULL
-            ORDER BY closed_at DESC
-        """, (user_id,))
-        
-        trades = cursor.fetchall()
-        conn.close()
+    def get_consecutive_wins_losses(self, user_id: int, state: Dict = None) -> Dict:
+        """
+        Calcula rachas actuales de victorias/derrotas consecutivas
+        Los trades en 0 al tope se saltean para elegir el signo de la racha;
+        con un solo 0 al tope el trade siguiente cuenta dos veces, con dos o
+        más la racha es 1 (así lo contaba el cálculo sobre la lista completa)
+        """
+        state = state or self.get_state(user_id)
         
-        if not trades:
+        if not state['run_sign']:
             return {'consecutive_wins': 0, 'consecutive_losses': 0}
         
-        # Contar racha actual
-        consecutive_wins = 0
-        consecutive_losses = 0
-        
-        for trade in trades:
-            pnl = trade[0]
-            
-            if pnl > 0:
-                consecutive_wins += 1
-                break
-            elif pnl < 0:
-                consecutive_losses += 1
-                break
-        
-        # Si la primera fue ganancia, seguir contando
-        if consecutive_wins > 0:
-            for trade in trades[1:]:
-                if trade[0] > 0:
-                    consecutive_wins += 1
-                else:
-                    break
-        
-        # Si la primera fue pérdida, seguir contando
-        if consecutive_losses > 0:
-            for trade in trades[1:]:
-                if trade[0] < 0:
-                    consecutive_losses += 1
-                else:
-                    break
+        if state['lead_zeros'] == 0:
+            streak = state['run_len']
+        elif state['lead_zeros'] == 1:
+            streak = 1 + state['run_len']
+        else:
+            streak = 1
         
         return {
-            'consecutive_wins': consecutive_wins,
-            'consecutive_losses': consecutive_losses
+            'consecutive_wins': streak if state['run_sign'] > 0 else 0,
+            'consecutive_losses': streak if state['run_sign'] < 0 else 0
         }
     
-    def get_full_analytics(self, user_id: int) -> Dict:
-        """Obtiene todas las estadísticas de analytics en un solo call"""
-        win_rate_stats = self.calculate_win_rate(user_id)
-        drawdown_stats = self.calculate_drawdown(user_id)
-        streak_stats = self.get_consecutive_wins_losses(user_id)
-        equity_curve = self.get_equity_curve(user_id, period_hours=24)
-        
-        return {
+    def get_full_analytics(self, user_id: int, include_equity_curve: bool = True) -> Dict:
+        """Obtiene todas las estadísticas de analytics en un solo call (una lectura de estado)"""
+        state = self.get_state(user_id)
+        win_rate_stats = self.calculate_win_rate(user_id, state)
+        drawdown_stats = self.calculate_drawdown(user_id, state)
+        streak_stats = self.get_consecutive_wins_losses(user_id, state)
+        
+        analytics = {
             **win_rate_stats,
             **drawdown_stats,
-            **streak_stats,
-            'equity_curve': equity_curve
+            **streak_stats
         }
+        if include_equity_curve:
+            analytics['equity_curve'] = self.get_equity_curve(user_id, period_hours=24)
+        return analytics
+    
+    def get_risk_metrics(self, user_id: int, days: int = DEFAULT_DAYS, resolution: str = None) -> Dict:
+        """Sharpe, Sortino, Calmar, expectancy, drawdown móvil y tiempo bajo el agua (NumPy)"""
+        conn = self.get_connection()
+        try:
+            return compute_risk_report(conn.cursor(), [user_id], days, resolution)[0]
+        finally:
+            conn.close()
     
     def update_trading_stats(self, user_id: int):
         """Actualiza la tabla trading_stats con los analytics calculados"""
@@ -260,6 +486,9 @@ class AnalyticsService:
         
         conn.commit()
         conn.close()
+    
+    def get_stats(self):
+        return dict(self.stats)
 
 
 # Instancia global
@@ -0,0 +1,101 @@
+"""
+Change Tracker
+Versión actual de cada usuario (user_versions, mantenida por triggers) en
+memoria del proceso, para responder el ETag de /dashboard/snapshot sin
+consultar tablas.
+
+- PRAGMA data_version (sobre una conexión propia) sólo cambia cuando otra
+  conexión hizo commit: es un chequeo del WAL index en memoria compartida,
+  sin leer páginas de la base
+- Si cambió, trae sólo las filas con version > la última vista (índice
+  sobre version), no la tabla entera
+"""
+import logging
+from threading import Lock
+from database import connect
+from migrations.add_user_versions import GLOBAL_USER_ID
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeTracker:
+    def __init__(self):
+        self._lock = Lock()
+        self._conn = None
+        self._data_version = None
+        self._max_version = 0
+        self._versions = {}  # user_id -> version
+        self.stats = {
+            'checks': 0,
+            'refreshes': 0,
+            'rows_loaded': 0,
+            'errors': 0
+        }
+
+    def _refresh(self):
+        if self._conn is None:
+            self._conn = connect()
+
+        # data_version primero: un commit entre las dos lecturas sólo provoca
+        # una relectura de más en el próximo chequeo, nunca una versión perdida
+        data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return
+
+        rows = self._conn.execute('''
+            SELECT user_id, version FROM user_versions
+            WHERE version > ?
+            ORDER BY version
+        ''', (self._max_version,)).fetchall()
+        for user_id, version in rows:
+            self._versions[user_id] = version
+        if rows:
+            self._max_version = rows[-1][1]
+
+        self._data_version = data_version
+        self.stats['refreshes'] += 1
+        self.stats['rows_loaded'] += len(rows)
+
+    def versions_for(self, user_id):
+        """(versión del usuario, versión global) vigentes en este momento"""
+        with self._lock:
+            self.stats['checks'] += 1
+            try:
+                self._refresh()
+            except Exception as e:
+                # Conexión rota: se reabre en el próximo chequeo
+                self.stats['errors'] += 1
+                self._close()
+                logger.error("❌ Error leyendo user_versions: %s", e)
+                raise
+            return self._versions.get(user_id, 0), self._versions.get(GLOBAL_USER_ID, 0)
+
+    def etag_for(self, user_id, variant=''):
+        """
+        ETag (sin comillas, como lo espera Response.set_etag) de los datos del
+        usuario; variant distingue vistas distintas de la misma versión
+        """
+        user_version, global_version = self.versions_for(user_id)
+        etag = f"u{user_id}-{user_version}-{global_version}"
+        return f"{etag}-{variant}" if variant else etag
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+        self._data_version = None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                'users_tracked': len(self._versions),
+                'max_version': self._max_version
+            }
+
+
+# Instancia global
+change_tracker = ChangeTracker()
@@ -2,15 +2,17 @@
 Cooldown Manager - Anti-Whipsaw Protection
 Previene overtrading bloqueando tickers después de pérdidas
 """
-import sqlite3
+import logging
 from datetime import datetime, timedelta
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
 
 class CooldownManager:
-    def __init__(self, db_path='trading_bot.db'):
-        self.db_path = db_path
+    def __init__(self):
         self.cooldown_duration = 60  # minutos por defecto
     
-    def activate_cooldown(self, ticker, reason="Stop Loss hit", duration_minutes=60):
+    def activate_cooldown(self, ticker, reason="Stop Loss hit", duration_minutes=60, cursor=None):
         """
         Activa cooldown para un ticker específico
         
@@ -18,10 +20,13 @@ class CooldownManager:
             ticker: Symbol del activo (AMZN, BTCUSD, etc)
             reason: Razón del cooldown (SL, Manual, etc)
             duration_minutes: Duración del bloqueo en minutos
+            cursor: Transacción del caller (no hace commit); sin cursor usa la suya
         """
+        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if cursor is None:
+                conn = get_db_connection()
+                cursor = conn.cursor()
             
             cooldown_until = datetime.now() + timedelta(minutes=duration_minutes)
             
@@ -31,10 +36,12 @@ class CooldownManager:
                 VALUES (?, ?, ?, ?, 1)
             """, (ticker, datetime.now().isoformat(), cooldown_until.isoformat(), reason))
             
-            conn.commit()
-            conn.close()
+            if conn is not None:
+                conn.commit()
+                conn.close()
             
-            print(f"🧊 COOLDOWN ACTIVADO: {ticker} bloqueado hasta {cooldown_until.strftime('%H:%M:%S')} ({duration_minutes} min)")
+            logger.info("🧊 COOLDOWN ACTIVADO: %s bloqueado hasta %s (%s min)",
+                        ticker, cooldown_until.strftime('%H:%M:%S'), duration_minutes)
             
             return {
                 'success': True,
@@ -49,9 +56,10 @@ class CooldownManager:
                 'error': str(e)
             }
     
-    def is_ticker_in_cooldown(self, ticker):
+    def is_ticker_in_cooldown(self, ticker, cursor=None):
         """
         Verifica si un ticker está actualmente en cooldown
+        Con cursor, la expiración se escribe en la transacción del caller (sin commit)
         
         Returns:
             dict: {
@@ -60,9 +68,11 @@ class CooldownManager:
                 'time_remaining_minutes': int
             }
         """
+        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if cursor is None:
+                conn = get_db_connection()
+                cursor = conn.cursor()
             
             cursor.execute("""
                 SELECT cooldown_until, reason
@@ -73,7 +83,8 @@ class CooldownManager:
             """, (ticker,))
             
             result = cursor.fetchone()
-            conn.close()
+            if conn is not None:
+                conn.close()
             
             if not result:
                 return {
@@ -87,7 +98,8 @@ class CooldownManager:
             
             # Verificar si el cooldown ya expiró
             if datetime.now() >= cooldown_until:
-                self.deactivate_cooldown(ticker)
+                # Con conexión propia (ya cerrada) deactivate abre y commitea la suya
+                self.deactivate_cooldown(ticker, cursor=None if conn is not None else cursor)
                 return {
                     'in_cooldown': False,
                     'reason': None,
@@ -106,19 +118,22 @@ class CooldownManager:
             }
             
         except Exception as e:
-            print(f"⚠️ Error verificando cooldown: {str(e)}")
+            logger.warning("⚠️ Error verificando cooldown: %s", e, extra={'sample_key': 'cooldown.check_error'})
             return {
                 'in_cooldown': False,
                 'error': str(e)
             }
     
-    def deactivate_cooldown(self, ticker):
+    def deactivate_cooldown(self, ticker, cursor=None):
         """
         Desactiva manualmente el cooldown de un ticker
+        Con cursor escribe en la transacción del caller (sin commit)
         """
+        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if cursor is None:
+                conn = get_db_connection()
+                cursor = conn.cursor()
             
             cursor.execute("""
                 UPDATE ticker_cooldowns
@@ -126,10 +141,11 @@ class CooldownManager:
                 WHERE ticker = ?
             """, (ticker,))
             
-            conn.commit()
-            conn.close()
+            if conn is not None:
+                conn.commit()
+                conn.close()
             
-            print(f"✅ Cooldown removido: {ticker}")
+            logger.info("✅ Cooldown removido: %s", ticker)
             return {'success': True}
             
         except Exception as e:
@@ -140,7 +156,7 @@ class CooldownManager:
         Obtiene todos los tickers actualmente en cooldown
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -185,7 +201,7 @@ class CooldownManager:
         Limpia cooldowns expirados de la base de datos
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -199,7 +215,7 @@ class CooldownManager:
             conn.close()
             
             if rows_updated > 0:
-                print(f"🧹 Cooldowns expirados limpiados: {rows_updated}")
+                logger.info("🧹 Cooldowns expirados limpiados: %d", rows_updated)
             
             return {'success': True, 'cleaned': rows_updated}
             
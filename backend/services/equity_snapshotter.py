@@ -0,0 +1,247 @@
+"""
+Equity Snapshotter
+Graba la equity de todos los usuarios cada EQUITY_SNAPSHOT_INTERVAL segundos
+(equity = EQUITY_STARTING_BALANCE + pnl realizado + pnl abierto) con UN
+INSERT ... SELECT, en vez de un update_equity_snapshot por usuario. Los
+triggers de equity_curve arman las velas 1m/1h/1d y actualizan analytics.
+
+Cada EQUITY_PRUNE_INTERVAL segundos poda lo que quedó fuera de la retención
+de cada resolución, usuario por usuario (transacciones cortas). Antes de
+borrar snapshots crudos los acumula en analytics_state.base_* para que el
+drawdown siga cubriendo todo el historial.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+from config import Config
+from database import get_db_connection
+from migrations.add_equity_rollups import ROLLUP_RESOLUTIONS
+from services.analytics_service import apply_equity, equity_retention_days
+
+logger = logging.getLogger(__name__)
+
+
+class EquitySnapshotter:
+    def __init__(self, interval=None, prune_interval=None):
+        self.interval = interval or Config.EQUITY_SNAPSHOT_INTERVAL  # seconds
+        self.prune_interval = prune_interval or Config.EQUITY_PRUNE_INTERVAL  # seconds
+        self.starting_balance = Config.EQUITY_STARTING_BALANCE
+        self.running = False
+        self.thread = None
+        self._stop_event = Event()
+        self._run_lock = Lock()
+        self._last_prune = 0.0
+        self.stats = {
+            'snapshots': 0,
+            'rows_written': 0,
+            'last_snapshot_at': None,
+            'last_snapshot_ms': 0.0,
+            'prunes': 0,
+            'raw_rows_pruned': 0,
+            'rollups_pruned': 0,
+            'last_prune_ms': 0.0,
+            'last_error': None
+        }
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def snapshot(self, timestamp=None):
+        """Un snapshot de todos los usuarios con trading_stats. Returns: filas insertadas"""
+        timestamp = (timestamp or datetime.now()).isoformat()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO equity_curve (user_id, equity, timestamp)
+                SELECT s.user_id, ? + s.realized + COALESCE(o.unrealized, 0), ?
+                FROM (
+                    SELECT user_id, SUM(COALESCE(total_profit, 0)) AS realized
+                    FROM trading_stats
+                    GROUP BY user_id
+                ) s
+                LEFT JOIN (
+                    SELECT user_id, SUM(COALESCE(pnl, 0)) AS unrealized
+                    FROM positions
+                    WHERE status = 'open'
+                    GROUP BY user_id
+                ) o ON o.user_id = s.user_id
+            ''', (self.starting_balance, timestamp))
+            rows = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return rows
+
+    def run_once(self):
+        """Snapshot + poda si ya toca"""
+        with self._run_lock:
+            start = time.perf_counter()
+            try:
+                rows = self.snapshot()
+                self.stats['snapshots'] += 1
+                self.stats['rows_written'] += rows
+                self.stats['last_snapshot_at'] = datetime.now().isoformat()
+                self.stats['last_error'] = None
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                logger.error("❌ Error grabando equity snapshot: %s", e)
+            self.stats['last_snapshot_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+            if time.monotonic() - self._last_prune >= self.prune_interval:
+                self._last_prune = time.monotonic()
+                self.prune()
+
+    # ------------------------------------------------------------------
+    # Retención
+    # ------------------------------------------------------------------
+
+    def _prune_user(self, user_id, raw_cutoff, rollup_cutoffs):
+        """Acumula y borra los snapshots crudos viejos de un usuario, y sus velas viejas"""
+        raw_pruned = rollups_pruned = 0
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+
+            if raw_cutoff:
+                cursor.execute('''
+                    SELECT equity, timestamp FROM equity_curve
+                    WHERE user_id = ? AND timestamp < ?
+                    ORDER BY timestamp ASC
+                ''', (user_id, raw_cutoff))
+                pruned = cursor.fetchall()
+
+                if pruned:
+                    cursor.execute('''
+                        SELECT base_equity_count, base_peak, base_max_drawdown, base_last_equity
+                        FROM analytics_state WHERE user_id = ?
+                    ''', (user_id,))
+                    row = cursor.fetchone()
+                    base = {
+                        'equity_count': row['base_equity_count'] if row else 0,
+                        'peak': row['base_peak'] if row else 0.0,
+                        'max_drawdown': row['base_max_drawdown'] if row else 0.0,
+                        'last_equity': row['base_last_equity'] if row else 0.0
+                    }
+                    for snapshot in pruned:
+                        apply_equity(base, snapshot['equity'])
+                    last_at = pruned[-1]['timestamp']
+
+                    # base_* antes del DELETE: el trigger de analytics ignora lo ya acumulado
+                    cursor.execute('''
+                        INSERT INTO analytics_state (
+                            user_id, base_equity_count, base_peak, base_max_drawdown,
+                            base_last_equity, base_last_equity_at
+                        ) VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(user_id) DO UPDATE SET
+                            base_equity_count = excluded.base_equity_count,
+                            base_peak = excluded.base_peak,
+                            base_max_drawdown = excluded.base_max_drawdown,
+                            base_last_equity = excluded.base_last_equity,
+                            base_last_equity_at = excluded.base_last_equity_at
+                    ''', (user_id, base['equity_count'], base['peak'], base['max_drawdown'],
+                          base['last_equity'], last_at))
+                    cursor.execute('''
+                        DELETE FROM equity_curve WHERE user_id = ? AND timestamp <= ?
+                    ''', (user_id, last_at))
+                    raw_pruned = cursor.rowcount
+
+            for resolution, cutoff in rollup_cutoffs:
+                cursor.execute('''
+                    DELETE FROM equity_rollups
+                    WHERE user_id = ? AND resolution = ? AND bucket < ?
+                ''', (user_id, resolution, cutoff))
+                rollups_pruned += cursor.rowcount
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return raw_pruned, rollups_pruned
+
+    def prune(self):
+        """Aplica la retención de cada resolución. Returns: (snapshots crudos, velas) borrados"""
+        start = time.perf_counter()
+        now = datetime.now()
+        retention = equity_retention_days()
+        raw_cutoff = None
+        if retention['raw']:
+            raw_cutoff = (now - timedelta(days=retention['raw'])).isoformat()
+        rollup_cutoffs = [
+            (name, (now - timedelta(days=retention[name])).strftime(bucket_format))
+            for name, _, bucket_format, _ in ROLLUP_RESOLUTIONS
+            if retention[name]
+        ]
+
+        raw_total = rollups_total = 0
+        try:
+            conn = get_db_connection()
+            try:
+                user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id').fetchall()]
+            finally:
+                conn.close()
+
+            for user_id in user_ids:
+                if self._stop_event.is_set():
+                    break
+                raw_pruned, rollups_pruned = self._prune_user(user_id, raw_cutoff, rollup_cutoffs)
+                raw_total += raw_pruned
+                rollups_total += rollups_pruned
+            self.stats['last_error'] = None
+        except Exception as e:
+            self.stats['last_error'] = str(e)
+            logger.error("❌ Error podando equity curve: %s", e)
+
+        self.stats['prunes'] += 1
+        self.stats['raw_rows_pruned'] += raw_total
+        self.stats['rollups_pruned'] += rollups_total
+        self.stats['last_prune_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        if raw_total or rollups_total:
+            logger.info("🧹 Equity curve podada", extra={'raw_rows': raw_total, 'rollups': rollups_total})
+        return raw_total, rollups_total
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def snapshot_loop(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """Inicia los snapshots periódicos"""
+        if self.running:
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self.thread = Thread(target=self.snapshot_loop, name='equity-snapshotter', daemon=True)
+        self.thread.start()
+        logger.info("✅ Equity snapshotter iniciado (cada %d s)", self.interval)
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=30)
+            self.thread = None
+        logger.info("✅ Equity snapshotter detenido")
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            'running': self.running,
+            'interval': self.interval,
+            'prune_interval': self.prune_interval,
+            'retention_days': equity_retention_days()
+        }
+
+
+# Instancia global
+equity_snapshotter = EquitySnapshotter()
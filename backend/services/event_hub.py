@@ -0,0 +1,302 @@
+"""
+Event Hub
+Canal push del dashboard (GET /dashboard/stream, Server-Sent Events) en vez
+de que cada pestaña haga polling de realtime-prices / connection-status /
+positions con sus propias queries.
+
+Un solo poller por proceso, sin importar cuántos clientes haya conectados:
+- Cada EVENT_STREAM_INTERVAL_MS arma el estado actual: precios (price cache
+  del proceso, que en el líder recibe el tick stream del WebSocket; si no,
+  current_price de las posiciones), posiciones abiertas de los usuarios
+  suscriptos (UNA query para todos) y connection status
+- Sólo vuelve a leer SQLite si cambió PRAGMA data_version (alguien hizo commit)
+- Difea contra lo último enviado y encola los deltas ya serializados: los
+  eventos de precios/conexión se serializan una vez y se comparten
+- Cada cliente nuevo recibe un snapshot completo y después sólo deltas
+
+Un cliente que se atrasa EVENT_STREAM_QUEUE_SIZE eventos se desconecta; al
+reconectar (EventSource lo hace solo) recibe un snapshot nuevo.
+"""
+import json
+import logging
+import queue
+import time
+from threading import Thread, Event, Lock
+from config import Config
+from database import connect
+from services.price_cache import price_cache
+
+logger = logging.getLogger(__name__)
+
+POSITION_FIELDS = (
+    'id', 'user_id', 'symbol', 'side', 'quantity', 'remaining_quantity',
+    'entry_price', 'current_price', 'pnl', 'status', 'opened_at'
+)
+
+NO_CONNECTION = {
+    'source': 'Unknown',
+    'status': 'disconnected',
+    'last_update': None,
+    'latency_ms': 0
+}
+
+
+def format_event(name, data):
+    """Mensaje SSE listo para escribir al socket"""
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+class Subscriber:
+    """Un stream abierto: cola acotada de mensajes ya serializados"""
+
+    def __init__(self, user_id, max_events):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=max_events)
+        self.needs_snapshot = True
+        self.closed = False
+
+    def put(self, message):
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            # Perdió deltas: cortar el stream para que reconecte con snapshot
+            self.closed = True
+            return False
+
+    def get(self, timeout):
+        """Próximo mensaje o None si no hubo nada en `timeout` segundos"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    def __init__(self, interval_ms=None, queue_size=None):
+        self.interval = (interval_ms or Config.EVENT_STREAM_INTERVAL_MS) / 1000.0
+        self.queue_size = queue_size or Config.EVENT_STREAM_QUEUE_SIZE
+        self.running = False
+        self.thread = None
+        self._lock = Lock()
+        self._wake = Event()
+        self._subscribers = set()
+        self._conn = None
+        self._reset_state()
+        self.stats = {
+            'subscribed': 0,
+            'peak_subscribers': 0,
+            'ticks': 0,
+            'db_reads': 0,
+            'db_reads_skipped': 0,
+            'events_sent': 0,
+            'clients_dropped': 0,
+            'errors': 0,
+            'last_tick_ms': 0.0,
+            'max_tick_ms': 0.0
+        }
+
+    def _reset_state(self):
+        # Último estado enviado a los clientes
+        self._data_version = None
+        self._prices = {}      # symbol -> precio en formato /dashboard/realtime-prices
+        self._positions = {}   # user_id -> {position_id: posición}
+        self._connection = None
+
+    # ------------------------------------------------------------------
+    # Suscripciones
+    # ------------------------------------------------------------------
+
+    def subscribe(self, user_id):
+        """Abre un stream para el usuario; arranca el poller si es el primero"""
+        subscriber = Subscriber(user_id, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self.stats['subscribed'] += 1
+            self.stats['peak_subscribers'] = max(self.stats['peak_subscribers'], len(self._subscribers))
+            if not self.running:
+                self.running = True
+                self.thread = Thread(target=self._loop, name='event-hub', daemon=True)
+                self.thread.start()
+        self._wake.set()  # snapshot inmediato, sin esperar al próximo tick
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.closed = True
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    # ------------------------------------------------------------------
+    # Poller
+    # ------------------------------------------------------------------
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+            with self._lock:
+                subscribers = [sub for sub in self._subscribers if not sub.closed]
+                if not subscribers:
+                    # Sin clientes no se consulta nada; el próximo subscribe lo rearranca
+                    self.running = False
+                    self.thread = None
+                    self._close_connection()
+                    self._reset_state()
+                    return
+
+            try:
+                self.tick(subscribers)
+            except Exception as e:
+                self.stats['errors'] += 1
+                self._close_connection()
+                self._data_version = None
+                logger.error("❌ Error en event hub: %s", e)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _read_positions(self, cursor, user_ids):
+        """Posiciones abiertas de todos los usuarios suscriptos en una sola query"""
+        cursor.execute(f'''
+            SELECT {', '.join(POSITION_FIELDS)}
+            FROM positions
+            WHERE user_id IN (SELECT value FROM json_each(?)) AND status = 'open'
+        ''', (json.dumps(sorted(user_ids)),))
+
+        positions = {user_id: {} for user_id in user_ids}
+        for row in cursor.fetchall():
+            positions[row['user_id']][row['id']] = dict(row)
+        return positions
+
+    def _read_connection(self, cursor):
+        cursor.execute('''
+            SELECT source, status, last_update, latency_ms
+            FROM connection_status
+            ORDER BY last_update DESC
+            LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        return dict(row) if row else dict(NO_CONNECTION)
+
+    def _current_prices(self):
+        """Price cache del proceso; current_price persistido para lo que no esté en cache"""
+        prices = {}
+        for positions in self._positions.values():
+            for position in positions.values():
+                if position['current_price'] and position['symbol'] not in prices:
+                    prices[position['symbol']] = {
+                        'price': float(position['current_price']),
+                        'color': 'gray',
+                        'source': 'db',
+                        'timestamp': None,
+                        'stale': True
+                    }
+        prices.update(price_cache.snapshot())
+        return prices
+
+    def tick(self, subscribers):
+        """Un ciclo: lee lo que cambió, difea y encola deltas/snapshots"""
+        start = time.perf_counter()
+        user_ids = {sub.user_id for sub in subscribers}
+
+        if self._conn is None:
+            self._conn = connect()
+        cursor = self._conn.cursor()
+
+        # data_version cambia cuando OTRA conexión hace commit: si no cambió y no
+        # hay usuarios nuevos, las posiciones y el connection status son los mismos
+        data_version = cursor.execute('PRAGMA data_version').fetchone()[0]
+        position_deltas = {}
+        connection_message = None
+
+        if data_version != self._data_version or user_ids != set(self._positions):
+            positions = self._read_positions(cursor, user_ids)
+            connection = self._read_connection(cursor)
+            self._data_version = data_version
+            self.stats['db_reads'] += 1
+
+            for user_id, current in positions.items():
+                previous = self._positions.get(user_id)
+                if previous is None:
+                    continue  # usuario nuevo: recibe snapshot
+                upserted = [position for position_id, position in current.items()
+                            if previous.get(position_id) != position]
+                removed = [position_id for position_id in previous if position_id not in current]
+                if upserted or removed:
+                    position_deltas[user_id] = format_event(
+                        'positions', {'upserted': upserted, 'removed': removed}
+                    )
+            self._positions = positions
+
+            if connection != self._connection:
+                self._connection = connection
+                connection_message = format_event('connection', connection)
+        else:
+            self.stats['db_reads_skipped'] += 1
+
+        prices = self._current_prices()
+        changed_prices = {symbol: price for symbol, price in prices.items()
+                          if self._prices.get(symbol) != price}
+        self._prices = prices
+        prices_message = format_event('prices', changed_prices) if changed_prices else None
+
+        sent = dropped = 0
+        for sub in subscribers:
+            if sub.needs_snapshot:
+                sub.needs_snapshot = False
+                messages = [format_event('snapshot', {
+                    'prices': prices,
+                    'positions': list(self._positions.get(sub.user_id, {}).values()),
+                    'connection': self._connection
+                })]
+            else:
+                messages = [m for m in (prices_message, connection_message,
+                                        position_deltas.get(sub.user_id)) if m]
+
+            for message in messages:
+                if sub.put(message):
+                    sent += 1
+                elif sub.closed:
+                    dropped += 1
+                    break
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats['ticks'] += 1
+        self.stats['events_sent'] += sent
+        self.stats['clients_dropped'] += dropped
+        self.stats['last_tick_ms'] = round(elapsed_ms, 3)
+        self.stats['max_tick_ms'] = round(max(self.stats['max_tick_ms'], elapsed_ms), 3)
+
+    def stop(self):
+        """Cierra todos los streams (el poller termina solo al quedarse sin clientes)"""
+        with self._lock:
+            subscribers, self._subscribers = list(self._subscribers), set()
+        for sub in subscribers:
+            sub.closed = True
+        self._wake.set()
+
+    def get_stats(self):
+        with self._lock:
+            subscribers = len(self._subscribers)
+            users = len({sub.user_id for sub in self._subscribers})
+        return {
+            **self.stats,
+            'running': self.running,
+            'subscribers': subscribers,
+            'users': users,
+            'interval_ms': self.interval * 1000,
+            'queue_size': self.queue_size,
+            'symbols': len(self._prices)
+        }
+
+
+# Instancia global
+event_hub = EventHub()
@@ -2,15 +2,14 @@
 Heartbeat Monitor Service
 Detecta si el sistema está vivo y envía alertas críticas si se cae
 """
-import sqlite3
 import time
 from datetime import datetime, timedelta
 from threading import Thread
 from services.notification_service import notification_service
+from database import get_db_connection
 
 class HeartbeatMonitor:
-    def __init__(self, db_path='trading_bot.db', check_interval=30):
-        self.db_path = db_path
+    def __init__(self, check_interval=30):
         self.check_interval = check_interval  # segundos
         self.running = False
         self.thread = None
@@ -25,7 +24,7 @@ class HeartbeatMonitor:
         self.last_heartbeat = datetime.now()
         
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Guardar heartbeat en DB para auditoria
@@ -46,7 +45,7 @@ class HeartbeatMonitor:
         Verifica si el sistema está respondiendo correctamente
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Verificar posiciones abiertas con riesgo
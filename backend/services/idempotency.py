@@ -0,0 +1,134 @@
+"""
+Idempotency Index
+Deduplicación de alertas de TradingView (reintentos del propio TradingView,
+la misma alerta disparada desde varios charts).
+
+Clave de idempotencia:
+    - alert_id explícito en el payload, o
+    - hash de ticker/signal/price + bucket de tiempo (campo `time` del payload
+      o la hora de llegada, en ventanas de WEBHOOK_DEDUP_BUCKET segundos)
+
+Dos niveles:
+    1. LRU en memoria con TTL (O(1), sin tocar SQLite) - por proceso
+    2. webhook_keys con PRIMARY KEY - autoridad entre workers de gunicorn
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from threading import RLock
+from config import Config
+
+
+class IdempotencyIndex:
+    def __init__(self, ttl=None, bucket_seconds=None, max_keys=None):
+        self.enabled = Config.WEBHOOK_DEDUP_ENABLED
+        self.ttl = ttl or Config.WEBHOOK_DEDUP_TTL  # seconds
+        self.bucket_seconds = bucket_seconds or Config.WEBHOOK_DEDUP_BUCKET
+        self.max_keys = max_keys or Config.WEBHOOK_DEDUP_CACHE_SIZE
+        self._lock = RLock()
+        self._keys = OrderedDict()  # key -> monotonic time de la primera vez
+        self.stats = {
+            'checked': 0,
+            'accepted': 0,
+            'duplicates_memory': 0,
+            'duplicates_db': 0,
+            'evictions': 0,
+            'purged': 0
+        }
+
+    def make_key(self, data):
+        """Clave de idempotencia de un payload de señal (None si no aplica)"""
+        if not self.enabled:
+            return None
+
+        alert_id = data.get('alert_id')
+        if alert_id not in (None, ''):
+            return f"alert:{alert_id}"
+
+        try:
+            price = repr(float(data.get('price', 0)))
+        except (TypeError, ValueError):
+            return None
+
+        # TradingView manda {{time}}/{{timenow}} si la alerta lo incluye
+        moment = data.get('time') or data.get('timenow') or int(time.time() // self.bucket_seconds)
+        raw = '|'.join((
+            str(data.get('ticker', '')).upper(),
+            str(data.get('signal', '')).upper(),
+            price,
+            str(moment)
+        ))
+        return 'hash:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def seen(self, key):
+        """Chequeo en memoria, O(1). True si la clave ya fue aceptada dentro del TTL"""
+        now = time.monotonic()
+        with self._lock:
+            self.stats['checked'] += 1
+            first_seen = self._keys.get(key)
+            if first_seen is None:
+                return False
+            if now - first_seen >= self.ttl:
+                del self._keys[key]
+                return False
+            self._keys.move_to_end(key)
+            self.stats['duplicates_memory'] += 1
+            return True
+
+    def claim(self, cursor, key, webhook_id=None):
+        """
+        Reserva la clave en webhook_keys dentro de la transacción del caller.
+        Returns: True si es nueva; False si otro proceso ya la tiene (duplicado).
+        Una clave vencida se reutiliza aunque todavía no se haya purgado.
+        """
+        now = time.time()
+        cursor.execute('''
+            INSERT INTO webhook_keys (idempotency_key, webhook_id, received_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(idempotency_key) DO UPDATE
+            SET webhook_id = excluded.webhook_id, received_at = excluded.received_at
+            WHERE webhook_keys.received_at < ?
+        ''', (key, webhook_id, now, now - self.ttl))
+
+        if cursor.rowcount == 0:
+            with self._lock:
+                self.stats['duplicates_db'] += 1
+            self._remember(key)
+            return False
+        return True
+
+    def remember(self, key):
+        """Agrega una clave aceptada al LRU (llamar después del commit)"""
+        with self._lock:
+            self.stats['accepted'] += 1
+            self._remember(key)
+
+    def _remember(self, key):
+        with self._lock:
+            self._keys[key] = time.monotonic()
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def purge(self, cursor):
+        """Borra de webhook_keys las claves vencidas. No hace commit"""
+        cursor.execute('DELETE FROM webhook_keys WHERE received_at < ?',
+                       (time.time() - self.ttl,))
+        with self._lock:
+            self.stats['purged'] += cursor.rowcount
+        return cursor.rowcount
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['keys_in_memory'] = len(self._keys)
+        stats['enabled'] = self.enabled
+        stats['ttl'] = self.ttl
+        stats['bucket_seconds'] = self.bucket_seconds
+        stats['max_keys'] = self.max_keys
+        return stats
+
+
+# Instancia global
+idempotency_index = IdempotencyIndex()
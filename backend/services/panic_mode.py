@@ -2,14 +2,11 @@
 Panic Mode Service - Kill Switch para emergencias
 Cierra todas las posiciones y desactiva el bot inmediatamente
 """
-import sqlite3
 from datetime import datetime
 from services.notification_service import notification_service
+from database import get_db_connection
 
 class PanicModeService:
-    def __init__(self, db_path='trading_bot.db'):
-        self.db_path = db_path
-    
     def execute_kill_switch(self, user_id, reason="Manual panic activation"):
         """
         KILL SWITCH: Cierra todo inmediatamente
@@ -28,7 +25,7 @@ class PanicModeService:
             }
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             errors = []
@@ -144,7 +141,7 @@ class PanicModeService:
         Desactiva el webhook para que no entren nuevas señales
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -166,7 +163,7 @@ class PanicModeService:
         Obtiene historial de activaciones del panic mode
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
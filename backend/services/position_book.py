@@ -0,0 +1,281 @@
+"""
+Position Book
+Libro en memoria de las posiciones abiertas, indexado por símbolo, con los
+niveles de Stop Loss / Take Profit / Trailing Stop ordenados por lado.
+
+Un precio nuevo sólo toca las posiciones cuyo nivel cruzó:
+bisect sobre la lista ordenada -> O(log n + k) en vez de recorrer todas.
+
+La fuente de verdad sigue siendo SQLite: el libro se sincroniza (posiciones
+nuevas por id, resync completo cada POSITION_BOOK_RESYNC_INTERVAL) y SQLite
+sólo se escribe cuando una posición cambia de estado.
+
+Sólo entran las posiciones de usuarios con auto_close_enabled: las demás no
+tienen niveles que vigilar y nunca se cierran solas.
+"""
+import time
+from bisect import bisect_left, bisect_right, insort
+from threading import RLock
+from config import Config
+from database import get_db_connection
+
+# (price, id): (price, 0) queda antes y (price, INF) después de cualquier id real
+INF = float('inf')
+
+LOAD_SQL = """
+    SELECT p.id, p.user_id, p.symbol, p.side, p.entry_price,
+           COALESCE(NULLIF(p.remaining_quantity, 0), p.quantity) AS quantity,
+           p.trailing_stop,
+           b.auto_close_enabled, b.stop_loss_percent, b.take_profit_percent
+    FROM positions p
+    JOIN bot_config b ON b.user_id = p.user_id
+    WHERE p.status = 'open' AND b.auto_close_enabled = 1
+"""
+
+
+class BookPosition:
+    __slots__ = ('id', 'user_id', 'symbol', 'is_long', 'entry_price', 'quantity',
+                 'stop_price', 'stop_reason', 'target_price')
+
+    def __init__(self, row):
+        (self.id, self.user_id, self.symbol, side, self.entry_price, self.quantity,
+         trailing_stop, auto_close, stop_loss_pct, take_profit_pct) = row
+        self.is_long = (side or '').upper() == 'BUY'
+
+        self.stop_price = None
+        self.stop_reason = None
+        self.target_price = None
+
+        if auto_close and stop_loss_pct:
+            offset = stop_loss_pct / 100
+            self.stop_price = self.entry_price * (1 - offset if self.is_long else 1 + offset)
+            self.stop_reason = 'Stop Loss'
+        if auto_close and take_profit_pct:
+            offset = take_profit_pct / 100
+            self.target_price = self.entry_price * (1 + offset if self.is_long else 1 - offset)
+
+        if auto_close and trailing_stop:
+            self.apply_trailing_stop(trailing_stop)
+
+    def tightens(self, trailing_stop):
+        """True si el trailing stop es más protector que el stop actual"""
+        return (self.stop_price is None
+                or (self.is_long and trailing_stop > self.stop_price)
+                or (not self.is_long and trailing_stop < self.stop_price))
+
+    def apply_trailing_stop(self, trailing_stop):
+        """El trailing stop reemplaza al SL cuando es más protector"""
+        if self.tightens(trailing_stop):
+            self.stop_price = trailing_stop
+            self.stop_reason = 'Trailing Stop'
+
+    def pnl_at(self, price):
+        if self.is_long:
+            return (price - self.entry_price) * self.quantity
+        return (self.entry_price - price) * self.quantity
+
+    def pnl_percent_at(self, price):
+        if self.is_long:
+            return (price - self.entry_price) / self.entry_price * 100
+        return (self.entry_price - price) / self.entry_price * 100
+
+
+class SymbolLevels:
+    """Niveles ordenados (price, position_id) de un símbolo"""
+    __slots__ = ('long_stops', 'long_targets', 'short_stops', 'short_targets')
+
+    def __init__(self):
+        self.long_stops = []
+        self.long_targets = []
+        self.short_stops = []
+        self.short_targets = []
+
+    def lists_for(self, position):
+        if position.is_long:
+            return self.long_stops, self.long_targets
+        return self.short_stops, self.short_targets
+
+    def __len__(self):
+        return (len(self.long_stops) + len(self.long_targets)
+                + len(self.short_stops) + len(self.short_targets))
+
+
+def _remove_level(levels, price, position_id):
+    i = bisect_left(levels, (price, position_id))
+    if i < len(levels) and levels[i] == (price, position_id):
+        del levels[i]
+
+
+class PositionBook:
+    def __init__(self, resync_interval=None):
+        self.resync_interval = resync_interval or Config.POSITION_BOOK_RESYNC_INTERVAL  # seconds
+        self._lock = RLock()
+        self._positions = {}
+        self._levels = {}
+        self.max_id = 0
+        self.last_full_sync = 0.0
+        self.stats = {
+            'checks': 0,
+            'triggered': 0,
+            'full_syncs': 0,
+            'incremental_syncs': 0,
+            'symbol_reloads': 0
+        }
+
+    # ------------------------------------------------------------------
+    # Mantenimiento del índice
+    # ------------------------------------------------------------------
+
+    def _index(self, position):
+        if position.stop_price is None and position.target_price is None:
+            return
+        levels = self._levels.setdefault(position.symbol, SymbolLevels())
+        stops, targets = levels.lists_for(position)
+        if position.stop_price is not None:
+            insort(stops, (position.stop_price, position.id))
+        if position.target_price is not None:
+            insort(targets, (position.target_price, position.id))
+
+    def _unindex(self, position):
+        levels = self._levels.get(position.symbol)
+        if not levels:
+            return
+        stops, targets = levels.lists_for(position)
+        if position.stop_price is not None:
+            _remove_level(stops, position.stop_price, position.id)
+        if position.target_price is not None:
+            _remove_level(targets, position.target_price, position.id)
+        if not len(levels):
+            del self._levels[position.symbol]
+
+    def add(self, row):
+        """Agrega (o reemplaza) una posición a partir de una fila de LOAD_SQL"""
+        position = BookPosition(row)
+        with self._lock:
+            self.remove(position.id)
+            self._positions[position.id] = position
+            self._index(position)
+            self.max_id = max(self.max_id, position.id)
+        return position
+
+    def remove(self, position_id):
+        with self._lock:
+            position = self._positions.pop(position_id, None)
+            if position:
+                self._unindex(position)
+            return position
+
+    def update_stop(self, position_id, trailing_stop, quantity=None):
+        """Trailing stop (y cantidad tras cierres parciales) movidos por TradingEngine"""
+        with self._lock:
+            position = self._positions.get(position_id)
+            if not position:
+                return
+            if quantity:
+                position.quantity = quantity
+            if trailing_stop is None or not position.tightens(trailing_stop):
+                return
+            self._unindex(position)
+            position.apply_trailing_stop(trailing_stop)
+            self._index(position)
+
+    # ------------------------------------------------------------------
+    # Sincronización con SQLite
+    # ------------------------------------------------------------------
+
+    def _query(self, sql, params, cursor):
+        if cursor is not None:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        conn = get_db_connection()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def load(self, cursor=None):
+        """Recarga el libro completo"""
+        rows = self._query(LOAD_SQL, (), cursor)
+        with self._lock:
+            self._positions = {}
+            self._levels = {}
+            self.max_id = 0
+            for row in rows:
+                self.add(tuple(row))
+            self.last_full_sync = time.monotonic()
+            self.stats['full_syncs'] += 1
+
+    def reload_symbol(self, symbol, cursor=None):
+        """Recarga las posiciones abiertas de un símbolo (p.ej. antes de chequear un webhook)"""
+        rows = self._query(LOAD_SQL + " AND p.symbol = ?", (symbol,), cursor)
+        with self._lock:
+            for position in [p for p in self._positions.values() if p.symbol == symbol]:
+                self.remove(position.id)
+            for row in rows:
+                self.add(tuple(row))
+            self.stats['symbol_reloads'] += 1
+
+    def sync(self, cursor=None):
+        """Posiciones nuevas por id; resync completo si pasó el intervalo"""
+        if time.monotonic() - self.last_full_sync >= self.resync_interval:
+            self.load(cursor)
+            return
+
+        rows = self._query(LOAD_SQL + " AND p.id > ?", (self.max_id,), cursor)
+        with self._lock:
+            for row in rows:
+                self.add(tuple(row))
+            self.stats['incremental_syncs'] += 1
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def check(self, symbol, price):
+        """
+        Posiciones del símbolo cuyo nivel cruzó este precio.
+        Returns: [(BookPosition, reason)] - no modifica el libro
+        """
+        with self._lock:
+            self.stats['checks'] += 1
+            levels = self._levels.get(symbol)
+            if not levels:
+                return []
+
+            hits = []
+            # Long: stop si price <= stop, target si price >= target
+            hits += [(pid, 'stop') for _, pid in levels.long_stops[bisect_left(levels.long_stops, (price, 0)):]]
+            hits += [(pid, 'target') for _, pid in levels.long_targets[:bisect_right(levels.long_targets, (price, INF))]]
+            # Short: stop si price >= stop, target si price <= target
+            hits += [(pid, 'stop') for _, pid in levels.short_stops[:bisect_right(levels.short_stops, (price, INF))]]
+            hits += [(pid, 'target') for _, pid in levels.short_targets[bisect_left(levels.short_targets, (price, 0)):]]
+
+            triggered = {}
+            for position_id, kind in hits:
+                if position_id in triggered:
+                    continue  # stop tiene prioridad sobre target
+                position = self._positions[position_id]
+                reason = position.stop_reason if kind == 'stop' else 'Take Profit'
+                triggered[position_id] = (position, reason)
+
+            self.stats['triggered'] += len(triggered)
+            return list(triggered.values())
+
+    def symbols(self):
+        with self._lock:
+            return list(self._levels)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'positions': len(self._positions),
+                'symbols': len(self._levels),
+                'levels': sum(len(levels) for levels in self._levels.values()),
+                'max_id': self.max_id,
+                'resync_interval': self.resync_interval,
+                **self.stats
+            }
+
+
+# Instancia global
+position_book = PositionBook()
@@ -0,0 +1,91 @@
+"""
+Position Repricer
+Recalcula current_price/pnl de TODAS las posiciones abiertas de uno o varios
+símbolos con un solo UPDATE (sin traer filas a Python).
+
+Usado por PriceMonitor, el tick buffer del WebSocket y el webhook de demo.
+"""
+import sqlite3
+from datetime import datetime
+
+# Longs ganan cuando sube, shorts cuando baja; cierres parciales reducen remaining_quantity
+PNL_EXPRESSION = """
+    CASE WHEN UPPER(side) = 'BUY'
+         THEN ({price} - entry_price) * COALESCE(NULLIF(remaining_quantity, 0), quantity)
+         ELSE (entry_price - {price}) * COALESCE(NULLIF(remaining_quantity, 0), quantity)
+    END
+"""
+
+# UPDATE ... FROM existe desde SQLite 3.33
+UPDATE_FROM_SUPPORTED = sqlite3.sqlite_version_info >= (3, 33, 0)
+
+
+def reprice_symbol(cursor, symbol, price, updated_at=None, users_sql=None):
+    """
+    Reprecia las posiciones abiertas de un símbolo. Returns: filas actualizadas
+    users_sql: subconsulta de user_id para limitar a esos usuarios (p.ej. bots demo activos)
+    """
+    users_filter = f"AND user_id IN ({users_sql})" if users_sql else ""
+    cursor.execute(f"""
+        UPDATE positions
+        SET current_price = :price,
+            pnl = {PNL_EXPRESSION.format(price=':price')},
+            updated_at = :updated_at
+        WHERE symbol = :symbol AND status = 'open' {users_filter}
+    """, {
+        'symbol': symbol,
+        'price': price,
+        'updated_at': updated_at or datetime.now().isoformat()
+    })
+    return cursor.rowcount
+
+
+def reprice_symbols(cursor, prices, updated_at=None):
+    """
+    Reprecia las posiciones abiertas de varios símbolos en un solo UPDATE
+    (join contra una tabla temporal de precios). No hace commit.
+    prices: {symbol: price}
+    Returns: filas actualizadas
+    """
+    if not prices:
+        return 0
+    if len(prices) == 1:
+        symbol, price = next(iter(prices.items()))
+        return reprice_symbol(cursor, symbol, price, updated_at)
+
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS reprice_prices (
+            symbol TEXT PRIMARY KEY,
+            price REAL NOT NULL
+        )
+    """)
+    cursor.execute("DELETE FROM reprice_prices")
+    cursor.executemany(
+        "INSERT INTO reprice_prices (symbol, price) VALUES (?, ?)",
+        list(prices.items())
+    )
+
+    params = {'updated_at': updated_at or datetime.now().isoformat()}
+
+    if UPDATE_FROM_SUPPORTED:
+        cursor.execute(f"""
+            UPDATE positions
+            SET current_price = p.price,
+                pnl = {PNL_EXPRESSION.format(price='p.price')},
+                updated_at = :updated_at
+            FROM reprice_prices AS p
+            WHERE positions.symbol = p.symbol AND positions.status = 'open'
+        """, params)
+    else:
+        price = "(SELECT price FROM reprice_prices WHERE symbol = positions.symbol)"
+        cursor.execute(f"""
+            UPDATE positions
+            SET current_price = {price},
+                pnl = {PNL_EXPRESSION.format(price=price)},
+                updated_at = :updated_at
+            WHERE status = 'open' AND symbol IN (SELECT symbol FROM reprice_prices)
+        """, params)
+
+    rows = cursor.rowcount
+    cursor.execute("DELETE FROM reprice_prices")
+    return rows
@@ -0,0 +1,165 @@
+"""
+Price Cache
+Cache de precios en memoria compartido por todo el proceso.
+Escriben: WebSocket (Binance), PriceMonitor (yfinance/REST), webhook (TradingView)
+Leen: trading engine, dashboard, webhook
+
+Cada entrada guarda symbol, price, source y timestamp. La frescura depende
+de la clase de activo (crypto se mueve en segundos, stocks/índices no).
+"""
+import time
+from collections import namedtuple
+from datetime import datetime
+from threading import Lock
+from config import Config
+
+PriceEntry = namedtuple('PriceEntry', ['symbol', 'price', 'source', 'timestamp', 'previous_price'])
+
+FIAT_CURRENCIES = {'USD', 'EUR', 'GBP', 'JPY', 'CHF', 'AUD', 'CAD', 'NZD'}
+METALS = {'XAU', 'XAG'}
+INDICES = {'SPX', 'NDX', 'DJI', 'US30', 'US500', 'NAS100', 'VIX'}
+
+
+def asset_class(symbol):
+    """Clasifica un ticker de TradingView: crypto, forex, index o stock"""
+    symbol = symbol.upper()
+    if symbol.startswith('^') or symbol in INDICES:
+        return 'index'
+    if symbol.endswith('USDT'):
+        return 'crypto'
+    if len(symbol) == 6 and symbol[:3] in FIAT_CURRENCIES | METALS and symbol[3:] in FIAT_CURRENCIES:
+        return 'forex'
+    if symbol.endswith('USD') and len(symbol) > 3:
+        return 'crypto'
+    return 'stock'
+
+
+class PriceCache:
+    def __init__(self, ttl_ms=None, max_age=None):
+        # TTL por clase de activo: dentro del TTL el precio es "fresco" y nadie
+        # vuelve a pedirlo; pasado el TTL sigue sirviendo para mostrar (stale)
+        # hasta max_age, luego se descarta
+        self.ttl_ms = ttl_ms or {
+            'crypto': Config.PRICE_TTL_CRYPTO_MS,
+            'forex': Config.PRICE_TTL_FOREX_MS,
+            'index': Config.PRICE_TTL_INDEX_MS,
+            'stock': Config.PRICE_TTL_STOCK_MS,
+        }
+        self.max_age = max_age or Config.PRICE_CACHE_MAX_AGE  # seconds
+        self._entries = {}
+        self._lock = Lock()
+        self._listeners = []
+        self.stats = {'writes': 0, 'hits': 0, 'misses': 0}
+
+    def ttl_for(self, symbol):
+        """TTL en segundos para el símbolo"""
+        return self.ttl_ms[asset_class(symbol)] / 1000.0
+
+    def set(self, symbol, price, source, timestamp=None):
+        """Guarda un precio y notifica a los listeners"""
+        if price is None or price <= 0:
+            return None
+
+        timestamp = timestamp or time.time()
+        with self._lock:
+            current = self._entries.get(symbol)
+            # Nunca pisar un precio más nuevo con uno viejo (fuentes fuera de orden)
+            if current and current.timestamp > timestamp:
+                return current
+            entry = PriceEntry(symbol, float(price), source, timestamp,
+                               current.price if current else None)
+            self._entries[symbol] = entry
+            self.stats['writes'] += 1
+            listeners = list(self._listeners)
+
+        for callback in listeners:
+            try:
+                callback(entry)
+            except Exception as e:
+                print(f"⚠️ Error en listener de precios: {str(e)}")
+
+        return entry
+
+    def get_entry(self, symbol):
+        """Última entrada conocida, sin importar la edad (o None si expiró)"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry and time.time() - entry.timestamp > self.max_age:
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry.timestamp <= self.ttl_for(entry.symbol)
+
+    def get(self, symbol):
+        """Entrada fresca (dentro del TTL) o None"""
+        entry = self.get_entry(symbol)
+        fresh = self.is_fresh(entry)
+        with self._lock:
+            self.stats['hits' if fresh else 'misses'] += 1
+        return entry if fresh else None
+
+    def get_price(self, symbol):
+        """Precio fresco o None"""
+        entry = self.get(symbol)
+        return entry.price if entry else None
+
+    def get_many(self, symbols):
+        """Precios frescos para varios símbolos: {symbol: price}"""
+        prices = {}
+        for symbol in set(symbols):
+            price = self.get_price(symbol)
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+    def to_dict(self, entry):
+        previous = entry.previous_price
+        if previous is None or entry.price == previous:
+            color = 'gray'
+        else:
+            color = 'green' if entry.price > previous else 'red'
+        return {
+            'price': entry.price,
+            'color': color,
+            'source': entry.source,
+            'timestamp': datetime.fromtimestamp(entry.timestamp).isoformat(),
+            'stale': not self.is_fresh(entry)
+        }
+
+    def snapshot(self):
+        """Todos los precios no expirados, en el formato de /dashboard/realtime-prices"""
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.values())
+            for entry in entries:
+                if now - entry.timestamp > self.max_age:
+                    del self._entries[entry.symbol]
+        return {
+            entry.symbol: self.to_dict(entry)
+            for entry in entries
+            if now - entry.timestamp <= self.max_age
+        }
+
+    def subscribe(self, callback):
+        """Registra callback(entry) que se llama en cada escritura"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'symbols': len(self._entries),
+                'ttl_ms': dict(self.ttl_ms),
+                'max_age': self.max_age,
+                **self.stats
+            }
+
+
+# Instancia global
+price_cache = PriceCache()
@@ -2,10 +2,19 @@
 Price Monitor Service
 Actualiza automáticamente los precios de activos y recalcula PnL
 """
-import sqlite3
+import logging
 import time
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Thread, Lock
 from datetime import datetime
+from config import Config
+from database import get_db_connection
+from services.price_cache import price_cache
+from services.position_repricer import reprice_symbols
+from services.position_book import position_book
+from services.trading_engine import trading_engine
+
+logger = logging.getLogger(__name__)
 
 # Import requests with error handling
 try:
@@ -24,12 +33,29 @@ except ImportError as e:
     YFINANCE_AVAILABLE = False
 
 class PriceMonitor:
-    def __init__(self, db_path='trading_bot.db', update_interval=5):
-        self.db_path = db_path
+    def __init__(self, update_interval=5, fetch_workers=None, fetch_deadline=None):
         self.update_interval = update_interval  # seconds
         self.running = False
         self.thread = None
         
+        # Fetch concurrente acotado (símbolos que el batch no resolvió)
+        self.fetch_workers = fetch_workers or Config.PRICE_FETCH_WORKERS
+        self.fetch_deadline = fetch_deadline or Config.PRICE_FETCH_DEADLINE  # seconds por ciclo
+        self._executor = None
+        
+        # Métricas del último ciclo y acumuladas
+        self._stats_lock = Lock()
+        self.last_cycle = None
+        self.totals = {
+            'cycles': 0,
+            'symbols_requested': 0,
+            'symbols_cached': 0,
+            'symbols_batched': 0,
+            'symbols_fallback': 0,
+            'symbols_missing': 0,
+            'deadline_exceeded': 0
+        }
+        
         # Mapeo de tickers TradingView a Yahoo Finance
         self.ticker_map = {
             'BTCUSD': 'BTC-USD',
@@ -53,7 +79,18 @@ class PriceMonitor:
         return ticker
     
     def get_current_price(self, ticker):
-        """Obtiene el precio actual de un ticker usando yfinance o API fallback"""
+        """Obtiene el precio actual de un ticker (price cache, yfinance o API fallback)"""
+        cached = price_cache.get_price(ticker)
+        if cached is not None:
+            return cached
+        
+        price, source = self.fetch_price(ticker)
+        if price is not None:
+            price_cache.set(ticker, price, source)
+        return price
+    
+    def fetch_price(self, ticker):
+        """Pide el precio a yfinance o a la API fallback. Returns: (price, source)"""
         # Primero intentar con yfinance
         if YFINANCE_AVAILABLE:
             try:
@@ -71,17 +108,17 @@ class PriceMonitor:
                 )
                 
                 if price:
-                    return float(price)
+                    return float(price), 'yfinance'
                 
                 # Si no hay precio en info, intentar con history
                 hist = stock.history(period='1d', interval='1m')
                 if not hist.empty:
-                    return float(hist['Close'].iloc[-1])
+                    return float(hist['Close'].iloc[-1]), 'yfinance'
             except Exception as e:
-                print(f"⚠️ yfinance error para {ticker}: {str(e)}")
+                logger.warning("⚠️ yfinance error para %s: %s", ticker, e, extra={'sample_key': 'price.fetch_error'})
         
         # Fallback: usar API REST simple para crypto
-        return self.get_price_from_api(ticker)
+        return self.get_price_from_api(ticker), 'rest'
     
     def get_price_from_api(self, ticker):
         """Fallback: obtiene precio desde APIs REST simples"""
@@ -109,176 +146,239 @@ class PriceMonitor:
             
             return None
         except Exception as e:
-            print(f"⚠️ API fallback error para {ticker}: {str(e)}")
+            logger.warning("⚠️ API fallback error para %s: %s", ticker, e, extra={'sample_key': 'price.fetch_error'})
             return None
     
+    def get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.fetch_workers,
+                thread_name_prefix='price-fetch'
+            )
+        return self._executor
+    
+    def get_batch_prices(self, symbols, timeout):
+        """Obtiene precios de varios símbolos en UNA sola request de yfinance"""
+        if not YFINANCE_AVAILABLE or not symbols:
+            return {}
+        
+        yf_map = {self.map_ticker(symbol): symbol for symbol in symbols}
+        
+        try:
+            data = yf.download(
+                tickers=list(yf_map.keys()),
+                period='1d',
+                interval='1m',
+                group_by='ticker',
+                threads=False,
+                progress=False,
+                timeout=timeout
+            )
+        except Exception as e:
+            logger.warning("⚠️ yfinance batch error: %s", e, extra={'sample_key': 'price.batch_error'})
+            return {}
+        
+        if data is None or data.empty:
+            return {}
+        
+        prices = {}
+        for yf_symbol, symbol in yf_map.items():
+            try:
+                if len(yf_map) == 1 and 'Close' in data.columns:
+                    closes = data['Close']
+                else:
+                    closes = data[yf_symbol]['Close']
+                closes = closes.dropna()
+                if not closes.empty:
+                    prices[symbol] = float(closes.iloc[-1])
+            except (KeyError, IndexError, TypeError):
+                continue
+        
+        return prices
+    
+    def get_prices(self, symbols):
+        """
+        Obtiene precios para un conjunto de símbolos:
+        1. Deduplica
+        2. Los que están frescos en el price cache no se piden
+        3. Un batch de yfinance para el resto
+        4. Los que falten: fetch individual concurrente con deadline por ciclo
+        Returns: (prices dict, métricas del ciclo)
+        """
+        start = time.perf_counter()
+        deadline = start + self.fetch_deadline
+        symbols = sorted(set(symbols))
+        
+        prices = price_cache.get_many(symbols)
+        cached = len(prices)
+        
+        to_fetch = [symbol for symbol in symbols if symbol not in prices]
+        batch_prices = self.get_batch_prices(to_fetch, timeout=self.fetch_deadline)
+        for symbol, price in batch_prices.items():
+            price_cache.set(symbol, price, 'yfinance')
+        prices.update(batch_prices)
+        batched = len(batch_prices)
+        batch_ms = (time.perf_counter() - start) * 1000
+        
+        remaining = [symbol for symbol in symbols if symbol not in prices]
+        deadline_exceeded = 0
+        
+        if remaining:
+            executor = self.get_executor()
+            futures = {executor.submit(self.get_current_price, symbol): symbol for symbol in remaining}
+            done, not_done = wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+            
+            for future in done:
+                try:
+                    price = future.result()
+                except Exception:
+                    price = None
+                if price is not None:
+                    prices[futures[future]] = price
+            
+            for future in not_done:
+                future.cancel()
+            deadline_exceeded = len(not_done)
+        
+        cycle = {
+            'symbols_requested': len(symbols),
+            'symbols_cached': cached,
+            'symbols_batched': batched,
+            'symbols_fallback': len(prices) - cached - batched,
+            'symbols_missing': len(symbols) - len(prices),
+            'deadline_exceeded': deadline_exceeded,
+            'batch_latency_ms': round(batch_ms, 1),
+            'fetch_latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        with self._stats_lock:
+            self.last_cycle = cycle
+            self.totals['cycles'] += 1
+            for key in ('symbols_requested', 'symbols_cached', 'symbols_batched', 'symbols_fallback',
+                        'symbols_missing', 'deadline_exceeded'):
+                self.totals[key] += cycle[key]
+        
+        return prices, cycle
+    
+    def get_stats(self):
+        """Métricas de fetch: último ciclo y acumulados"""
+        with self._stats_lock:
+            return {
+                'running': self.running,
+                'update_interval': self.update_interval,
+                'fetch_workers': self.fetch_workers,
+                'fetch_deadline': self.fetch_deadline,
+                'last_cycle': self.last_cycle,
+                'totals': dict(self.totals)
+            }
+    
     def update_positions_prices(self):
-        """Actualiza los precios de todas las posiciones abiertas y recalcula PnL"""
+        """Actualiza los precios de todas las posiciones abiertas y recalcula PnL. Returns: {symbol: price}"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
-            # Obtener todas las posiciones abiertas
+            # Sólo hacen falta los símbolos: el PnL se recalcula en SQL
             cursor.execute("""
-                SELECT id, symbol, side, quantity, entry_price 
-                FROM positions 
+                SELECT symbol, COUNT(*) FROM positions 
                 WHERE status = 'open'
+                GROUP BY symbol
             """)
             
-            positions = cursor.fetchall()
+            open_symbols = dict(cursor.fetchall())
             
-            if not positions:
+            if not open_symbols:
                 conn.close()
-                return
+                return {}
             
-            print(f"🔄 Actualizando {len(positions)} posiciones...")
+            # Un fetch por símbolo único, no por posición
+            prices, cycle = self.get_prices(open_symbols)
             
-            for position in positions:
-                pos_id, symbol, side, quantity, entry_price = position
-                
-                # Obtener precio actual
-                current_price = self.get_current_price(symbol)
-                
-                if current_price is None:
-                    print(f"⚠️ No se pudo obtener precio para {symbol}")
-                    continue
-                
-                # Calcular PnL
-                if side == 'buy':
-                    pnl = (current_price - entry_price) * quantity
-                else:  # sell/short
-                    pnl = (entry_price - current_price) * quantity
-                
-                # Actualizar posición
-                cursor.execute("""
-                    UPDATE positions 
-                    SET current_price = ?, pnl = ?, updated_at = ?
-                    WHERE id = ?
-                """, (current_price, pnl, datetime.now().isoformat(), pos_id))
-                
-                print(f"✅ {symbol}: ${entry_price:.2f} -> ${current_price:.2f} | PnL: ${pnl:.2f}")
+            for symbol in open_symbols:
+                if symbol not in prices:
+                    logger.warning("⚠️ No se pudo obtener precio para %s", symbol,
+                                   extra={'sample_key': 'price.missing'})
             
+            rows = reprice_symbols(cursor, prices)
             conn.commit()
             conn.close()
             
+            logger.info("🔄 %d/%d posiciones actualizadas (%d/%d símbolos, fetch %.0f ms)",
+                        rows, sum(open_symbols.values()), len(prices), cycle['symbols_requested'],
+                        cycle['fetch_latency_ms'], extra={'sample_key': 'price.cycle'})
+            
+            return prices
+            
         except Exception as e:
-            print(f"❌ Error actualizando precios: {str(e)}")
+            logger.error("❌ Error actualizando precios: %s", e, extra={'sample_key': 'price.cycle_error'})
+            return {}
     
-    def check_stop_loss_take_profit(self):
-        """Verifica si alguna posición alcanzó SL/TP y cierra automáticamente"""
+    def check_stop_loss_take_profit(self, prices=None):
+        """Cierra las posiciones cuyo SL/TP/Trailing Stop cruzó el último precio (vía position book)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Obtener configuración de auto_close
-            cursor.execute("""
-                SELECT auto_close_enabled, stop_loss_percent, take_profit_percent
-                FROM bot_config
-                LIMIT 1
-            """)
-            
-            config = cursor.fetchone()
-            if not config or not config[0]:  # auto_close_enabled = False
-                conn.close()
-                return
+            position_book.sync()
             
-            auto_close_enabled, stop_loss_percent, take_profit_percent = config
+            if prices is None:
+                prices = price_cache.get_many(position_book.symbols())
             
-            # Obtener posiciones abiertas con PnL calculado
-            cursor.execute("""
-                SELECT id, symbol, entry_price, current_price, pnl, quantity
-                FROM positions 
-                WHERE status = 'open' AND current_price IS NOT NULL
-            """)
+            conn = get_db_connection()
+            cursor = conn.cursor()
             
-            positions = cursor.fetchall()
-            
-            for position in positions:
-                pos_id, symbol, entry_price, current_price, pnl, quantity = position
-                
-                # Calcular porcentaje de ganancia/pérdida
-                pnl_percent = (pnl / (entry_price * quantity)) * 100
-                
-                should_close = False
-                close_reason = ""
-                
-                # Check Stop Loss
-                if pnl_percent <= -stop_loss_percent:
-                    should_close = True
-                    close_reason = f"Stop Loss ({pnl_percent:.2f}%)"
-                
-                # Check Take Profit
-                elif pnl_percent >= take_profit_percent:
-                    should_close = True
-                    close_reason = f"Take Profit ({pnl_percent:.2f}%)"
-                
-                if should_close:
-                    # Cerrar posición
-                    cursor.execute("""
-                        UPDATE positions 
-                        SET status = 'closed', exit_price = ?, closed_at = ?
-                        WHERE id = ?
-                    """, (current_price, datetime.now().isoformat(), pos_id))
-                    
-                    # Actualizar estadísticas
-                    if pnl > 0:
-                        cursor.execute("""
-                            UPDATE trading_stats 
-                            SET winning_trades = winning_trades + 1,
-                                total_profit = total_profit + ?
-                            WHERE user_id = (SELECT user_id FROM positions WHERE id = ?)
-                        """, (pnl, pos_id))
-                    else:
-                        cursor.execute("""
-                            UPDATE trading_stats 
-                            SET losing_trades = losing_trades + 1,
-                                total_profit = total_profit + ?
-                            WHERE user_id = (SELECT user_id FROM positions WHERE id = ?)
-                        """, (pnl, pos_id))
-                    
-                    print(f"🔴 Posición cerrada automáticamente: {symbol} | {close_reason} | PnL: ${pnl:.2f}")
+            closed = []
+            for symbol, price in prices.items():
+                closed.extend(trading_engine.close_triggered_positions(cursor, symbol, price))
             
             conn.commit()
             conn.close()
+            trading_engine.release_closed_positions(closed)
+            
+            for position in closed:
+                logger.info("🔴 Posición cerrada automáticamente: %s | %s (%.2f%%) | PnL: $%.2f",
+                            position['symbol'], position['reason'], position['pnl_percent'], position['pnl'],
+                            extra={'sample_key': 'risk.position_closed'})
             
         except Exception as e:
-            print(f"❌ Error verificando SL/TP: {str(e)}")
+            logger.error("❌ Error verificando SL/TP: %s", e, extra={'sample_key': 'price.sltp_error'})
     
     def monitor_loop(self):
         """Loop principal de monitoreo"""
-        print(f"🚀 Price Monitor iniciado (actualización cada {self.update_interval}s)")
+        logger.info("🚀 Price Monitor iniciado (actualización cada %ss)", self.update_interval)
         
         while self.running:
             try:
-                self.update_positions_prices()
-                self.check_stop_loss_take_profit()
+                prices = self.update_positions_prices()
+                self.check_stop_loss_take_profit(prices)
             except Exception as e:
-                print(f"❌ Error en monitor loop: {str(e)}")
+                logger.error("❌ Error en monitor loop: %s", e, extra={'sample_key': 'price.loop_error'})
             
             time.sleep(self.update_interval)
         
-        print("⛔ Price Monitor detenido")
+        logger.info("⛔ Price Monitor detenido")
     
     def start(self):
         """Inicia el monitor en un thread separado"""
         if self.running:
-            print("⚠️ Price Monitor ya está corriendo")
+            logger.warning("⚠️ Price Monitor ya está corriendo")
             return
         
         if not YFINANCE_AVAILABLE:
-            print("ℹ️ yfinance no disponible - usando API REST fallback")
+            logger.info("ℹ️ yfinance no disponible - usando API REST fallback")
         
         self.running = True
         self.thread = Thread(target=self.monitor_loop, daemon=True)
         self.thread.start()
-        print("✅ Price Monitor iniciado")
+        logger.info("✅ Price Monitor iniciado")
     
     def stop(self):
         """Detiene el monitor"""
         self.running = False
         if self.thread:
             self.thread.join(timeout=10)
-        print("✅ Price Monitor detenido")
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("✅ Price Monitor detenido")
 
 
 # Instancia global del monitor
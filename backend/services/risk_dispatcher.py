@@ -0,0 +1,132 @@
+"""
+Risk Dispatcher
+Conecta el stream de precios (price cache: WebSocket, PriceMonitor, webhooks)
+con TradingEngine.update_symbol_risk.
+
+- Serialización por símbolo: nunca corren dos pasadas del mismo símbolo a la vez
+- Conflation: si llega un tick mientras el símbolo está en proceso, sólo se
+  guarda el último y se procesa al terminar
+- Símbolos distintos corren en paralelo en un pool acotado (RISK_DISPATCH_WORKERS)
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from config import Config
+from services.price_cache import price_cache
+from services.trading_engine import trading_engine
+
+logger = logging.getLogger(__name__)
+
+class RiskDispatcher:
+    def __init__(self, workers=None):
+        self.workers = workers or Config.RISK_DISPATCH_WORKERS
+        self.running = False
+        self._executor = None
+        self._lock = Lock()
+        self._in_flight = set()
+        self._pending = {}
+        self.stats = {
+            'ticks_received': 0,
+            'ticks_conflated': 0,
+            'runs': 0,
+            'errors': 0,
+            'positions_evaluated': 0,
+            'positions_updated': 0,
+            'positions_closed': 0,
+            'partial_closes': 0,
+            'total_run_ms': 0.0,
+            'max_run_ms': 0.0,
+            'last_error': None
+        }
+
+    def on_price(self, entry):
+        """Listener del price cache"""
+        self.submit(entry.symbol, entry.price)
+
+    def submit(self, symbol, price):
+        with self._lock:
+            if not self.running:
+                return
+            self.stats['ticks_received'] += 1
+            if symbol in self._in_flight:
+                if symbol in self._pending:
+                    self.stats['ticks_conflated'] += 1
+                self._pending[symbol] = price
+                return
+            self._in_flight.add(symbol)
+        self._executor.submit(self._run, symbol, price)
+
+    def _run(self, symbol, price):
+        while True:
+            start = time.perf_counter()
+            try:
+                summary = trading_engine.update_symbol_risk(symbol, price)
+                error = None
+            except Exception as e:
+                summary = None
+                error = str(e)
+                logger.error("❌ Error en risk pass %s: %s", symbol, error,
+                             extra={'sample_key': 'risk.pass_error'})
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            with self._lock:
+                self.stats['runs'] += 1
+                self.stats['total_run_ms'] += elapsed_ms
+                self.stats['max_run_ms'] = round(max(self.stats['max_run_ms'], elapsed_ms), 3)
+                if summary:
+                    self.stats['positions_evaluated'] += summary['positions']
+                    self.stats['positions_updated'] += summary['updated']
+                    self.stats['positions_closed'] += summary['closed']
+                    self.stats['partial_closes'] += summary['partial_closes']
+                else:
+                    self.stats['errors'] += 1
+                    self.stats['last_error'] = error
+
+                # Siguiente tick pendiente del mismo símbolo (si llegó alguno)
+                if self.running and symbol in self._pending:
+                    price = self._pending.pop(symbol)
+                    continue
+                self._pending.pop(symbol, None)
+                self._in_flight.discard(symbol)
+                return
+
+    def start(self):
+        """Se suscribe al price cache"""
+        if self.running:
+            return
+        if not Config.RISK_ENGINE_ENABLED:
+            logger.info("ℹ️ Risk engine deshabilitado (RISK_ENGINE_ENABLED=false)")
+            return
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='risk')
+        self.running = True
+        price_cache.subscribe(self.on_price)
+        logger.info("✅ Risk dispatcher iniciado (%d workers)", self.workers)
+
+    def stop(self):
+        """Se desuscribe y espera las pasadas en curso"""
+        if not self.running:
+            return
+        price_cache.unsubscribe(self.on_price)
+        with self._lock:
+            self.running = False
+            self._pending.clear()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        logger.info("✅ Risk dispatcher detenido")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._in_flight)
+            stats['pending'] = len(self._pending)
+        total_ms = stats.pop('total_run_ms')
+        stats['avg_run_ms'] = round(total_ms / stats['runs'], 3) if stats['runs'] else 0.0
+        stats['running'] = self.running
+        stats['workers'] = self.workers
+        return stats
+
+
+# Instancia global
+risk_dispatcher = RiskDispatcher()
@@ -0,0 +1,138 @@
+"""
+Risk Kernel
+Versión vectorizada (NumPy) de la lógica de TradingEngine.evaluate_risk:
+trailing stop, break-even y cierres parciales para TODAS las posiciones de
+un símbolo a partir de un solo precio.
+
+Mismas operaciones en el mismo orden que las funciones escalares
+(calculate_pnl, calculate_trailing_stop, should_break_even,
+calculate_partial_closes), así que los resultados son idénticos bit a bit.
+Si cambian las reglas en TradingEngine hay que cambiarlas aquí también.
+"""
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️ numpy no disponible: {str(e)}")
+    NUMPY_AVAILABLE = False
+    np = None
+
+# Reglas de TradingEngine
+TRAILING_PERCENT = 1.0
+BREAK_EVEN_TRIGGER_PERCENT = 1.5
+BREAK_EVEN_COMMISSION = 0.001
+TP1_PERCENT, TP1_FRACTION = 2.0, 0.5  # TP1 nunca más lejos que el TP del usuario
+TP2_FRACTION = 0.5                     # TP2 = take_profit_percent del usuario
+
+# SL/TP si el bot_config del usuario no los tiene (defaults del schema)
+DEFAULT_STOP_LOSS_PERCENT = 2.0
+DEFAULT_TAKE_PROFIT_PERCENT = 5.0
+
+# Orden de columnas de la matriz que devuelve TradingEngine (ver RISK_KERNEL_COLUMNS)
+COLUMNS = ('id', 'user_id', 'entry_price', 'quantity', 'is_long', 'highest_price',
+           'trailing_stop', 'break_even_active', 'tp1_closed', 'tp2_closed',
+           'remaining_quantity', 'stop_loss_percent', 'take_profit_percent')
+
+
+def _pnl(is_long, entry_price, price, quantity):
+    """calculate_pnl vectorizado. Returns: (pnl_dollars, pnl_percent)"""
+    pnl = np.where(is_long, (price - entry_price) * quantity, (entry_price - price) * quantity)
+    cost_basis = entry_price * quantity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl_percent = np.where(cost_basis > 0, (pnl / cost_basis) * 100, 0.0)
+    return pnl, pnl_percent
+
+
+def evaluate_risk_batch(matrix, price):
+    """
+    matrix: array (n, len(COLUMNS)) float64; NULL = NaN
+    price: precio actual del símbolo
+    Returns: dict de arrays (n,) con el nuevo estado y las máscaras de eventos
+    """
+    col = {name: matrix[:, i] for i, name in enumerate(COLUMNS)}
+    entry_price = col['entry_price']
+    quantity = col['quantity']
+    is_long = col['is_long'] == 1
+    highest_price = col['highest_price']
+    stored_trailing = col['trailing_stop']
+    break_even_active = col['break_even_active'] == 1
+    tp1_closed = col['tp1_closed'] == 1
+    tp2_closed = col['tp2_closed'] == 1
+    stop_loss_percent = col['stop_loss_percent']
+    take_profit_percent = col['take_profit_percent']
+
+    # Si no hay remaining_quantity, usar original
+    remaining = np.where(np.isnan(col['remaining_quantity']), quantity, col['remaining_quantity'])
+    stored_remaining = remaining
+
+    # highest_price (`highest_price or entry_price`)
+    base_highest = np.where(np.isnan(highest_price) | (highest_price == 0), entry_price, highest_price)
+    new_highest = np.where(is_long, np.maximum(base_highest, price), np.minimum(base_highest, price))
+
+    pnl, pnl_percent = _pnl(is_long, entry_price, price, remaining)
+
+    # 1. Trailing stop
+    long_floor = entry_price * (1 - stop_loss_percent / 100)
+    short_cap = entry_price * (1 + stop_loss_percent / 100)
+    long_stop = np.where(new_highest > entry_price,
+                         np.maximum(new_highest * (1 - TRAILING_PERCENT / 100), long_floor),
+                         long_floor)
+    short_stop = np.where(new_highest < entry_price,
+                          np.minimum(new_highest * (1 + TRAILING_PERCENT / 100), short_cap),
+                          short_cap)
+    trailing_stop = np.where(is_long, long_stop, short_stop)
+
+    # 2. Break-even
+    break_even_price = entry_price * (1 + BREAK_EVEN_COMMISSION)
+    break_even_flip = (~break_even_active
+                       & (pnl_percent >= BREAK_EVEN_TRIGGER_PERCENT)
+                       & (trailing_stop < break_even_price))
+    trailing_stop = np.where(break_even_flip, break_even_price, trailing_stop)
+
+    # 3. Cierres parciales (sobre la cantidad ORIGINAL, como calculate_partial_closes)
+    _, original_percent = _pnl(is_long, entry_price, price, quantity)
+    tp1_percent = np.minimum(TP1_PERCENT, take_profit_percent)
+    tp1 = (original_percent >= tp1_percent) & ~tp1_closed
+    tp2 = (original_percent >= take_profit_percent) & ~tp2_closed
+    tp1_quantity = quantity * TP1_FRACTION
+    tp2_quantity = quantity * TP2_FRACTION
+    tp1_price = np.where(is_long, entry_price * (1 + tp1_percent / 100), entry_price * (1 - tp1_percent / 100))
+    tp2_price = np.where(is_long, entry_price * (1 + take_profit_percent / 100),
+                         entry_price * (1 - take_profit_percent / 100))
+    tp1_pnl, _ = _pnl(is_long, entry_price, tp1_price, tp1_quantity)
+    tp2_pnl, _ = _pnl(is_long, entry_price, tp2_price, tp2_quantity)
+
+    remaining = np.where(tp1, remaining - tp1_quantity, remaining)
+    remaining = np.where(tp2, remaining - tp2_quantity, remaining)
+
+    # 4. Trailing stop tocado / posición agotada por TP1 + TP2
+    stop_hit = np.where(is_long, price <= trailing_stop, price >= trailing_stop)
+    fully_closed = ~stop_hit & (remaining <= 0)
+
+    changed = ((new_highest != highest_price)
+               | (trailing_stop != stored_trailing)
+               | break_even_flip
+               | tp1 | tp2
+               | (remaining != stored_remaining))
+
+    return {
+        'pnl': pnl,
+        'highest_price': new_highest,
+        'trailing_stop': trailing_stop,
+        'break_even_flip': break_even_flip,
+        'break_even_active': break_even_active | break_even_flip,
+        'tp1': tp1,
+        'tp2': tp2,
+        'tp1_closed': tp1_closed | tp1,
+        'tp2_closed': tp2_closed | tp2,
+        'tp1_quantity': tp1_quantity,
+        'tp2_quantity': tp2_quantity,
+        'tp1_price': tp1_price,
+        'tp2_price': tp2_price,
+        'tp1_pnl': tp1_pnl,
+        'tp2_pnl': tp2_pnl,
+        'remaining_quantity': remaining,
+        'stop_hit': stop_hit,
+        'fully_closed': fully_closed,
+        'changed': changed
+    }
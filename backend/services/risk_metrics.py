@@ -0,0 +1,289 @@
+"""
+Risk Metrics
+Métricas ajustadas por riesgo (Sharpe, Sortino, Calmar, expectancy, drawdown
+móvil, tiempo bajo el agua) para muchos usuarios a la vez, para el reporte
+nocturno (risk_report.py) y GET /dashboard/risk-metrics.
+
+- Trades cerrados y velas de equity de TODOS los usuarios del lote se leen
+  con una query por tabla y quedan en arrays contiguos ordenados por usuario
+- Conteos, sumas y retornos por usuario salen de np.add.reduceat sobre esos
+  segmentos (sin loops de Python por trade ni por vela)
+- Lo que depende del orden (peak acumulado, drawdown, tiempo bajo el agua) es
+  una operación vectorizada por usuario sobre su slice
+
+Retornos por vela de la resolución pedida (1m/1h/1d de equity_rollups, o los
+snapshots crudos), anualizados con 365 días (el bot opera cripto 24/7).
+"""
+import json
+from datetime import datetime, timedelta
+from config import Config
+from migrations.add_equity_rollups import ROLLUP_RESOLUTIONS
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError as e:
+    print(f"⚠️ numpy no disponible: {str(e)}")
+    NUMPY_AVAILABLE = False
+    np = None
+
+SECONDS_PER_YEAR = 365 * 86400
+
+DEFAULT_DAYS = 90
+DEFAULT_RESOLUTION = '1h'
+DEFAULT_ROLLING_DAYS = 30
+RESOLUTIONS = ('raw',) + tuple(name for name, _, _, _ in ROLLUP_RESOLUTIONS)
+
+
+# Claves de drawdown_metrics (+ final_equity): None si el usuario no tiene equity
+DRAWDOWN_KEYS = (
+    'max_drawdown', 'current_drawdown', 'max_rolling_drawdown', 'current_rolling_drawdown',
+    'max_time_under_water_hours', 'current_time_under_water_hours', 'cagr', 'calmar',
+    'final_equity'
+)
+COUNT_KEYS = ('trades', 'periods')
+
+
+def _to_python(key, value):
+    """numpy -> JSON: NaN (sin datos o división por 0) es None"""
+    value = float(value)
+    if value != value:
+        return None
+    return int(value) if key in COUNT_KEYS else round(value, 6)
+
+
+def bar_seconds(resolution):
+    """Duración nominal de una vela (la cruda: la cadencia del snapshotter)"""
+    if resolution == 'raw':
+        return Config.EQUITY_SNAPSHOT_INTERVAL
+    for name, _, _, seconds in ROLLUP_RESOLUTIONS:
+        if name == resolution:
+            return seconds
+    raise ValueError(f"Invalid resolution: {resolution}")
+
+
+def default_resolution(days):
+    """1h si su retención cubre la ventana; si no, 1d"""
+    retention = Config.EQUITY_1H_RETENTION_DAYS
+    return DEFAULT_RESOLUTION if not retention or days <= retention else '1d'
+
+
+def _segments(row_users, user_ids):
+    """[start, end) de cada usuario en un array ordenado por user_id"""
+    return (np.searchsorted(row_users, user_ids, side='left'),
+            np.searchsorted(row_users, user_ids, side='right'))
+
+
+def _segment_sum(values, starts, ends):
+    """Suma por segmento; los segmentos vacíos dan 0"""
+    sums = np.zeros(len(starts), dtype=np.float64)
+    nonempty = ends > starts
+    if nonempty.any():
+        # Los segmentos cubren el array completo y en orden: reduceat suma
+        # de cada start no vacío hasta el siguiente
+        sums[nonempty] = np.add.reduceat(values, starts[nonempty])
+    return sums
+
+
+def _divide(numerator, denominator):
+    """numerator / denominator, NaN donde el denominador es 0"""
+    out = np.full(np.shape(numerator), np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def load_series(cursor, user_ids, since, resolution=DEFAULT_RESOLUTION):
+    """
+    Trades cerrados desde `since` y equity (close de cada vela) de todos los
+    usuarios, ordenados por usuario. Una query por tabla para todo el lote.
+    """
+    ids = json.dumps(sorted(int(user_id) for user_id in user_ids))
+    since_iso = since.isoformat()
+
+    # Tuplas en vez de sqlite3.Row: cientos de miles de filas por lote
+    row_factory, cursor.row_factory = cursor.row_factory, None
+    try:
+        cursor.execute('''
+            SELECT user_id, pnl FROM positions
+            WHERE user_id IN (SELECT value FROM json_each(?))
+            AND status = 'closed' AND pnl IS NOT NULL AND closed_at >= ?
+            ORDER BY user_id, closed_at
+        ''', (ids, since_iso))
+        trade_users, pnl = list(zip(*cursor.fetchall())) or ((), ())
+
+        if resolution == 'raw':
+            cursor.execute('''
+                SELECT user_id, timestamp, equity FROM equity_curve
+                WHERE user_id IN (SELECT value FROM json_each(?)) AND timestamp >= ?
+                ORDER BY user_id, timestamp
+            ''', (ids, since_iso))
+        else:
+            bucket_format = next(fmt for name, _, fmt, _ in ROLLUP_RESOLUTIONS if name == resolution)
+            cursor.execute('''
+                SELECT user_id, bucket, close FROM equity_rollups
+                WHERE user_id IN (SELECT value FROM json_each(?)) AND resolution = ? AND bucket >= ?
+                ORDER BY user_id, bucket
+            ''', (ids, resolution, since.strftime(bucket_format)))
+        equity_users, times, equity = list(zip(*cursor.fetchall())) or ((), (), ())
+    finally:
+        cursor.row_factory = row_factory
+
+    return {
+        'trade_users': np.array(trade_users, dtype=np.int64),
+        'pnl': np.array(pnl, dtype=np.float64),
+        'equity_users': np.array(equity_users, dtype=np.int64),
+        # ISO local sin zona: sólo se usan diferencias de tiempo
+        'times': np.array(times, dtype='datetime64[s]').astype(np.int64),
+        'equity': np.array(equity, dtype=np.float64)
+    }
+
+
+def trade_metrics(pnl, starts, ends):
+    """Expectancy y compañía por usuario (arrays de largo = usuarios)"""
+    wins = pnl > 0
+    losses = pnl < 0
+    count = (ends - starts).astype(np.float64)
+    win_count = _segment_sum(wins.astype(np.float64), starts, ends)
+    loss_count = _segment_sum(losses.astype(np.float64), starts, ends)
+    win_sum = _segment_sum(np.where(wins, pnl, 0.0), starts, ends)
+    loss_sum = _segment_sum(np.where(losses, pnl, 0.0), starts, ends)
+
+    avg_win = _divide(win_sum, win_count)
+    avg_loss = _divide(loss_sum, loss_count)
+    return {
+        'trades': count,
+        'win_rate': _divide(win_count, count),
+        # E[pnl] = win_rate * avg_win + loss_rate * avg_loss (los trades en 0 cuentan)
+        'expectancy': _divide(win_sum + loss_sum, count),
+        'avg_win': avg_win,
+        'avg_loss': avg_loss,
+        'payoff_ratio': _divide(avg_win, -avg_loss),
+        'profit_factor': _divide(win_sum, -loss_sum)
+    }
+
+
+def return_metrics(equity, starts, ends, periods_per_year, risk_free=0.0):
+    """Sharpe y Sortino sobre los retornos por vela de cada usuario"""
+    previous = np.roll(equity, 1)
+    first = np.zeros(len(equity), dtype=bool)
+    first[starts[ends > starts]] = True
+    valid = ~first & (previous > 0)
+
+    returns = np.zeros(len(equity), dtype=np.float64)
+    np.divide(equity, previous, out=returns, where=valid)
+    returns = np.where(valid, returns - 1.0, 0.0)
+    excess = np.where(valid, returns - risk_free / periods_per_year, 0.0)
+
+    n = _segment_sum(valid.astype(np.float64), starts, ends)
+    mean = _divide(_segment_sum(excess, starts, ends), n)
+    # Desvío muestral en dos pasadas: la media de cada usuario repetida sobre su segmento
+    deviation = np.where(valid, excess - np.repeat(np.nan_to_num(mean), ends - starts), 0.0)
+    variance = _divide(_segment_sum(deviation ** 2, starts, ends), n - 1)
+    variance = np.where(n > 1, variance, np.nan)
+    downside = np.sqrt(_divide(_segment_sum(np.minimum(excess, 0.0) ** 2, starts, ends), n))
+
+    annualize = np.sqrt(periods_per_year)
+    return {
+        'periods': n,
+        'mean_return': _divide(_segment_sum(returns, starts, ends), n),
+        'volatility': np.sqrt(variance) * annualize,
+        'sharpe': _divide(mean, np.sqrt(variance)) * annualize,
+        'sortino': _divide(mean, downside) * annualize
+    }
+
+
+def rolling_max(values, window):
+    """
+    Máximo de las últimas `window` posiciones (las primeras: desde el inicio).
+    O(n) por bloques de tamaño `window` (van Herk / Gil-Werman): cada ventana
+    es el sufijo de un bloque + el prefijo del siguiente.
+    """
+    n = len(values)
+    pad = (-n) % window
+    blocks = np.concatenate([values, np.full(pad, -np.inf)]).reshape(-1, window)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    out = prefix[:n].copy()
+    end = np.arange(window - 1, n)
+    out[window - 1:] = np.maximum(suffix[end - window + 1], prefix[end])
+    return out
+
+
+def drawdown_metrics(equity, times, rolling_bars):
+    """
+    Un usuario (slice ordenado por tiempo):
+    - max/current drawdown desde el peak acumulado (fracción)
+    - drawdown móvil: desde el máximo de las últimas `rolling_bars` velas
+    - tiempo bajo el agua: segundos desde el último peak, máximo y actual
+    - CAGR (para Calmar)
+    """
+    peak = np.maximum.accumulate(equity)
+    drawdown = np.where(peak > 0, 1.0 - _divide(equity, peak), 0.0)
+
+    rolling_peak = rolling_max(equity, max(1, min(rolling_bars, len(equity))))
+    rolling_drawdown = np.where(rolling_peak > 0, 1.0 - _divide(equity, rolling_peak), 0.0)
+
+    # Índice del último peak alcanzado en cada vela
+    index = np.arange(len(equity))
+    peak_index = np.maximum.accumulate(np.where(equity >= peak, index, 0))
+    under_water = times - times[peak_index]
+
+    elapsed = times[-1] - times[0]
+    cagr = np.nan
+    if elapsed > 0 and equity[0] > 0 and equity[-1] > 0:
+        cagr = (equity[-1] / equity[0]) ** (SECONDS_PER_YEAR / elapsed) - 1.0
+
+    return {
+        'max_drawdown': drawdown.max(),
+        'current_drawdown': drawdown[-1],
+        'max_rolling_drawdown': rolling_drawdown.max(),
+        'current_rolling_drawdown': rolling_drawdown[-1],
+        'max_time_under_water_hours': under_water.max() / 3600,
+        'current_time_under_water_hours': under_water[-1] / 3600,
+        'cagr': cagr,
+        'calmar': cagr / drawdown.max() if drawdown.max() > 0 else np.nan
+    }
+
+
+def compute_batch(series, user_ids, resolution=DEFAULT_RESOLUTION,
+                  rolling_days=DEFAULT_ROLLING_DAYS, risk_free=0.0):
+    """Métricas de cada usuario de `user_ids` a partir de load_series. Returns: lista de dicts"""
+    user_ids = np.array(sorted({int(user_id) for user_id in user_ids}), dtype=np.int64)
+    seconds = bar_seconds(resolution)
+    periods_per_year = SECONDS_PER_YEAR / seconds
+    rolling_bars = max(1, int(rolling_days * 86400 / seconds))
+
+    trade_starts, trade_ends = _segments(series['trade_users'], user_ids)
+    trades = trade_metrics(series['pnl'], trade_starts, trade_ends)
+
+    equity_starts, equity_ends = _segments(series['equity_users'], user_ids)
+    returns = return_metrics(series['equity'], equity_starts, equity_ends, periods_per_year, risk_free)
+
+    report = []
+    for i, user_id in enumerate(user_ids):
+        metrics = {key: values[i] for key, values in trades.items()}
+        metrics.update({key: values[i] for key, values in returns.items()})
+
+        start, end = equity_starts[i], equity_ends[i]
+        if end > start:
+            metrics.update(drawdown_metrics(series['equity'][start:end], series['times'][start:end], rolling_bars))
+            metrics['final_equity'] = series['equity'][end - 1]
+        else:
+            metrics.update(dict.fromkeys(DRAWDOWN_KEYS, np.nan))
+
+        report.append({'user_id': int(user_id), **{
+            key: _to_python(key, value) for key, value in metrics.items()
+        }})
+    return report
+
+
+def compute_risk_report(cursor, user_ids, days=DEFAULT_DAYS, resolution=None,
+                        rolling_days=DEFAULT_ROLLING_DAYS, risk_free=0.0, now=None):
+    """Carga + métricas de un lote de usuarios para los últimos `days` días"""
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("numpy no disponible")
+    resolution = resolution or default_resolution(days)
+    since = (now or datetime.now()) - timedelta(days=days)
+    series = load_series(cursor, user_ids, since, resolution)
+    return compute_batch(series, user_ids, resolution, rolling_days, risk_free)
@@ -0,0 +1,74 @@
+"""
+Signal Fan-out
+Abre la posición de una señal para TODOS los bots demo activos con un solo
+INSERT ... SELECT desde bot_config, en vez de un INSERT + UPDATE de stats
+por usuario.
+
+Un INSERT ... SELECT asigna ids consecutivos, así que las posiciones nuevas
+quedan identificadas por el rango (first_id, last_id) para los pasos
+siguientes (slippage, stats) sin volver a leerlas.
+"""
+from services.position_repricer import UPDATE_FROM_SUPPORTED
+
+ACTIVE_DEMO_BOTS = "is_active = 1 AND demo_mode = 1"
+ACTIVE_DEMO_USERS = f"SELECT user_id FROM bot_config WHERE {ACTIVE_DEMO_BOTS}"
+
+
+def has_active_demo_bots(cursor):
+    cursor.execute(f"SELECT 1 FROM bot_config WHERE {ACTIVE_DEMO_BOTS} LIMIT 1")
+    return cursor.fetchone() is not None
+
+
+def active_demo_user_ids(cursor):
+    """Usuarios cuyas posiciones maneja el webhook de demo (reprice, SL/TP)"""
+    cursor.execute(ACTIVE_DEMO_USERS)
+    return {row[0] for row in cursor.fetchall()}
+
+
+def open_positions_for_signal(cursor, ticker, side, price):
+    """
+    Una posición por bot demo activo: quantity = max_position_size / price (2 decimales)
+    Returns: (first_id, last_id) de las posiciones creadas, o None si no hubo ninguna
+    """
+    cursor.execute(f'''
+        INSERT INTO positions (
+            user_id, symbol, side, quantity, entry_price,
+            current_price, pnl, status
+        )
+        SELECT user_id, ?, ?, ROUND(max_position_size / ?, 2), ?, ?, 0.0, 'open'
+        FROM bot_config
+        WHERE {ACTIVE_DEMO_BOTS}
+        ORDER BY user_id
+    ''', (ticker, side, price, price, price))
+
+    opened = cursor.rowcount
+    if opened <= 0:
+        return None
+    last_id = cursor.lastrowid
+    return last_id - opened + 1, last_id
+
+
+def count_opened_trades(cursor, first_id, last_id):
+    """total_trades += posiciones nuevas de cada usuario, en un solo UPDATE"""
+    if UPDATE_FROM_SUPPORTED:
+        cursor.execute('''
+            UPDATE trading_stats
+            SET total_trades = total_trades + opened.n
+            FROM (
+                SELECT user_id, COUNT(*) AS n
+                FROM positions
+                WHERE id BETWEEN ? AND ?
+                GROUP BY user_id
+            ) AS opened
+            WHERE trading_stats.user_id = opened.user_id
+        ''', (first_id, last_id))
+    else:
+        cursor.execute('''
+            UPDATE trading_stats
+            SET total_trades = total_trades + (
+                SELECT COUNT(*) FROM positions
+                WHERE id BETWEEN ? AND ? AND user_id = trading_stats.user_id
+            )
+            WHERE user_id IN (SELECT user_id FROM positions WHERE id BETWEEN ? AND ?)
+        ''', (first_id, last_id, first_id, last_id))
+    return cursor.rowcount
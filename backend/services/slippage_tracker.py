@@ -2,12 +2,14 @@
 Slippage Tracker Service
 Compara precio esperado (TradingView) vs precio real de ejecución
 """
-import sqlite3
+import logging
 from datetime import datetime
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
 
 class SlippageTracker:
-    def __init__(self, db_path='trading.db'):
-        self.db_path = db_path
+    def __init__(self):
         self.max_acceptable_slippage = 0.001  # 0.1% por defecto
     
     def record_slippage(self, position_id, expected_price, actual_price, ticker):
@@ -36,7 +38,7 @@ class SlippageTracker:
             # Determinar si es aceptable
             is_acceptable = abs(slippage_percent) <= (self.max_acceptable_slippage * 100)
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Guardar en base de datos
@@ -56,7 +58,7 @@ class SlippageTracker:
             warning = None
             if not is_acceptable:
                 warning = f"⚠️ SLIPPAGE ALTO: {ticker} | Esperado: ${expected_price:.2f} | Real: ${actual_price:.2f} | Dif: {slippage_percent:.3f}%"
-                print(warning)
+                logger.warning('%s', warning, extra={'sample_key': 'slippage.high'})
             
             return {
                 'success': True,
@@ -67,12 +69,41 @@ class SlippageTracker:
             }
             
         except Exception as e:
-            print(f"❌ Error registrando slippage: {str(e)}")
+            logger.error("❌ Error registrando slippage: %s", e)
             return {
                 'success': False,
                 'error': str(e)
             }
     
+    def record_slippage_batch(self, cursor, first_id, last_id, expected_price, actual_price, ticker):
+        """
+        Registra el mismo slippage para un rango de posiciones recién abiertas
+        (fan-out de una señal) con un solo INSERT ... SELECT. No hace commit.
+        
+        Returns:
+            int: registros insertados
+        """
+        slippage_dollars = actual_price - expected_price
+        slippage_percent = (slippage_dollars / expected_price) * 100 if expected_price > 0 else 0
+        is_acceptable = abs(slippage_percent) <= (self.max_acceptable_slippage * 100)
+        
+        cursor.execute("""
+            INSERT INTO slippage_records
+            (position_id, ticker, expected_price, actual_price,
+             slippage_dollars, slippage_percent, is_acceptable, recorded_at)
+            SELECT id, ?, ?, ?, ?, ?, ?, ?
+            FROM positions
+            WHERE id BETWEEN ? AND ?
+        """, (ticker, expected_price, actual_price, slippage_dollars, slippage_percent,
+              is_acceptable, datetime.now().isoformat(), first_id, last_id))
+        
+        if not is_acceptable:
+            logger.warning("⚠️ SLIPPAGE ALTO: %s | Esperado: $%.2f | Real: $%.2f | Dif: %.3f%% (%d posiciones)",
+                           ticker, expected_price, actual_price, slippage_percent, cursor.rowcount,
+                           extra={'sample_key': 'slippage.high'})
+        
+        return cursor.rowcount
+    
     def get_slippage_stats(self, ticker=None, days=7):
         """
         Obtiene estadísticas de slippage
@@ -85,7 +116,7 @@ class SlippageTracker:
             dict: Estadísticas de slippage
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             if ticker:
@@ -149,7 +180,7 @@ class SlippageTracker:
         Obtiene los últimos eventos de slippage registrados
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -0,0 +1,135 @@
+"""
+Tick Buffer
+Conflation + write-behind para los ticks del WebSocket.
+
+Cada trade de Binance sólo pisa el último precio del símbolo en memoria;
+un flusher persiste current_price/pnl de todos los símbolos pendientes en
+UNA transacción cada TICK_FLUSH_INTERVAL_MS, en vez de una transacción
+por trade.
+"""
+import time
+from threading import Thread, Lock, Event
+from datetime import datetime
+from config import Config
+from database import get_db_connection
+from services.position_repricer import reprice_symbols
+
+
+class TickBuffer:
+    def __init__(self, flush_interval_ms=None):
+        self.flush_interval = (flush_interval_ms or Config.TICK_FLUSH_INTERVAL_MS) / 1000.0
+        self.running = False
+        self.thread = None
+        self._stop_event = Event()
+        self._lock = Lock()
+        self._flush_lock = Lock()
+
+        # symbol -> (price, tick timestamp); sólo el último tick por símbolo
+        self._pending = {}
+
+        self.stats = {
+            'ticks_received': 0,
+            'ticks_conflated': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'symbols_flushed': 0,
+            'rows_written': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+            'last_flush_at': None
+        }
+
+    def put(self, symbol, price, timestamp=None):
+        """Registra un tick; si ya había uno pendiente para el símbolo, se descarta"""
+        with self._lock:
+            if symbol in self._pending:
+                self.stats['ticks_conflated'] += 1
+            self._pending[symbol] = (price, timestamp or time.time())
+            self.stats['ticks_received'] += 1
+
+    def _requeue(self, batch):
+        """Devuelve un batch fallido sin pisar ticks más nuevos"""
+        with self._lock:
+            for symbol, tick in batch.items():
+                if symbol not in self._pending:
+                    self._pending[symbol] = tick
+
+    def flush(self):
+        """Persiste los ticks pendientes en una sola transacción. Returns: filas escritas"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                conn = get_db_connection()
+                try:
+                    rows = reprice_symbols(
+                        conn.cursor(),
+                        {symbol: price for symbol, (price, _) in batch.items()},
+                        updated_at=datetime.fromtimestamp(max(ts for _, ts in batch.values())).isoformat()
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as e:
+                self._requeue(batch)
+                with self._lock:
+                    self.stats['flush_errors'] += 1
+                print(f"❌ Error en flush de ticks: {str(e)}")
+                return 0
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.stats['flushes'] += 1
+                self.stats['symbols_flushed'] += len(batch)
+                self.stats['rows_written'] += rows
+                self.stats['last_flush_ms'] = round(elapsed_ms, 3)
+                self.stats['max_flush_ms'] = round(max(self.stats['max_flush_ms'], elapsed_ms), 3)
+                self.stats['total_flush_ms'] += elapsed_ms
+                self.stats['last_flush_at'] = datetime.now().isoformat()
+
+            return rows
+
+    def flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        """Inicia el flusher write-behind"""
+        if self.running:
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self.thread = Thread(target=self.flush_loop, daemon=True)
+        self.thread.start()
+        print(f"✅ Tick buffer iniciado (flush cada {self.flush_interval * 1000:.0f} ms)")
+
+    def stop(self):
+        """Detiene el flusher y persiste lo que quede pendiente"""
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+        self.flush()
+        print("✅ Tick buffer detenido")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending_symbols'] = len(self._pending)
+        total_ms = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = round(total_ms / stats['flushes'], 3) if stats['flushes'] else 0.0
+        stats['flush_interval_ms'] = self.flush_interval * 1000
+        stats['running'] = self.running
+        return stats
+
+
+# Instancia global
+tick_buffer = TickBuffer()
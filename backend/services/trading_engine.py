@@ -2,19 +2,57 @@
 Professional Trading Engine
 Gestión avanzada de riesgo, trailing stops, break-even, cierres parciales
 """
-import sqlite3
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import json
+import logging
+from database import get_db_connection
+from services.price_cache import price_cache
+from services.position_book import position_book
+from services.risk_kernel import (
+    DEFAULT_STOP_LOSS_PERCENT, DEFAULT_TAKE_PROFIT_PERCENT, NUMPY_AVAILABLE, TP1_PERCENT,
+    evaluate_risk_batch, np
+)
+
+logger = logging.getLogger(__name__)
+
+# SL/TP configurados por el usuario (defaults del schema si faltan)
+USER_RISK_COLUMNS = f"""
+    COALESCE(NULLIF(b.stop_loss_percent, 0), {DEFAULT_STOP_LOSS_PERCENT}) AS stop_loss_percent,
+    COALESCE(NULLIF(b.take_profit_percent, 0), {DEFAULT_TAKE_PROFIT_PERCENT}) AS take_profit_percent
+"""
+
+# Columnas que necesita evaluate_risk
+RISK_COLUMNS = f"""
+    p.id, p.user_id, p.entry_price, p.quantity, p.side,
+    p.highest_price, p.trailing_stop, p.break_even_active,
+    p.tp1_closed, p.tp2_closed, p.remaining_quantity,
+    {USER_RISK_COLUMNS}
+"""
+
+# Mismas columnas en el orden de risk_kernel.COLUMNS (side -> is_long)
+RISK_KERNEL_COLUMNS = f"""
+    p.id, p.user_id, p.entry_price, p.quantity,
+    CASE WHEN LOWER(p.side) = 'buy' THEN 1 ELSE 0 END,
+    p.highest_price, p.trailing_stop, p.break_even_active,
+    p.tp1_closed, p.tp2_closed, p.remaining_quantity,
+    {USER_RISK_COLUMNS}
+"""
+
+# Sólo posiciones abiertas de usuarios con auto_close_enabled: el resto no se toca
+RISK_FROM = """
+    FROM positions p
+    JOIN bot_config b ON b.user_id = p.user_id
+    WHERE p.status = 'open' AND b.auto_close_enabled = 1
+"""
 
 class TradingEngine:
-    def __init__(self, db_path='trading_bot.db'):
-        self.db_path = db_path
+    def __init__(self):
         self.slippage_threshold = 0.001  # 0.1% máximo slippage permitido
         
     def get_connection(self):
         """Obtiene conexión a la base de datos"""
-        return sqlite3.connect(self.db_path)
+        return get_db_connection()
     
     def calculate_pnl(self, entry_price: float, current_price: float, 
                      quantity: float, side: str) -> Tuple[float, float]:
@@ -45,27 +83,31 @@ class TradingEngine:
     
     def calculate_trailing_stop(self, entry_price: float, current_price: float,
                                 highest_price: float, side: str, 
-                                trailing_percent: float = 1.0) -> float:
+                                trailing_percent: float = 1.0,
+                                stop_loss_percent: float = DEFAULT_STOP_LOSS_PERCENT) -> float:
         """
         Calcula el precio del Trailing Stop Loss
         Si el precio sube 1%, el SL sube proporcionalmente
+        Nunca queda más lejos del entry que el stop_loss_percent del usuario
         """
         if side == 'buy':
             # Para posiciones long
+            initial_stop = entry_price * (1 - stop_loss_percent / 100)
             if highest_price > entry_price:
                 # SL se mueve hacia arriba siguiendo el precio
                 trailing_stop = highest_price * (1 - trailing_percent / 100)
-                return max(trailing_stop, entry_price * 0.98)  # Mínimo 2% debajo del entry
+                return max(trailing_stop, initial_stop)
             else:
                 # Si no ha subido, usar stop loss inicial
-                return entry_price * 0.98
+                return initial_stop
         else:  # sell/short
             # Para posiciones short (inverso)
+            initial_stop = entry_price * (1 + stop_loss_percent / 100)
             if highest_price < entry_price:
                 trailing_stop = highest_price * (1 + trailing_percent / 100)
-                return min(trailing_stop, entry_price * 1.02)
+                return min(trailing_stop, initial_stop)
             else:
-                return entry_price * 1.02
+                return initial_stop
     
     def should_break_even(self, pnl_percent: float, current_stop: float,
                          entry_price: float, commission: float = 0.001) -> Optional[float]:
@@ -82,14 +124,16 @@ class TradingEngine:
         return None
     
     def calculate_partial_closes(self, entry_price: float, current_price: float,
-                                 quantity: float, side: str) -> Dict:
+                                 quantity: float, side: str,
+                                 take_profit_percent: float = DEFAULT_TAKE_PROFIT_PERCENT) -> Dict:
         """
         Calcula cierres parciales:
-        - TP1: 50% de la posición al +2%
-        - TP2: 50% restante al +5%
+        - TP1: 50% de la posición al +2% (o al TP del usuario si es menor)
+        - TP2: 50% restante al take_profit_percent del usuario
         Returns: dict con información de cierres parciales
         """
         _, pnl_percent = self.calculate_pnl(entry_price, current_price, quantity, side)
+        tp1_percent = min(TP1_PERCENT, take_profit_percent)
         
         result = {
             'tp1_triggered': False,
@@ -101,199 +145,455 @@ class TradingEngine:
         }
         
         if side == 'buy':
-            result['tp1_price'] = entry_price * 1.02  # +2%
-            result['tp2_price'] = entry_price * 1.05  # +5%
+            result['tp1_price'] = entry_price * (1 + tp1_percent / 100)
+            result['tp2_price'] = entry_price * (1 + take_profit_percent / 100)
         else:  # short
-            result['tp1_price'] = entry_price * 0.98  # -2%
-            result['tp2_price'] = entry_price * 0.95  # -5%
+            result['tp1_price'] = entry_price * (1 - tp1_percent / 100)
+            result['tp2_price'] = entry_price * (1 - take_profit_percent / 100)
         
-        # TP1: Cierra 50% al alcanzar 2%
-        if pnl_percent >= 2.0:
+        # TP1: Cierra 50% al alcanzar tp1_percent
+        if pnl_percent >= tp1_percent:
             result['tp1_triggered'] = True
             result['tp1_quantity'] = quantity * 0.5
         
-        # TP2: Cierra el resto al alcanzar 5%
-        if pnl_percent >= 5.0:
+        # TP2: Cierra el resto al alcanzar el TP del usuario
+        if pnl_percent >= take_profit_percent:
             result['tp2_triggered'] = True
             result['tp2_quantity'] = quantity * 0.5
         
         return result
     
-    def update_position_risk_management(self, position_id: int, current_price: float):
+    def get_price(self, symbol: str) -> Optional[float]:
+        """Precio fresco del price cache compartido (None si no hay o está stale)"""
+        return price_cache.get_price(symbol)
+    
+    def evaluate_risk(self, position, current_price: float) -> Dict:
         """
-        Actualiza una posición con toda la lógica de risk management avanzado
+        Lógica de risk management de una posición, sin tocar la base de datos
         - Trailing Stop Loss
         - Break-Even Protection
         - Cierres Parciales
+        position: fila con las columnas de RISK_COLUMNS
+        Returns: nuevo estado de la posición + cierres parciales + si tocó el stop
+        """
+        entry_price = position['entry_price']
+        original_quantity = position['quantity']
+        side = (position['side'] or '').lower()
+        highest_price = position['highest_price']
+        trailing_stop = position['trailing_stop']
+        break_even_active = bool(position['break_even_active'])
+        tp1_closed = bool(position['tp1_closed'])
+        tp2_closed = bool(position['tp2_closed'])
+        
+        # Si no hay remaining_quantity, usar original
+        remaining_quantity = position['remaining_quantity']
+        if remaining_quantity is None:
+            remaining_quantity = original_quantity
+        stored_remaining = remaining_quantity
+        
+        # Actualizar highest_price (para trailing stop)
+        if side == 'buy':
+            new_highest = max(highest_price or entry_price, current_price)
+        else:
+            new_highest = min(highest_price or entry_price, current_price)
+        
+        # Calcular P&L actual
+        pnl_dollars, pnl_percent = self.calculate_pnl(
+            entry_price, current_price, remaining_quantity, side
+        )
+        
+        # 1. TRAILING STOP LOSS
+        new_trailing_stop = self.calculate_trailing_stop(
+            entry_price, current_price, new_highest, side, trailing_percent=1.0,
+            stop_loss_percent=position['stop_loss_percent']
+        )
+        
+        # 2. BREAK-EVEN PROTECTION
+        new_break_even_active = break_even_active
+        if not break_even_active:
+            new_break_even = self.should_break_even(
+                pnl_percent, new_trailing_stop, entry_price
+            )
+            if new_break_even:
+                new_trailing_stop = new_break_even
+                new_break_even_active = True
+                logger.info("🛡️ Break-Even activado para posición %d @ %.2f", position['id'], new_break_even,
+                            extra={'sample_key': 'risk.break_even'})
+        
+        # 3. CIERRES PARCIALES: (quantity, price, reason, pnl)
+        partial_closes = []
+        partials = self.calculate_partial_closes(
+            entry_price, current_price, original_quantity, side,
+            take_profit_percent=position['take_profit_percent']
+        )
+        
+        for level in ('tp1', 'tp2'):
+            already_closed = tp1_closed if level == 'tp1' else tp2_closed
+            if partials[f'{level}_triggered'] and not already_closed:
+                quantity = partials[f'{level}_quantity']
+                price = partials[f'{level}_price']
+                partial_pnl, _ = self.calculate_pnl(entry_price, price, quantity, side)
+                partial_closes.append((quantity, price, level.upper(), partial_pnl))
+                remaining_quantity -= quantity
+                if level == 'tp1':
+                    tp1_closed = True
+                else:
+                    tp2_closed = True
+                logger.info("💰 %s ejecutado: %s @ %.2f", level.upper(), quantity, price,
+                            extra={'sample_key': 'risk.partial_close'})
+        
+        # 4. CHECK TRAILING STOP - CIERRE TOTAL
+        if side == 'buy':
+            stop_hit = current_price <= new_trailing_stop
+        else:
+            stop_hit = current_price >= new_trailing_stop
+        
+        close_reason = None
+        if stop_hit:
+            close_reason = 'Trailing Stop'
+        elif remaining_quantity <= 0:
+            # TP1 + TP2 cerraron el 100%
+            close_reason = 'TP2'
+        
+        changed = (
+            new_highest != highest_price
+            or new_trailing_stop != trailing_stop
+            or new_break_even_active != break_even_active
+            or partial_closes
+            or remaining_quantity != stored_remaining
+        )
+        
+        return {
+            'id': position['id'],
+            'user_id': position['user_id'],
+            'current_price': current_price,
+            'pnl': pnl_dollars,
+            'highest_price': new_highest,
+            'trailing_stop': new_trailing_stop,
+            'break_even_active': new_break_even_active,
+            'tp1_closed': tp1_closed,
+            'tp2_closed': tp2_closed,
+            'remaining_quantity': remaining_quantity,
+            'partial_closes': partial_closes,
+            'close_reason': close_reason,
+            'changed': bool(changed)
+        }
+    
+    def evaluate_symbol_vectorized(self, cursor, symbol: str, price: float) -> Tuple[int, List[Dict]]:
+        """
+        evaluate_risk para todas las posiciones del símbolo con el kernel NumPy.
+        Returns: (posiciones evaluadas, resultados sólo de las que cambiaron)
+        """
+        cursor.row_factory = None
+        cursor.execute(f"""
+            SELECT {RISK_KERNEL_COLUMNS}
+            {RISK_FROM} AND p.symbol = ?
+        """, (symbol,))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0, []
+        
+        matrix = np.array(rows, dtype=np.float64)
+        out = evaluate_risk_batch(matrix, price)
+        
+        results = []
+        for i in np.flatnonzero(out['changed'] | out['stop_hit'] | out['fully_closed']):
+            position_id = rows[i][0]
+            partial_closes = []
+            for level in ('tp1', 'tp2'):
+                if out[level][i]:
+                    partial_closes.append((float(out[f'{level}_quantity'][i]), float(out[f'{level}_price'][i]),
+                                           level.upper(), float(out[f'{level}_pnl'][i])))
+                    logger.info("💰 %s ejecutado: %s @ %.2f", level.upper(), partial_closes[-1][0],
+                                partial_closes[-1][1], extra={'sample_key': 'risk.partial_close'})
+            if out['break_even_flip'][i]:
+                logger.info("🛡️ Break-Even activado para posición %d @ %.2f", position_id,
+                            out['trailing_stop'][i], extra={'sample_key': 'risk.break_even'})
+            
+            close_reason = None
+            if out['stop_hit'][i]:
+                close_reason = 'Trailing Stop'
+            elif out['fully_closed'][i]:
+                close_reason = 'TP2'
+            
+            results.append({
+                'id': position_id,
+                'user_id': rows[i][1],
+                'current_price': price,
+                'pnl': float(out['pnl'][i]),
+                'highest_price': float(out['highest_price'][i]),
+                'trailing_stop': float(out['trailing_stop'][i]),
+                'break_even_active': bool(out['break_even_active'][i]),
+                'tp1_closed': bool(out['tp1_closed'][i]),
+                'tp2_closed': bool(out['tp2_closed'][i]),
+                'remaining_quantity': float(out['remaining_quantity'][i]),
+                'partial_closes': partial_closes,
+                'close_reason': close_reason,
+                'changed': bool(out['changed'][i])
+            })
+        
+        return len(rows), results
+    
+    def apply_risk_results(self, cursor, results: List[Dict]) -> Dict:
+        """
+        Persiste los resultados de evaluate_risk con escrituras por lotes.
+        Sólo escribe posiciones cuyo estado de riesgo cambió; no hace commit.
+        """
+        now = datetime.now().isoformat()
+        partial_rows = []
+        close_rows = []
+        update_rows = []
+        # user_id -> [winning_trades, losing_trades, total_profit]
+        stats = {}
+        
+        for result in results:
+            user_stats = stats.setdefault(result['user_id'], [0, 0, 0.0])
+            
+            for quantity, price, reason, partial_pnl in result['partial_closes']:
+                partial_rows.append((result['id'], quantity, price, reason, now))
+                user_stats[2] += partial_pnl
+            
+            if result['close_reason']:
+                close_rows.append((result['current_price'], result['current_price'], result['pnl'],
+                                   result['close_reason'], max(result['remaining_quantity'], 0),
+                                   result['tp1_closed'], result['tp2_closed'], now, now, result['id']))
+                if result['pnl'] > 0:
+                    user_stats[0] += 1
+                else:
+                    user_stats[1] += 1
+                user_stats[2] += result['pnl']
+            elif result['changed']:
+                update_rows.append((result['current_price'], result['pnl'], result['highest_price'],
+                                    result['trailing_stop'], result['break_even_active'],
+                                    result['tp1_closed'], result['tp2_closed'],
+                                    result['remaining_quantity'], now, result['id']))
+        
+        if partial_rows:
+            cursor.executemany("""
+                INSERT INTO partial_closes 
+                (position_id, quantity, price, reason, closed_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, partial_rows)
+        
+        if close_rows:
+            cursor.executemany("""
+                UPDATE positions 
+                SET status = 'closed',
+                    current_price = ?,
+                    exit_price = ?,
+                    pnl = ?,
+                    close_reason = ?,
+                    remaining_quantity = ?,
+                    tp1_closed = ?,
+                    tp2_closed = ?,
+                    closed_at = ?,
+                    updated_at = ?
+                WHERE id = ? AND status = 'open'
+            """, close_rows)
+        
+        if update_rows:
+            cursor.executemany("""
+                UPDATE positions 
+                SET current_price = ?,
+                    pnl = ?,
+                    highest_price = ?,
+                    trailing_stop = ?,
+                    break_even_active = ?,
+                    tp1_closed = ?,
+                    tp2_closed = ?,
+                    remaining_quantity = ?,
+                    updated_at = ?
+                WHERE id = ?
+            """, update_rows)
+        
+        stats_rows = [
+            (wins, losses, profit, user_id)
+            for user_id, (wins, losses, profit) in stats.items()
+            if wins or losses or profit
+        ]
+        if stats_rows:
+            cursor.executemany("""
+                UPDATE trading_stats 
+                SET winning_trades = winning_trades + ?,
+                    losing_trades = losing_trades + ?,
+                    total_profit = total_profit + ?
+                WHERE user_id = ?
+            """, stats_rows)
+        
+        return {
+            'positions': len(results),
+            'updated': len(update_rows),
+            'partial_closes': len(partial_rows),
+            'closed': len(close_rows)
+        }
+    
+    def sync_position_book(self, results: List[Dict]):
+        """Refleja en el position book los stops/cierres ya persistidos"""
+        for result in results:
+            if result['close_reason']:
+                position_book.remove(result['id'])
+            elif result['changed']:
+                position_book.update_stop(result['id'], result['trailing_stop'],
+                                          quantity=result['remaining_quantity'])
+    
+    def release_closed_positions(self, closed: List[Dict]):
+        """
+        Saca del position book las posiciones de close_triggered_positions.
+        Llamar sólo DESPUÉS del commit: si la transacción se revierte siguen
+        abiertas en SQLite y tienen que seguir protegidas por su SL/TP
+        """
+        for position in closed:
+            position_book.remove(position['id'])
+    
+    def update_position_risk_management(self, position_id: int, current_price: Optional[float] = None):
+        """
+        Actualiza una posición con toda la lógica de risk management avanzado
+        Sin current_price se usa el precio fresco del price cache
         """
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
             # Obtener posición actual
-            cursor.execute("""
-                SELECT entry_price, current_price, quantity, side, 
-                       highest_price, trailing_stop, break_even_active,
-                       tp1_closed, tp2_closed, remaining_quantity
-                FROM positions 
-                WHERE id = ? AND status = 'open'
+            cursor.execute(f"""
+                SELECT p.symbol, {RISK_COLUMNS}
+                {RISK_FROM} AND p.id = ?
             """, (position_id,))
             
             position = cursor.fetchone()
             if not position:
                 return
             
-            (entry_price, old_current_price, original_quantity, side,
-             highest_price, trailing_stop, break_even_active,
-             tp1_closed, tp2_closed, remaining_quantity) = position
-            
-            # Si no hay remaining_quantity, usar original
-            if remaining_quantity is None:
-                remaining_quantity = original_quantity
-            
-            # Actualizar highest_price (para trailing stop)
-            if side == 'buy':
-                new_highest = max(highest_price or entry_price, current_price)
-            else:
-                new_highest = min(highest_price or entry_price, current_price)
-            
-            # Calcular P&L actual
-            pnl_dollars, pnl_percent = self.calculate_pnl(
-                entry_price, current_price, remaining_quantity, side
-            )
-            
-            # 1. TRAILING STOP LOSS
-            new_trailing_stop = self.calculate_trailing_stop(
-                entry_price, current_price, new_highest, side, trailing_percent=1.0
-            )
-            
-            # 2. BREAK-EVEN PROTECTION
-            new_break_even = None
-            if not break_even_active:
-                new_break_even = self.should_break_even(
-                    pnl_percent, new_trailing_stop, entry_price
-                )
-                if new_break_even:
-                    new_trailing_stop = new_break_even
-                    break_even_active = True
-                    print(f"🛡️ Break-Even activado para posición {position_id} @ ${new_break_even:.2f}")
+            if current_price is None:
+                current_price = self.get_price(position['symbol'])
+                if current_price is None:
+                    return
             
-            # 3. CIERRES PARCIALES
-            partials = self.calculate_partial_closes(
-                entry_price, current_price, original_quantity, side
-            )
+            result = self.evaluate_risk(position, current_price)
+            self.apply_risk_results(cursor, [result])
+            conn.commit()
+            self.sync_position_book([result])
             
-            # Ejecutar TP1 si no se ha cerrado
-            if partials['tp1_triggered'] and not tp1_closed:
-                self.execute_partial_close(
-                    position_id, partials['tp1_quantity'], 
-                    partials['tp1_price'], "TP1", cursor
-                )
-                remaining_quantity -= partials['tp1_quantity']
-                tp1_closed = True
-                print(f"💰 TP1 ejecutado: {partials['tp1_quantity']} @ ${partials['tp1_price']:.2f}")
+            if result['close_reason']:
+                logger.info("🔴 %s ejecutado @ %.2f | P&L: %.2f", result['close_reason'], current_price, result['pnl'])
             
-            # Ejecutar TP2 si no se ha cerrado
-            if partials['tp2_triggered'] and not tp2_closed:
-                self.execute_partial_close(
-                    position_id, partials['tp2_quantity'],
-                    partials['tp2_price'], "TP2", cursor
-                )
-                remaining_quantity -= partials['tp2_quantity']
-                tp2_closed = True
-                print(f"💰 TP2 ejecutado: {partials['tp2_quantity']} @ ${partials['tp2_price']:.2f}")
+        except Exception as e:
+            logger.error("❌ Error en risk management: %s", e)
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    def update_symbol_risk(self, symbol: str, price: float) -> Dict:
+        """
+        Pasada de riesgo de las posiciones abiertas de un símbolo en una transacción:
+        SL/TP del position book + trailing stop, break-even y cierres parciales.
+        Sólo usuarios con auto_close_enabled, con su propio SL/TP
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
             
-            # 4. CHECK TRAILING STOP - CIERRE TOTAL
-            stop_hit = False
-            if side == 'buy' and current_price <= new_trailing_stop:
-                stop_hit = True
-            elif side == 'sell' and current_price >= new_trailing_stop:
-                stop_hit = True
+            # Posiciones nuevas (webhook queue) / resync si toca: barato si no está vencido.
+            # PriceMonitor no sincroniza los símbolos que sólo llegan por WebSocket
+            position_book.sync(cursor)
+            closed = self.close_triggered_positions(cursor, symbol, price)
             
-            if stop_hit:
-                self.close_position_by_trailing_stop(
-                    position_id, current_price, pnl_dollars, cursor
-                )
-                print(f"🔴 Trailing Stop ejecutado @ ${current_price:.2f} | P&L: ${pnl_dollars:.2f}")
+            if NUMPY_AVAILABLE:
+                positions, results = self.evaluate_symbol_vectorized(cursor, symbol, price)
             else:
-                # Actualizar posición con nuevos valores
-                cursor.execute("""
-                    UPDATE positions 
-                    SET current_price = ?,
-                        pnl = ?,
-                        highest_price = ?,
-                        trailing_stop = ?,
-                        break_even_active = ?,
-                        tp1_closed = ?,
-                        tp2_closed = ?,
-                        remaining_quantity = ?,
-                        updated_at = ?
-                    WHERE id = ?
-                """, (current_price, pnl_dollars, new_highest, new_trailing_stop,
-                      break_even_active, tp1_closed, tp2_closed, remaining_quantity,
-                      datetime.now().isoformat(), position_id))
+                cursor.execute(f"""
+                    SELECT {RISK_COLUMNS}
+                    {RISK_FROM} AND p.symbol = ?
+                """, (symbol,))
+                rows = cursor.fetchall()
+                positions = len(rows)
+                results = [self.evaluate_risk(position, price) for position in rows]
             
+            summary = self.apply_risk_results(cursor, results)
+            summary['positions'] = positions
             conn.commit()
-            
-        except Exception as e:
-            print(f"❌ Error en risk management: {str(e)}")
+        except Exception:
             conn.rollback()
+            raise
         finally:
             conn.close()
-    
-    def execute_partial_close(self, position_id: int, quantity: float,
-                              price: float, reason: str, cursor):
-        """Ejecuta un cierre parcial y registra en logs"""
-        # Registrar en tabla de partial_closes
-        cursor.execute("""
-            INSERT INTO partial_closes 
-            (position_id, quantity, price, reason, closed_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (position_id, quantity, price, reason, datetime.now().isoformat()))
         
-        # Calcular P&L del cierre parcial
-        cursor.execute("""
-            SELECT entry_price, side FROM positions WHERE id = ?
-        """, (position_id,))
-        entry_price, side = cursor.fetchone()
+        self.release_closed_positions(closed)
+        self.sync_position_book(results)
         
-        partial_pnl, _ = self.calculate_pnl(entry_price, price, quantity, side)
+        for position in closed:
+            logger.info("🔴 %s: %s posición %d @ %.2f | P&L: %.2f", symbol, position['reason'],
+                        position['id'], price, position['pnl'], extra={'sample_key': 'risk.position_closed'})
+        for result in results:
+            if result['close_reason']:
+                logger.info("🔴 %s: %s posición %d @ %.2f | P&L: %.2f", symbol, result['close_reason'],
+                            result['id'], price, result['pnl'], extra={'sample_key': 'risk.position_closed'})
         
-        # Actualizar trading_stats
-        cursor.execute("""
-            UPDATE trading_stats 
-            SET total_profit = total_profit + ?
-            WHERE user_id = (SELECT user_id FROM positions WHERE id = ?)
-        """, (partial_pnl, position_id))
+        summary['closed'] += len(closed)
+        return summary
     
-    def close_position_by_trailing_stop(self, position_id: int, 
-                                       exit_price: float, pnl: float, cursor):
-        """Cierra una posición completamente por trailing stop"""
-        cursor.execute("""
-            UPDATE positions 
-            SET status = 'closed',
-                exit_price = ?,
-                pnl = ?,
-                close_reason = 'Trailing Stop',
-                closed_at = ?
-            WHERE id = ?
-        """, (exit_price, pnl, datetime.now().isoformat(), position_id))
-        
-        # Actualizar estadísticas
-        if pnl > 0:
-            cursor.execute("""
-                UPDATE trading_stats 
-                SET winning_trades = winning_trades + 1,
-                    total_profit = total_profit + ?
-                WHERE user_id = (SELECT user_id FROM positions WHERE id = ?)
-            """, (pnl, position_id))
-        else:
+    def close_triggered_positions(self, cursor, symbol: str, price: float,
+                                  user_ids: Optional[set] = None) -> List[Dict]:
+        """
+        Cierra las posiciones del símbolo cuyo SL/TP/Trailing Stop cruzó este precio.
+        user_ids: si se pasa, sólo posiciones de esos usuarios.
+        Consulta el position book (sólo las posiciones afectadas); no hace commit
+        ni las saca del libro: el caller llama release_closed_positions tras el commit.
+        Returns: lista de posiciones cerradas
+        """
+        closed = []
+        now = datetime.now().isoformat()
+        
+        for position, reason in position_book.check(symbol, price):
+            if user_ids is not None and position.user_id not in user_ids:
+                continue
+            pnl = position.pnl_at(price)
+            
             cursor.execute("""
-                UPDATE trading_stats 
-                SET losing_trades = losing_trades + 1,
-                    total_profit = total_profit + ?
-                WHERE user_id = (SELECT user_id FROM positions WHERE id = ?)
-            """, (pnl, position_id))
+                UPDATE positions 
+                SET status = 'closed',
+                    current_price = ?,
+                    exit_price = ?,
+                    pnl = ?,
+                    close_reason = ?,
+                    closed_at = ?,
+                    updated_at = ?
+                WHERE id = ? AND status = 'open'
+            """, (price, price, pnl, reason, now, now, position.id))
+            
+            # Ya cerrada por otro proceso: el libro estaba atrasado
+            if cursor.rowcount == 0:
+                position_book.remove(position.id)
+                continue
+            
+            if pnl > 0:
+                cursor.execute("""
+                    UPDATE trading_stats 
+                    SET winning_trades = winning_trades + 1,
+                        total_profit = total_profit + ?
+                    WHERE user_id = ?
+                """, (pnl, position.user_id))
+            else:
+                cursor.execute("""
+                    UPDATE trading_stats 
+                    SET losing_trades = losing_trades + 1,
+                        total_profit = total_profit + ?
+                    WHERE user_id = ?
+                """, (pnl, position.user_id))
+            
+            closed.append({
+                'id': position.id,
+                'user_id': position.user_id,
+                'symbol': symbol,
+                'reason': reason,
+                'exit_price': price,
+                'pnl': pnl,
+                'pnl_percent': position.pnl_percent_at(price)
+            })
+        
+        return closed
     
     def log_trade_forensics(self, position_id: int, entry_reason: str,
                            slippage: float, duration_seconds: int):
@@ -0,0 +1,324 @@
+"""
+Webhook Archiver
+Retención del journal de webhooks (tabla `webhooks`) particionado por día:
+
+- La tabla sólo guarda los últimos WEBHOOK_RETENTION_DAYS días (partición
+  caliente, indexada por received_at)
+- Cada día más viejo se exporta a un NDJSON comprimido
+  (WEBHOOK_ARCHIVE_DIR/webhooks-YYYY-MM-DD-<first_id>.ndjson.gz), se registra
+  en webhook_archives y recién entonces se borra de la tabla en lotes cortos
+  (el webhook endpoint no queda esperando el write lock)
+- Los archivos siguen siendo consultables por día (query_archive) y se
+  borran a los WEBHOOK_ARCHIVE_RETENTION_DAYS días (0 = nunca)
+
+Si el proceso muere a mitad del borrado, la próxima pasada termina de borrar
+las filas ya archivadas (id <= last_id del catálogo) antes de exportar nada,
+así ninguna fila queda en dos archivos.
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from threading import Thread, Event, Lock
+from config import Config
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookArchiver:
+    def __init__(self, retention_days=None, archive_dir=None, interval=None):
+        self.retention_days = retention_days or Config.WEBHOOK_RETENTION_DAYS
+        self.archive_dir = archive_dir or Config.WEBHOOK_ARCHIVE_DIR
+        self.archive_retention_days = Config.WEBHOOK_ARCHIVE_RETENTION_DAYS
+        self.interval = interval or Config.WEBHOOK_ARCHIVE_INTERVAL  # seconds
+        self.delete_batch = Config.WEBHOOK_ARCHIVE_DELETE_BATCH
+        self.running = False
+        self.thread = None
+        self._stop_event = Event()
+        self._run_lock = Lock()
+        self.stats = {
+            'runs': 0,
+            'days_archived': 0,
+            'rows_archived': 0,
+            'bytes_written': 0,
+            'archives_expired': 0,
+            'last_run_at': None,
+            'last_run_ms': 0.0,
+            'last_error': None
+        }
+
+    # ------------------------------------------------------------------
+    # Archivado
+    # ------------------------------------------------------------------
+
+    def _cutoff(self, cursor, days):
+        """Primer día que se conserva (misma zona horaria que received_at)"""
+        cursor.execute("SELECT date('now', 'localtime', ?)", (f'-{int(days)} days',))
+        return cursor.fetchone()[0]
+
+    def _purge_rows(self, day, next_day, last_id):
+        """Borra en lotes las filas del día ya archivadas (id <= last_id). Returns: filas borradas"""
+        deleted = 0
+        while True:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    DELETE FROM webhooks WHERE id IN (
+                        SELECT id FROM webhooks
+                        WHERE received_at >= ? AND received_at < ? AND id <= ?
+                        LIMIT ?
+                    )
+                ''', (day, next_day, last_id, self.delete_batch))
+                batch = cursor.rowcount
+                conn.commit()
+            finally:
+                conn.close()
+            deleted += batch
+            if batch < self.delete_batch:
+                return deleted
+
+    def _export(self, day, next_day):
+        """Escribe las filas del día a un .ndjson.gz. Returns: (path, rows, first_id, last_id, bytes) o None"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, payload, received_at FROM webhooks
+                WHERE received_at >= ? AND received_at < ?
+                ORDER BY received_at, id
+            ''', (day, next_day))
+
+            first = cursor.fetchone()
+            if first is None:
+                return None
+
+            path = os.path.join(self.archive_dir, f"webhooks-{day}-{first['id']}.ndjson.gz")
+            tmp_path = path + '.tmp'
+            rows, last_id = 0, first['id']
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+                row = first
+                while row is not None:
+                    archive.write(json.dumps({
+                        'id': row['id'],
+                        'payload': row['payload'],
+                        'received_at': row['received_at']
+                    }) + '\n')
+                    rows += 1
+                    last_id = max(last_id, row['id'])
+                    row = cursor.fetchone()
+        finally:
+            conn.close()
+
+        # Archivo completo o nada
+        os.replace(tmp_path, path)
+        return path, rows, first['id'], last_id, os.path.getsize(path)
+
+    def archive_day(self, day):
+        """Archiva un día completo y lo borra de la tabla. Returns: filas archivadas"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT date(?, '+1 day')", (day,))
+            next_day = cursor.fetchone()[0]
+            cursor.execute('SELECT MAX(last_id) FROM webhook_archives WHERE day = ?', (day,))
+            archived_up_to = cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+        # Borrado interrumpido en una pasada anterior
+        if archived_up_to is not None:
+            self._purge_rows(day, next_day, archived_up_to)
+
+        exported = self._export(day, next_day)
+        if exported is None:
+            return 0
+        path, rows, first_id, last_id, size = exported
+
+        conn = get_db_connection()
+        try:
+            conn.execute('''
+                INSERT INTO webhook_archives (day, path, rows, first_id, last_id, bytes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (day, path, rows, first_id, last_id, size))
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._purge_rows(day, next_day, last_id)
+
+        self.stats['days_archived'] += 1
+        self.stats['rows_archived'] += rows
+        self.stats['bytes_written'] += size
+        logger.info("🗄️ Webhooks del %s archivados", day,
+                    extra={'rows': rows, 'path': path, 'bytes': size})
+        return rows
+
+    def expire_archives(self):
+        """Borra archivos (y su fila de catálogo) más viejos que WEBHOOK_ARCHIVE_RETENTION_DAYS"""
+        if not self.archive_retention_days:
+            return 0
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cutoff = self._cutoff(cursor, self.archive_retention_days)
+            cursor.execute('SELECT id, path FROM webhook_archives WHERE day < ?', (cutoff,))
+            expired = cursor.fetchall()
+            for archive in expired:
+                try:
+                    os.remove(archive['path'])
+                except FileNotFoundError:
+                    pass
+                cursor.execute('DELETE FROM webhook_archives WHERE id = ?', (archive['id'],))
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.stats['archives_expired'] += len(expired)
+        return len(expired)
+
+    def run_once(self):
+        """Archiva todos los días fuera de la ventana de retención, del más viejo al más nuevo"""
+        with self._run_lock:
+            start = time.perf_counter()
+            archived = 0
+            try:
+                conn = get_db_connection()
+                try:
+                    cutoff = self._cutoff(conn.cursor(), self.retention_days)
+                finally:
+                    conn.close()
+
+                previous_day = None
+                while not self._stop_event.is_set():
+                    # MIN(received_at) sale del índice: O(1)
+                    conn = get_db_connection()
+                    try:
+                        oldest = conn.execute('SELECT MIN(received_at) FROM webhooks').fetchone()[0]
+                    finally:
+                        conn.close()
+                    if oldest is None or oldest[:10] >= cutoff:
+                        break
+                    if oldest[:10] == previous_day:
+                        break  # received_at con formato inesperado: no iterar para siempre
+                    previous_day = oldest[:10]
+                    archived += self.archive_day(previous_day)
+
+                self.expire_archives()
+                self.stats['last_error'] = None
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                logger.error("❌ Error archivando webhooks: %s", e)
+
+            self.stats['runs'] += 1
+            self.stats['last_run_at'] = datetime.now().isoformat()
+            self.stats['last_run_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            return archived
+
+    # ------------------------------------------------------------------
+    # Consultas sobre archivos
+    # ------------------------------------------------------------------
+
+    def list_archives(self):
+        conn = get_db_connection()
+        try:
+            rows = conn.execute('''
+                SELECT day, path, rows, first_id, last_id, bytes, created_at
+                FROM webhook_archives
+                ORDER BY day DESC, id DESC
+            ''').fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def query_archive(self, day, limit=50, ticker=None):
+        """
+        Webhooks archivados de un día, más nuevos primero.
+        Lee los archivos en streaming; memoria O(limit).
+        """
+        conn = get_db_connection()
+        try:
+            paths = [row['path'] for row in conn.execute(
+                'SELECT path FROM webhook_archives WHERE day = ? ORDER BY first_id', (day,)
+            ).fetchall()]
+        finally:
+            conn.close()
+
+        ticker = ticker.upper() if ticker else None
+        newest = deque(maxlen=limit)
+        for path in paths:
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                for line in archive:
+                    entry = json.loads(line)
+                    if ticker:
+                        try:
+                            payload = json.loads(entry['payload'])
+                        except ValueError:
+                            continue
+                        if not isinstance(payload, dict) or str(payload.get('ticker', '')).upper() != ticker:
+                            continue
+                    newest.append(entry)
+        return list(reversed(newest))
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def archive_loop(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """Inicia el archivado periódico"""
+        if self.running:
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self.thread = Thread(target=self.archive_loop, name='webhook-archiver', daemon=True)
+        self.thread.start()
+        logger.info("✅ Webhook archiver iniciado (retención %d días, cada %d s)",
+                    self.retention_days, self.interval)
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=30)
+            self.thread = None
+        logger.info("✅ Webhook archiver detenido")
+
+    def get_stats(self):
+        conn = get_db_connection()
+        try:
+            oldest = conn.execute('SELECT MIN(received_at) FROM webhooks').fetchone()[0]
+            archives = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM(bytes), 0) FROM webhook_archives'
+            ).fetchone()
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        finally:
+            conn.close()
+
+        return {
+            **self.stats,
+            'running': self.running,
+            'retention_days': self.retention_days,
+            'archive_retention_days': self.archive_retention_days,
+            'archive_dir': self.archive_dir,
+            'oldest_hot_webhook': oldest,
+            'archive_files': archives[0],
+            'archived_rows_total': archives[1],
+            'archived_bytes_total': archives[2],
+            'free_pages': free_pages  # reutilizadas por los INSERT nuevos
+        }
+
+
+# Instancia global
+webhook_archiver = WebhookArchiver()
@@ -0,0 +1,383 @@
+"""
+Webhook Queue
+Desacopla el ACK HTTP del webhook de TradingView del procesamiento del trade.
+
+- El endpoint valida, inserta en webhook_queue (misma transacción que el log
+  en webhooks) y responde 200: no espera a SQLite más allá de ese INSERT
+- Un dispatcher en el proceso líder reclama lotes pendientes en orden de id
+  y los reparte por hash(ticker) entre WEBHOOK_QUEUE_WORKERS workers: cada
+  ticker cae siempre en la misma cola FIFO -> orden estricto por ticker,
+  tickers distintos en paralelo
+- Errores transitorios de SQLite (lock, busy, timeout del pool) se reintentan
+  en el mismo worker con backoff exponencial, así el orden por ticker se
+  mantiene; 'failed' queda para errores no reintentables o sin más intentos
+- Al arrancar, los jobs que quedaron en 'processing' (líder caído) vuelven a
+  'pending' en su orden original
+"""
+import json
+import logging
+import sqlite3
+import time
+import zlib
+from collections import deque
+from queue import Queue
+from threading import Thread, Lock, Event
+from config import Config
+from database import get_db_connection, connection_scope
+from services.idempotency import idempotency_index
+
+logger = logging.getLogger(__name__)
+
+# Ventana de latencias para los percentiles de get_stats
+LATENCY_WINDOW = 1000
+PURGE_INTERVAL = 600  # seconds
+RETRY_MAX_DELAY = 5.0  # seconds
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return round(values[index], 3)
+
+
+class WebhookQueue:
+    def __init__(self, workers=None, poll_interval_ms=None, batch_size=None):
+        self.workers = workers or Config.WEBHOOK_QUEUE_WORKERS
+        self.poll_interval = (poll_interval_ms or Config.WEBHOOK_QUEUE_POLL_MS) / 1000.0
+        self.batch_size = batch_size or Config.WEBHOOK_QUEUE_BATCH
+        self.retention_hours = Config.WEBHOOK_QUEUE_RETENTION_HOURS
+        self.max_attempts = max(1, Config.WEBHOOK_QUEUE_MAX_ATTEMPTS)
+        self.retry_base = Config.WEBHOOK_QUEUE_RETRY_BASE_MS / 1000.0
+        self.running = False
+        self.thread = None
+        self._worker_queues = []
+        self._worker_threads = []
+        self._wakeup = Event()
+        self._stop_event = Event()
+        self._lock = Lock()
+        self._last_purge = 0.0
+
+        # (espera en cola ms, enqueue -> fin ms) de los últimos jobs
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+        self.stats = {
+            'enqueued': 0,
+            'claimed': 0,
+            'processed': 0,
+            'failed': 0,
+            'retried': 0,
+            'recovered': 0,
+            'purged': 0,
+            'last_error': None
+        }
+
+    # ------------------------------------------------------------------
+    # Productor (endpoint HTTP, cualquier worker de gunicorn)
+    # ------------------------------------------------------------------
+
+    def enqueue(self, cursor, webhook_id, ticker, payload):
+        """Inserta un job en la transacción del caller. Returns: id del job"""
+        cursor.execute('''
+            INSERT INTO webhook_queue (webhook_id, ticker, payload, enqueued_at)
+            VALUES (?, ?, ?, ?)
+        ''', (webhook_id, ticker, json.dumps(payload), time.time()))
+        with self._lock:
+            self.stats['enqueued'] += 1
+        return cursor.lastrowid
+
+    def notify(self):
+        """Despierta al dispatcher si corre en este proceso (si no, lo verá en el próximo poll)"""
+        self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Dispatcher (proceso líder)
+    # ------------------------------------------------------------------
+
+    def worker_for(self, ticker):
+        """Hash estable: el mismo ticker siempre va al mismo worker"""
+        return zlib.crc32(ticker.encode('utf-8')) % self.workers
+
+    def recover(self):
+        """Jobs reclamados por un líder anterior que murió antes de terminarlos"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE webhook_queue SET status = 'pending' WHERE status = 'processing'")
+            recovered = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.stats['recovered'] += recovered
+        if recovered:
+            logger.warning("♻️ Webhook queue: %d jobs recuperados tras reinicio", recovered)
+        return recovered
+
+    def claim(self, limit):
+        """Marca como 'processing' los siguientes jobs pendientes (orden de id)"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT id, ticker, payload, enqueued_at
+                FROM webhook_queue
+                WHERE status = 'pending'
+                ORDER BY id
+                LIMIT ?
+            ''', (limit,))
+            jobs = [tuple(row) for row in cursor.fetchall()]
+            if jobs:
+                # Dentro de la transacción los pendientes entre el primer y el
+                # último id son exactamente los seleccionados
+                cursor.execute('''
+                    UPDATE webhook_queue
+                    SET status = 'processing', attempts = attempts + 1
+                    WHERE status = 'pending' AND id BETWEEN ? AND ?
+                ''', (jobs[0][0], jobs[-1][0]))
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.stats['claimed'] += len(jobs)
+        return jobs
+
+    def purge(self):
+        """
+        Borra jobs terminados más viejos que WEBHOOK_QUEUE_RETENTION_HOURS
+        y las claves de idempotencia vencidas
+        """
+        cutoff = time.time() - self.retention_hours * 3600
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM webhook_queue
+                WHERE status = 'done' AND enqueued_at < ?
+            ''', (cutoff,))
+            purged = cursor.rowcount
+            idempotency_index.purge(cursor)
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self.stats['purged'] += purged
+        return purged
+
+    def in_memory_backlog(self):
+        return sum(q.qsize() for q in self._worker_queues)
+
+    def dispatch_loop(self):
+        while not self._stop_event.is_set():
+            self._wakeup.clear()
+            jobs = []
+            room = 0
+            try:
+                # Backpressure: no reclamar más de un lote por delante de los workers
+                room = self.batch_size - self.in_memory_backlog()
+                if room > 0:
+                    jobs = self.claim(room)
+                    for job in jobs:
+                        self._worker_queues[self.worker_for(job[1])].put(job)
+
+                if time.monotonic() - self._last_purge >= PURGE_INTERVAL:
+                    self._last_purge = time.monotonic()
+                    self.purge()
+            except Exception as e:
+                logger.error("❌ Error en webhook dispatcher: %s", e)
+
+            if not jobs:
+                self._wakeup.wait(self.poll_interval)
+            elif room - len(jobs) <= 0:
+                # Workers con trabajo suficiente: esperar un poco antes de reclamar más
+                self._stop_event.wait(self.poll_interval)
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def worker_loop(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            try:
+                self.process(job)
+            except Exception as e:
+                # Un error aquí no puede matar el worker: los tickers de esta cola se
+                # quedarían parados. El job sigue en 'processing' y recover() lo
+                # devuelve a 'pending' en el próximo arranque
+                logger.error("❌ Error en webhook worker (job #%s): %s", job[0], e)
+
+    def execute(self, job_id, payload, started_at):
+        """Un intento: el estado del job se commitea junto con el trade"""
+        # Import diferido: routes.webhook importa este módulo
+        from routes.webhook import process_demo_trade
+
+        with connection_scope():
+            # process_demo_trade, cooldown_manager y slippage_tracker comparten
+            # esta conexión (y su transacción) como en un request de Flask
+            conn = None
+            try:
+                conn = get_db_connection()
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('''
+                    UPDATE webhook_queue SET status = 'done', started_at = ?
+                    WHERE id = ?
+                ''', (started_at, job_id))
+                process_demo_trade(json.loads(payload))
+                conn.execute('UPDATE webhook_queue SET finished_at = ? WHERE id = ?',
+                             (time.time(), job_id))
+                conn.commit()
+            except Exception:
+                if conn is not None:
+                    conn.rollback()
+                raise
+
+    def mark(self, job_id, sql, params):
+        """Actualiza el job fuera de la transacción del trade (ya revertida)"""
+        try:
+            conn = get_db_connection()
+            try:
+                conn.execute(sql, params)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error("❌ Error marcando webhook job #%d: %s", job_id, e)
+
+    def process(self, job):
+        """Ejecuta un job, reintentando los errores transitorios de SQLite"""
+        job_id, ticker, payload, enqueued_at = job
+        started_at = time.time()
+        error = None
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.execute(job_id, payload, started_at)
+                error = None
+                break
+            except sqlite3.OperationalError as e:
+                # database is locked / busy / PoolTimeoutError: reintentar aquí
+                # mismo bloquea sólo a los tickers de este worker y conserva el orden
+                error = str(e)
+                if attempt == self.max_attempts:
+                    break
+                delay = min(self.retry_base * 2 ** (attempt - 1), RETRY_MAX_DELAY)
+                logger.warning("⏳ Webhook job #%d (%s) intento %d/%d: %s; reintento en %.0f ms",
+                               job_id, ticker, attempt, self.max_attempts, error, delay * 1000)
+                self.mark(job_id, 'UPDATE webhook_queue SET attempts = attempts + 1, error = ? WHERE id = ?',
+                          (error, job_id))
+                with self._lock:
+                    self.stats['retried'] += 1
+                time.sleep(delay)
+            except Exception as e:
+                error = str(e)
+                break
+
+        if error:
+            logger.error("❌ Error procesando webhook job #%d (%s): %s", job_id, ticker, error)
+            self.mark(job_id, '''
+                UPDATE webhook_queue
+                SET status = 'failed', error = ?, started_at = ?, finished_at = ?
+                WHERE id = ?
+            ''', (error, started_at, time.time(), job_id))
+
+        finished_at = time.time()
+        with self._lock:
+            if error:
+                self.stats['failed'] += 1
+                self.stats['last_error'] = error
+            else:
+                self.stats['processed'] += 1
+            self._latencies.append(((started_at - enqueued_at) * 1000,
+                                    (finished_at - enqueued_at) * 1000))
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Recupera jobs huérfanos y arranca dispatcher + workers"""
+        if self.running:
+            return
+
+        self.recover()
+        self.running = True
+        self._stop_event.clear()
+        self._worker_queues = [Queue() for _ in range(self.workers)]
+        self._worker_threads = [
+            Thread(target=self.worker_loop, args=(q,), name=f'webhook-worker-{i}', daemon=True)
+            for i, q in enumerate(self._worker_queues)
+        ]
+        for thread in self._worker_threads:
+            thread.start()
+        self.thread = Thread(target=self.dispatch_loop, name='webhook-dispatcher', daemon=True)
+        self.thread.start()
+        logger.info("✅ Webhook queue iniciada (%d workers, poll %.0f ms)", self.workers, self.poll_interval * 1000)
+
+    def stop(self):
+        """Detiene el dispatcher y termina los jobs ya repartidos"""
+        if not self.running:
+            return
+        self.running = False
+        self._stop_event.set()
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+        for q in self._worker_queues:
+            q.put(None)
+        for thread in self._worker_threads:
+            thread.join(timeout=30)
+        self._worker_threads = []
+        logger.info("✅ Webhook queue detenida")
+
+    def get_depth(self):
+        """Jobs por estado (desde SQLite, válido en cualquier proceso)"""
+        conn = get_db_connection()
+        try:
+            rows = conn.execute('''
+                SELECT status, COUNT(*), MIN(enqueued_at)
+                FROM webhook_queue
+                WHERE status IN ('pending', 'processing', 'failed')
+                GROUP BY status
+            ''').fetchall()
+        finally:
+            conn.close()
+
+        depth = {'pending': 0, 'processing': 0, 'failed': 0, 'oldest_pending_age_ms': 0.0}
+        for status, count, oldest in rows:
+            depth[status] = count
+            if status == 'pending' and oldest:
+                depth['oldest_pending_age_ms'] = round((time.time() - oldest) * 1000, 3)
+        return depth
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = list(self._latencies)
+
+        queue_wait = [wait for wait, _ in latencies]
+        total = [end_to_end for _, end_to_end in latencies]
+        stats['latency_ms'] = {
+            'samples': len(latencies),
+            'queue_wait_p50': _percentile(queue_wait, 50),
+            'queue_wait_p95': _percentile(queue_wait, 95),
+            'queue_wait_max': round(max(queue_wait), 3) if queue_wait else 0.0,
+            'end_to_end_p50': _percentile(total, 50),
+            'end_to_end_p95': _percentile(total, 95),
+            'end_to_end_max': round(max(total), 3) if total else 0.0
+        }
+        stats['depth'] = self.get_depth()
+        stats['in_memory_backlog'] = self.in_memory_backlog()
+        stats['running'] = self.running
+        stats['workers'] = self.workers
+        return stats
+
+
+# Instancia global
+webhook_queue = WebhookQueue()
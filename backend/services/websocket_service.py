@@ -1,12 +1,21 @@
 """
 WebSocket Service para precios en tiempo real
 Conecta con Binance, Alpaca, o Twelve Data
+
+Binance: UNA conexión combined-stream (/stream?streams=a@trade/b@trade) para
+todos los tickers; las altas/bajas de posiciones se aplican con
+SUBSCRIBE/UNSUBSCRIBE sobre la misma conexión.
+Para pruebas offline: `python tools/fake_binance_ws.py` + BINANCE_WS_URL=ws://localhost:9443
 """
 import json
-import sqlite3
+import random
 import time
 from threading import Thread
 from datetime import datetime
+from config import Config
+from database import get_db_connection
+from services.price_cache import price_cache, asset_class
+from services.tick_buffer import tick_buffer
 
 # Import asyncio and websockets with error handling
 try:
@@ -19,17 +28,33 @@ except ImportError as e:
     asyncio = None
 
 class RealTimePriceService:
-    def __init__(self, db_path='trading_bot.db'):
-        self.db_path = db_path
-        self.connections = {}
-        self.last_prices = {}
+    def __init__(self, base_url=None, subscription_refresh=None,
+                 reconnect_base=None, reconnect_max=None):
+        self.base_url = (base_url or Config.BINANCE_WS_URL).rstrip('/')
+        self.subscription_refresh = subscription_refresh or Config.BINANCE_SUBSCRIPTION_REFRESH  # seconds
+        self.reconnect_base = reconnect_base or Config.BINANCE_RECONNECT_BASE  # seconds
+        self.reconnect_max = reconnect_max or Config.BINANCE_RECONNECT_MAX  # seconds
         self.running = False
         self.thread = None
         
+        # stream de Binance ('btcusdt@trade') -> ticker TradingView ('BTCUSD')
+        self.streams = {}
+        self.connected = False
+        self._request_id = 0
+        self.stats = {
+            'connects': 0,
+            'reconnects': 0,
+            'messages': 0,
+            'subscribes': 0,
+            'unsubscribes': 0,
+            'last_message_at': None,
+            'last_error': None
+        }
+        
     def get_active_tickers(self):
-        """Obtiene los tickers con posiciones abiertas"""
+        """Obtiene los tickers con posiciones abiertas (None si la consulta falla)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -42,7 +67,7 @@ class RealTimePriceService:
             return tickers
         except Exception as e:
             print(f"❌ Error obteniendo tickers: {str(e)}")
-            return []
+            return None
     
     def map_ticker_to_binance(self, ticker):
         """Mapea ticker a formato Binance"""
@@ -58,101 +83,112 @@ class RealTimePriceService:
         
         return ticker_map.get(ticker, ticker.lower().replace('USD', 'usdt'))
     
-    async def connect_binance_websocket(self, ticker):
-        """Conecta al WebSocket de Binance para un ticker"""
-        binance_ticker = self.map_ticker_to_binance(ticker)
-        uri = f"wss://stream.binance.com:9443/ws/{binance_ticker}@trade"
+    def stream_name(self, ticker):
+        return f"{self.map_ticker_to_binance(ticker)}@trade"
+    
+    def wanted_streams(self, tickers):
+        """Streams de Binance para los tickers crypto (stocks/forex no existen en Binance)"""
+        return {
+            self.stream_name(ticker): ticker
+            for ticker in tickers
+            if asset_class(ticker) == 'crypto'
+        }
+    
+    def backoff_delay(self, attempt):
+        """Backoff exponencial con jitter para no reconectar todos a la vez"""
+        cap = min(self.reconnect_max, self.reconnect_base * (2 ** attempt))
+        return cap / 2 + random.uniform(0, cap / 2)
+    
+    async def sleep_while_running(self, seconds):
+        deadline = time.monotonic() + seconds
+        while self.running and time.monotonic() < deadline:
+            await asyncio.sleep(min(0.5, deadline - time.monotonic()))
+    
+    async def send_request(self, websocket, method, streams):
+        self._request_id += 1
+        await websocket.send(json.dumps({
+            'method': method,
+            'params': streams,
+            'id': self._request_id
+        }))
+    
+    async def sync_subscriptions(self, websocket):
+        """Aplica altas/bajas de tickers sin cerrar la conexión"""
+        loop = asyncio.get_running_loop()
+        tickers = await loop.run_in_executor(None, self.get_active_tickers)
+        if tickers is None:
+            return
         
-        try:
-            async with websockets.connect(uri) as websocket:
-                print(f"🔌 Conectado a Binance WebSocket: {binance_ticker}")
-                self.update_connection_status('Binance', 'connected', 0)
-                
-                while self.running:
-                    try:
-                        message = await asyncio.wait_for(websocket.recv(), timeout=10)
-                        data = json.loads(message)
-                        
-                        # Extraer precio del mensaje
-                        price = float(data.get('p', 0))
-                        
-                        if price > 0:
-                            # Guardar última precio y color
-                            old_price = self.last_prices.get(ticker, price)
-                            color = 'green' if price > old_price else 'red' if price < old_price else 'gray'
-                            
-                            self.last_prices[ticker] = {
-                                'price': price,
-                                'color': color,
-                                'timestamp': datetime.now().isoformat()
-                            }
-                            
-                            # Actualizar en base de datos
-                            self.update_position_prices(ticker, price)
-                            
-                    except asyncio.TimeoutError:
-                        # Enviar ping para mantener conexión
-                        await websocket.ping()
-                    except Exception as e:
-                        print(f"⚠️ Error en WebSocket {ticker}: {str(e)}")
-                        self.update_connection_status('Binance', 'error', 0)
-                        break
-                        
-        except Exception as e:
-            print(f"❌ Error conectando a Binance {ticker}: {str(e)}")
-            self.update_connection_status('Binance', 'disconnected', 0)
+        wanted = self.wanted_streams(tickers)
+        to_add = sorted(set(wanted) - set(self.streams))
+        to_remove = sorted(set(self.streams) - set(wanted))
+        
+        if to_add:
+            await self.send_request(websocket, 'SUBSCRIBE', to_add)
+            self.stats['subscribes'] += len(to_add)
+            print(f"➕ Binance SUBSCRIBE: {', '.join(to_add)}")
+        if to_remove:
+            await self.send_request(websocket, 'UNSUBSCRIBE', to_remove)
+            self.stats['unsubscribes'] += len(to_remove)
+            print(f"➖ Binance UNSUBSCRIBE: {', '.join(to_remove)}")
+        
+        self.streams = wanted
     
-    def update_position_prices(self, ticker, price):
-        """Actualiza precios de posiciones en la base de datos"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Actualizar posiciones abiertas con este ticker
-            cursor.execute("""
-                UPDATE positions 
-                SET current_price = ?,
-                    updated_at = ?
-                WHERE symbol = ? AND status = 'open'
-            """, (price, datetime.now().isoformat(), ticker))
-            
-            # Obtener posiciones afectadas para calcular PnL
-            cursor.execute("""
-                SELECT id, entry_price, quantity, side, remaining_quantity
-                FROM positions 
-                WHERE symbol = ? AND status = 'open'
-            """, (ticker,))
-            
-            positions = cursor.fetchall()
+    def handle_message(self, message):
+        data = json.loads(message)
+        
+        # Respuesta a SUBSCRIBE/UNSUBSCRIBE
+        if 'stream' not in data:
+            if data.get('error'):
+                print(f"⚠️ Binance WebSocket error: {data['error']}")
+            return
+        
+        ticker = self.streams.get(data['stream'])
+        price = float(data.get('data', {}).get('p', 0))
+        
+        if ticker and price > 0:
+            self.stats['messages'] += 1
+            self.stats['last_message_at'] = datetime.now().isoformat()
             
-            for pos in positions:
-                pos_id, entry_price, quantity, side, remaining_qty = pos
-                
-                # Usar remaining_quantity si existe
-                qty = remaining_qty if remaining_qty else quantity
-                
-                # Calcular PnL
-                if side == 'buy':
-                    pnl = (price - entry_price) * qty
-                else:
-                    pnl = (entry_price - price) * qty
-                
-                cursor.execute("""
-                    UPDATE positions 
-                    SET pnl = ?
-                    WHERE id = ?
-                """, (pnl, pos_id))
+            # Publicar en el price cache compartido (el color sale del precio anterior)
+            price_cache.set(ticker, price, 'binance')
             
-            conn.commit()
-            conn.close()
+            # Persistencia write-behind: el tick buffer conflaciona y hace flush por lotes
+            tick_buffer.put(ticker, price)
+    
+    async def run_combined_stream(self, streams):
+        """Una sesión de la conexión combined-stream; vuelve cuando se cierra"""
+        uri = f"{self.base_url}/stream?streams={'/'.join(sorted(streams))}"
+        
+        async with websockets.connect(uri, ping_interval=20, ping_timeout=20, close_timeout=5) as websocket:
+            print(f"🔌 Conectado a Binance combined stream ({len(streams)} streams)")
+            self.connected = True
+            self.streams = streams
+            self.stats['connects'] += 1
+            self.update_connection_status('Binance', 'connected', 0)
             
-        except Exception as e:
-            print(f"❌ Error actualizando precios: {str(e)}")
+            next_sync = time.monotonic() + self.subscription_refresh
+            try:
+                while self.running:
+                    try:
+                        message = await asyncio.wait_for(
+                            websocket.recv(),
+                            timeout=max(0.1, next_sync - time.monotonic())
+                        )
+                        self.handle_message(message)
+                    except asyncio.TimeoutError:
+                        pass
+                    
+                    if time.monotonic() >= next_sync:
+                        await self.sync_subscriptions(websocket)
+                        next_sync = time.monotonic() + self.subscription_refresh
+            finally:
+                self.connected = False
     
     def update_connection_status(self, source, status, latency_ms):
         """Actualiza el status de conexión para el LED indicator"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -167,23 +203,39 @@ class RealTimePriceService:
             print(f"⚠️ Error actualizando connection status: {str(e)}")
     
     async def run_websocket_loop(self):
-        """Loop principal de WebSockets"""
+        """Loop principal: mantiene la conexión combined-stream y reconecta con backoff"""
+        attempt = 0
+        
         while self.running:
             tickers = self.get_active_tickers()
+            streams = self.wanted_streams(tickers or [])
             
-            if not tickers:
-                print("⏸️ No hay posiciones abiertas, esperando...")
-                await asyncio.sleep(10)
+            if not streams:
+                if tickers is not None:
+                    print("⏸️ No hay posiciones crypto abiertas, esperando...")
+                await self.sleep_while_running(self.subscription_refresh)
                 continue
             
-            # Crear tareas para cada ticker
-            tasks = [self.connect_binance_websocket(ticker) for ticker in tickers]
-            
+            started_at = time.monotonic()
             try:
-                await asyncio.gather(*tasks, return_exceptions=True)
+                await self.run_combined_stream(streams)
             except Exception as e:
-                print(f"❌ Error en websocket loop: {str(e)}")
-                await asyncio.sleep(5)
+                self.stats['last_error'] = str(e)
+                print(f"❌ Error en Binance WebSocket: {str(e)}")
+                self.update_connection_status('Binance', 'disconnected', 0)
+            
+            if not self.running:
+                break
+            
+            # Una sesión estable resetea el backoff
+            if time.monotonic() - started_at >= self.reconnect_max:
+                attempt = 0
+            
+            delay = self.backoff_delay(attempt)
+            attempt += 1
+            self.stats['reconnects'] += 1
+            print(f"🔁 Reconectando a Binance en {delay:.1f}s (intento {attempt})")
+            await self.sleep_while_running(delay)
     
     def start(self):
         """Inicia el servicio de WebSocket en thread separado"""
@@ -213,9 +265,18 @@ class RealTimePriceService:
             self.thread.join(timeout=10)
         print("✅ WebSocket Service detenido")
     
+    def get_status(self):
+        return {
+            'running': self.running,
+            'connected': self.connected,
+            'url': self.base_url,
+            'streams': sorted(self.streams),
+            **self.stats
+        }
+    
     def get_last_prices(self):
-        """Retorna los últimos precios con colores"""
-        return self.last_prices
+        """Retorna los últimos precios con colores (desde el price cache)"""
+        return price_cache.snapshot()
 
 
 # Instancia global
@@ -0,0 +1,34 @@
+"""
+Shared fixtures: every test session runs against a throwaway SQLite file
+migrated to the latest schema (DATABASE_PATH is set before config is imported).
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_PATH'] = os.path.join(TMP_DIR, 'test.db')
+
+from database import get_db_connection, init_db  # noqa: E402
+
+
+@pytest.fixture(scope='session', autouse=True)
+def schema():
+    init_db()
+
+
+@pytest.fixture
+def db():
+    """Connection to the test database; rows from previous tests are wiped"""
+    conn = get_db_connection()
+    for table in ('ticker_cooldowns', 'slippage_records', 'webhook_queue', 'partial_closes', 'positions', 'trading_stats', 'bot_config', 'users'):
+        conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        conn.close()
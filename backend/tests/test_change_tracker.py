@@ -0,0 +1,39 @@
+from services.change_tracker import ChangeTracker
+from services.position_repricer import reprice_symbol
+
+
+def test_etag_changes_when_user_positions_change(db):
+    db.execute("INSERT INTO users (id, email, password_hash) VALUES (1, 'etag@test', 'x')")
+    db.commit()
+    tracker = ChangeTracker()
+
+    before = tracker.etag_for(1, '24h-p0')
+    assert before.startswith('u1-') and before.endswith('-24h-p0')
+    assert tracker.etag_for(1, '24h-p0') == before
+
+    db.execute('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, current_price, status)
+        VALUES (1, 'TESTUSD', 'BUY', 1, 100, 100, 'open')
+    ''')
+    db.commit()
+
+    assert tracker.etag_for(1, '24h-p0') != before
+
+
+def test_etag_ignores_price_ticks_but_not_closes(db):
+    db.execute("INSERT INTO users (id, email, password_hash) VALUES (1, 'etag@test', 'x')")
+    db.execute('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, current_price, status)
+        VALUES (1, 'TESTUSD', 'BUY', 1, 100, 100, 'open')
+    ''')
+    db.commit()
+    tracker = ChangeTracker()
+    before = tracker.etag_for(1)
+
+    reprice_symbol(db.cursor(), 'TESTUSD', 101.5)
+    db.commit()
+    assert tracker.etag_for(1) == before
+
+    db.execute("UPDATE positions SET status = 'closed' WHERE user_id = 1")
+    db.commit()
+    assert tracker.etag_for(1) != before
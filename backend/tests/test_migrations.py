@@ -0,0 +1,16 @@
+from database import connect
+from migrations.runner import LATEST_VERSION, MIGRATIONS, get_schema_version, run_migrations
+
+
+def test_schema_is_at_latest_version():
+    conn = connect()
+    try:
+        assert get_schema_version(conn) == LATEST_VERSION
+        versions = [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')]
+    finally:
+        conn.close()
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+
+def test_run_migrations_is_a_noop_when_up_to_date():
+    assert run_migrations() == []
@@ -0,0 +1,38 @@
+import importlib
+
+from services.price_cache import price_cache
+from services.price_monitor import PriceMonitor
+
+# services/__init__ re-exports the price_monitor instance under the module's name
+price_monitor_module = importlib.import_module('services.price_monitor')
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def yahoo_chart(price):
+    return FakeResponse({'chart': {'result': [{'meta': {'regularMarketPrice': price}}]}})
+
+
+def test_fetch_price_stock_falls_back_to_rest(monkeypatch):
+    monkeypatch.setattr(price_monitor_module, 'YFINANCE_AVAILABLE', False)
+    monkeypatch.setattr(price_monitor_module, 'REQUESTS_AVAILABLE', True)
+    monkeypatch.setattr(price_monitor_module.requests, 'get', lambda url, timeout: yahoo_chart(187.5))
+
+    assert PriceMonitor().fetch_price('AAPL') == (187.5, 'rest')
+
+
+def test_get_current_price_caches_rest_fallback(monkeypatch):
+    monkeypatch.setattr(price_monitor_module, 'YFINANCE_AVAILABLE', False)
+    monkeypatch.setattr(price_monitor_module, 'REQUESTS_AVAILABLE', True)
+    monkeypatch.setattr(price_monitor_module.requests, 'get', lambda url, timeout: yahoo_chart(412.25))
+
+    assert PriceMonitor().get_current_price('MSFTX') == 412.25
+    assert price_cache.get_price('MSFTX') == 412.25
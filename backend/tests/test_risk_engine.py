@@ -0,0 +1,115 @@
+import importlib
+import sqlite3
+
+import pytest
+
+from services.position_book import position_book
+from services.trading_engine import trading_engine
+
+trading_engine_module = importlib.import_module('services.trading_engine')
+
+AUTO_CLOSE_USER, MANUAL_USER = 1, 2
+
+
+@pytest.fixture(params=['numpy', 'scalar'])
+def risk_path(request, monkeypatch):
+    if request.param == 'scalar':
+        monkeypatch.setattr(trading_engine_module, 'NUMPY_AVAILABLE', False)
+    return request.param
+
+
+def seed(db, trailing_stop=None):
+    db.executemany("INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')",
+                   [(AUTO_CLOSE_USER, 'auto@test'), (MANUAL_USER, 'manual@test')])
+    db.executemany('''
+        INSERT INTO bot_config (user_id, is_active, demo_mode, auto_close_enabled,
+                                stop_loss_percent, take_profit_percent)
+        VALUES (?, 1, 1, ?, 3, 8)
+    ''', [(AUTO_CLOSE_USER, 1), (MANUAL_USER, 0)])
+    db.executemany("INSERT INTO trading_stats (user_id) VALUES (?)",
+                   [(AUTO_CLOSE_USER,), (MANUAL_USER,)])
+    db.executemany('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, current_price,
+                               trailing_stop, status)
+        VALUES (?, 'TESTUSD', 'BUY', 1, 100, 100, ?, 'open')
+    ''', [(AUTO_CLOSE_USER, trailing_stop), (MANUAL_USER, trailing_stop)])
+    db.commit()
+    position_book.load()
+
+
+def position_of(db, user_id):
+    return db.execute("SELECT * FROM positions WHERE user_id = ?", (user_id,)).fetchone()
+
+
+def test_risk_pass_uses_user_stop_loss(db, risk_path):
+    seed(db)
+
+    # 2.5% abajo: con el SL del usuario (3%) no cierra
+    trading_engine.update_symbol_risk('TESTUSD', 97.5)
+    position = position_of(db, AUTO_CLOSE_USER)
+    assert position['status'] == 'open'
+    assert position['trailing_stop'] == pytest.approx(97.0)
+
+    trading_engine.update_symbol_risk('TESTUSD', 96.5)
+    assert position_of(db, AUTO_CLOSE_USER)['status'] == 'closed'
+
+
+def test_risk_pass_skips_auto_close_disabled(db, risk_path):
+    seed(db)
+
+    for price in (102.5, 106.0, 90.0):
+        trading_engine.update_symbol_risk('TESTUSD', price)
+
+    position = position_of(db, MANUAL_USER)
+    assert position['status'] == 'open'
+    assert position['trailing_stop'] is None
+    assert not position['tp1_closed']
+    assert db.execute("SELECT COUNT(*) FROM partial_closes WHERE position_id = ?",
+                      (position['id'],)).fetchone()[0] == 0
+
+
+def test_risk_pass_partial_closes_at_user_take_profit(db, risk_path):
+    seed(db)
+
+    # TP1 al +2%; el TP del usuario es 8%, así que +5% ya no es TP2
+    trading_engine.update_symbol_risk('TESTUSD', 105.0)
+    position = position_of(db, AUTO_CLOSE_USER)
+    assert position['tp1_closed'] and not position['tp2_closed']
+    assert position['remaining_quantity'] == pytest.approx(0.5)
+
+
+def test_position_book_ignores_auto_close_disabled(db):
+    seed(db, trailing_stop=99.0)
+
+    triggered = position_book.check('TESTUSD', 98.0)
+    assert [position.user_id for position, _ in triggered] == [AUTO_CLOSE_USER]
+
+
+def test_rolled_back_close_keeps_position_in_book(db, monkeypatch):
+    seed(db)
+
+    def fail(*args):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(trading_engine, 'apply_risk_results', fail)
+
+    # 96 < SL (97): close_triggered_positions la cierra, pero la transacción se revierte
+    with pytest.raises(sqlite3.OperationalError):
+        trading_engine.update_symbol_risk('TESTUSD', 96.0)
+
+    assert position_of(db, AUTO_CLOSE_USER)['status'] == 'open'
+    assert [position.user_id for position, _ in position_book.check('TESTUSD', 96.0)] == [AUTO_CLOSE_USER]
+
+
+def test_risk_pass_syncs_new_positions_into_book(db, risk_path):
+    seed(db)
+    db.execute('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, current_price, status)
+        VALUES (?, 'TESTUSD', 'BUY', 1, 200, 200, 'open')
+    ''', (AUTO_CLOSE_USER,))
+    db.commit()
+
+    # Abierta después del load: sin sync el libro no la conoce y no cierra por su SL
+    trading_engine.update_symbol_risk('TESTUSD', 190.0)
+
+    closed = db.execute("SELECT close_reason FROM positions WHERE entry_price = 200").fetchone()
+    assert closed['close_reason'] == 'Stop Loss'
@@ -0,0 +1,125 @@
+import importlib
+import json
+import time
+from queue import Queue
+from threading import Thread
+
+import pytest
+
+from database import PoolTimeoutError
+from services.webhook_queue import WebhookQueue
+
+webhook_queue_module = importlib.import_module('services.webhook_queue')
+webhook_routes = importlib.import_module('routes.webhook')
+
+
+@pytest.fixture
+def queue():
+    queue = WebhookQueue(workers=1)
+    queue.retry_base = 0
+    return queue
+
+
+def add_job(db, ticker='TESTUSD'):
+    cursor = db.execute('''
+        INSERT INTO webhook_queue (ticker, payload, status, attempts, enqueued_at)
+        VALUES (?, ?, 'processing', 1, ?)
+    ''', (ticker, json.dumps({'ticker': ticker}), time.time()))
+    db.commit()
+    return (cursor.lastrowid, ticker, json.dumps({'ticker': ticker}), time.time())
+
+
+def job_row(db, job_id):
+    return db.execute("SELECT status, attempts, error FROM webhook_queue WHERE id = ?", (job_id,)).fetchone()
+
+
+def flaky(failures, error):
+    calls = []
+
+    def process_demo_trade(data):
+        calls.append(data)
+        if len(calls) <= failures:
+            raise error
+    return process_demo_trade, calls
+
+
+def test_transient_lock_is_retried(db, queue, monkeypatch):
+    fake, calls = flaky(2, webhook_queue_module.sqlite3.OperationalError('database is locked'))
+    monkeypatch.setattr(webhook_routes, 'process_demo_trade', fake)
+    job = add_job(db)
+
+    queue.process(job)
+
+    row = job_row(db, job[0])
+    assert (row['status'], row['attempts']) == ('done', 3)
+    assert len(calls) == 3
+    assert queue.stats['retried'] == 2 and queue.stats['failed'] == 0
+
+
+def test_pool_timeout_before_transaction_is_retried(db, queue, monkeypatch):
+    fake, calls = flaky(0, None)
+    monkeypatch.setattr(webhook_routes, 'process_demo_trade', fake)
+    real_get = webhook_queue_module.get_db_connection
+    failures = [PoolTimeoutError('Timed out waiting for a database connection')]
+
+    def get_db_connection(*args):
+        if failures:
+            raise failures.pop()
+        return real_get(*args)
+    monkeypatch.setattr(webhook_queue_module, 'get_db_connection', get_db_connection)
+    job = add_job(db)
+
+    queue.process(job)
+
+    assert job_row(db, job[0])['status'] == 'done'
+    assert len(calls) == 1
+
+
+def test_exhausted_retries_mark_failed(db, queue, monkeypatch):
+    fake, calls = flaky(100, webhook_queue_module.sqlite3.OperationalError('database is locked'))
+    monkeypatch.setattr(webhook_routes, 'process_demo_trade', fake)
+    job = add_job(db)
+
+    queue.process(job)
+
+    row = job_row(db, job[0])
+    assert row['status'] == 'failed'
+    assert len(calls) == queue.max_attempts
+    assert row['attempts'] == queue.max_attempts
+
+
+def test_non_retryable_error_fails_immediately(db, queue, monkeypatch):
+    fake, calls = flaky(1, ValueError('bad payload'))
+    monkeypatch.setattr(webhook_routes, 'process_demo_trade', fake)
+    job = add_job(db)
+
+    queue.process(job)
+
+    row = job_row(db, job[0])
+    assert (row['status'], row['error']) == ('failed', 'bad payload')
+    assert len(calls) == 1 and queue.stats['retried'] == 0
+
+
+def test_worker_survives_process_error(db, queue, monkeypatch):
+    fake, calls = flaky(0, None)
+    monkeypatch.setattr(webhook_routes, 'process_demo_trade', fake)
+    real_process = queue.process
+    failures = [webhook_queue_module.sqlite3.OperationalError('database is locked')]
+
+    def process(job):
+        if failures:
+            raise failures.pop()
+        real_process(job)
+    monkeypatch.setattr(queue, 'process', process)
+
+    jobs = Queue()
+    first, second = add_job(db), add_job(db)
+    for job in (first, second, None):
+        jobs.put(job)
+    worker = Thread(target=queue.worker_loop, args=(jobs,), daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive()
+    assert job_row(db, first[0])['status'] == 'processing'
+    assert job_row(db, second[0])['status'] == 'done'
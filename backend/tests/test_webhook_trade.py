@@ -0,0 +1,81 @@
+import importlib
+import json
+import sqlite3
+import time
+
+from services.webhook_queue import WebhookQueue
+
+webhook_routes = importlib.import_module('routes.webhook')
+
+
+def seed_demo_bot(db):
+    db.execute("INSERT INTO users (id, email, password_hash) VALUES (1, 'demo@test', 'x')")
+    db.execute('''
+        INSERT INTO bot_config (user_id, is_active, demo_mode, auto_close_enabled,
+                                stop_loss_percent, take_profit_percent, max_position_size)
+        VALUES (1, 1, 1, 1, 3, 8, 1000)
+    ''')
+    db.execute("INSERT INTO trading_stats (user_id) VALUES (1)")
+    db.execute('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, current_price, status)
+        VALUES (1, 'COOLUSD', 'BUY', 1, 100, 100, 'open')
+    ''')
+    db.commit()
+
+
+def enqueue_signal(db, signal, price):
+    payload = json.dumps({'ticker': 'COOLUSD', 'signal': signal, 'price': price})
+    cursor = db.execute('''
+        INSERT INTO webhook_queue (ticker, payload, status, attempts, enqueued_at)
+        VALUES ('COOLUSD', ?, 'processing', 1, ?)
+    ''', (payload, time.time()))
+    db.commit()
+    return (cursor.lastrowid, 'COOLUSD', payload, time.time())
+
+
+def test_retry_after_stop_loss_cooldown_still_opens_positions(db, monkeypatch):
+    seed_demo_bot(db)
+    real_open = webhook_routes.open_positions_for_signal
+    failures = [sqlite3.OperationalError('database is locked')]
+
+    def open_positions_for_signal(*args):
+        if failures:
+            raise failures.pop()
+        return real_open(*args)
+    monkeypatch.setattr(webhook_routes, 'open_positions_for_signal', open_positions_for_signal)
+
+    queue = WebhookQueue(workers=1)
+    queue.retry_base = 0
+    job = enqueue_signal(db, 'BUY', 96.0)
+
+    # 96 < SL (97): cierra por Stop Loss y activa cooldown; el primer open falla
+    queue.process(job)
+
+    assert not failures
+    assert db.execute("SELECT status FROM webhook_queue WHERE id = ?", (job[0],)).fetchone()[0] == 'done'
+    positions = db.execute("SELECT status, close_reason, entry_price FROM positions ORDER BY id").fetchall()
+    assert [tuple(p) for p in positions] == [('closed', 'Stop Loss', 100.0), ('open', None, 96.0)]
+    assert db.execute("SELECT COUNT(*) FROM ticker_cooldowns WHERE ticker = 'COOLUSD' AND is_active = 1"
+                      ).fetchone()[0] == 1
+
+
+def test_demo_trade_only_touches_active_demo_bots(db):
+    seed_demo_bot(db)
+    # Usuario 2: auto_close activo pero bot apagado -> el webhook no toca sus posiciones
+    db.execute("INSERT INTO users (id, email, password_hash) VALUES (2, 'idle@test', 'x')")
+    db.execute('''
+        INSERT INTO bot_config (user_id, is_active, demo_mode, auto_close_enabled,
+                                stop_loss_percent, take_profit_percent)
+        VALUES (2, 0, 1, 1, 3, 8)
+    ''')
+    db.execute("INSERT INTO trading_stats (user_id) VALUES (2)")
+    db.execute('''
+        INSERT INTO positions (user_id, symbol, side, quantity, entry_price, current_price, status)
+        VALUES (2, 'COOLUSD', 'BUY', 1, 100, 100, 'open')
+    ''')
+    db.commit()
+
+    webhook_routes.process_demo_trade({'ticker': 'COOLUSD', 'signal': 'ALERT', 'price': 96.0})
+
+    rows = db.execute("SELECT user_id, status, current_price FROM positions ORDER BY user_id").fetchall()
+    assert [tuple(r) for r in rows] == [(1, 'closed', 96.0), (2, 'open', 100.0)]
@@ -0,0 +1,134 @@
+"""
+Fake Binance combined-stream WebSocket server (pruebas offline)
+
+Soporta lo que usa RealTimePriceService:
+    - /stream?streams=btcusdt@trade/ethusdt@trade
+    - {"method": "SUBSCRIBE" | "UNSUBSCRIBE" | "LIST_SUBSCRIPTIONS", "params": [...], "id": n}
+    - mensajes {"stream": "btcusdt@trade", "data": {"e": "trade", "p": "...", ...}}
+
+Uso:
+    python tools/fake_binance_ws.py [--port 9443] [--rate 5] [--drop-every 0]
+    BINANCE_WS_URL=ws://localhost:9443 python app.py
+
+--drop-every N cierra cada conexión a los N segundos para probar la reconexión.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlparse, parse_qs
+
+import websockets
+
+BASE_PRICES = {
+    'btcusdt': 65000.0,
+    'ethusdt': 3200.0,
+    'bnbusdt': 580.0,
+    'solusdt': 150.0,
+    'xrpusdt': 0.55,
+    'adausdt': 0.45,
+    'dogeusdt': 0.15,
+}
+
+
+class FakeBinanceServer:
+    def __init__(self, rate, drop_every):
+        self.rate = rate
+        self.drop_every = drop_every
+        self.prices = {}
+        self.trade_id = 0
+
+    def next_trade(self, stream):
+        symbol = stream.split('@')[0]
+        price = self.prices.get(symbol, BASE_PRICES.get(symbol, 100.0))
+        price = max(price * (1 + random.gauss(0, 0.0005)), 0.0001)
+        self.prices[symbol] = price
+        self.trade_id += 1
+        return {
+            'stream': stream,
+            'data': {
+                'e': 'trade',
+                'E': int(time.time() * 1000),
+                's': symbol.upper(),
+                't': self.trade_id,
+                'p': f"{price:.8f}",
+                'q': f"{random.uniform(0.001, 1):.5f}",
+                'T': int(time.time() * 1000),
+            }
+        }
+
+    async def produce(self, websocket, subscribed):
+        while True:
+            for stream in list(subscribed):
+                await websocket.send(json.dumps(self.next_trade(stream)))
+            await asyncio.sleep(1 / self.rate)
+
+    async def consume(self, websocket, subscribed):
+        async for message in websocket:
+            request = json.loads(message)
+            method = request.get('method')
+            params = request.get('params', [])
+
+            if method == 'SUBSCRIBE':
+                subscribed.update(params)
+                result = None
+            elif method == 'UNSUBSCRIBE':
+                subscribed.difference_update(params)
+                result = None
+            elif method == 'LIST_SUBSCRIPTIONS':
+                result = sorted(subscribed)
+            else:
+                await websocket.send(json.dumps({
+                    'error': {'code': 2, 'msg': f"Invalid request: {method}"},
+                    'id': request.get('id')
+                }))
+                continue
+
+            print(f"📨 {method} {params} -> {sorted(subscribed)}")
+            await websocket.send(json.dumps({'result': result, 'id': request.get('id')}))
+
+    async def handler(self, websocket):
+        query = parse_qs(urlparse(websocket.path).query)
+        subscribed = set(filter(None, query.get('streams', [''])[0].split('/')))
+        print(f"🔌 Cliente conectado: {sorted(subscribed)}")
+
+        tasks = [
+            asyncio.ensure_future(self.produce(websocket, subscribed)),
+            asyncio.ensure_future(self.consume(websocket, subscribed)),
+        ]
+        if self.drop_every:
+            tasks.append(asyncio.ensure_future(asyncio.sleep(self.drop_every)))
+
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await websocket.close()
+            print("🔌 Cliente desconectado")
+
+
+async def serve(host, port, rate, drop_every):
+    server = FakeBinanceServer(rate, drop_every)
+    async with websockets.serve(server.handler, host, port):
+        print(f"🧪 Fake Binance WebSocket en ws://{host}:{port}/stream")
+        await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=9443)
+    parser.add_argument('--rate', type=float, default=5, help='trades por segundo y stream')
+    parser.add_argument('--drop-every', type=float, default=0, help='cerrar conexiones cada N segundos')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.rate, args.drop_every))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -38,8 +38,22 @@ export const api = {
         return response.json();
     },
 
-    getPositions: async (token) => {
-        const response = await fetch(`${API_BASE_URL}/dashboard/positions`, {
+    // Everything the dashboard loads in one request (stats, open positions, analytics,
+    // equity curve, connection, prices). The browser revalidates with If-None-Match and
+    // reuses its cached copy on 304, so unchanged reloads are cheap on both sides
+    getSnapshot: async (token, hours = 24) => {
+        const response = await fetch(`${API_BASE_URL}/dashboard/snapshot?hours=${hours}`, {
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
+        return response.json();
+    },
+
+    // params: { status: 'open' | 'closed' | 'all', symbol, limit, cursor } - default: open only
+    getPositions: async (token, params = {}) => {
+        const query = new URLSearchParams(
+            Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+        ).toString();
+        const response = await fetch(`${API_BASE_URL}/dashboard/positions${query ? `?${query}` : ''}`, {
             headers: { 'Authorization': `Bearer ${token}` }
         });
         return response.json();
@@ -132,8 +146,10 @@ export const api = {
         return response.json();
     },
 
-    getEquityCurve: async (token, hours = 24) => {
-        const response = await fetch(`${API_BASE_URL}/dashboard/equity-curve?hours=${hours}`, {
+    // maxPoints: server-side LTTB downsampling (long windows come from 1m/1h/1d rollups)
+    getEquityCurve: async (token, hours = 24, maxPoints = null) => {
+        const query = maxPoints ? `hours=${hours}&max_points=${maxPoints}` : `hours=${hours}`;
+        const response = await fetch(`${API_BASE_URL}/dashboard/equity-curve?${query}`, {
             headers: { 'Authorization': `Bearer ${token}` }
         });
         return response.json();
@@ -149,6 +165,11 @@ export const api = {
         return response.json();
     },
 
+    // Server-Sent Events push channel (see stream.js); EventSource cannot send headers
+    openStream: (token) => {
+        return new EventSource(`${API_BASE_URL}/dashboard/stream?token=${encodeURIComponent(token)}`);
+    },
+
     getPartialCloses: async (token, positionId) => {
         const response = await fetch(`${API_BASE_URL}/dashboard/partial-closes/${positionId}`, {
             headers: { 'Authorization': `Bearer ${token}` }
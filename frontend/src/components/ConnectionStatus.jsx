@@ -1,37 +1,37 @@
 import React, { useState, useEffect } from 'react';
+import { subscribeStream } from '../stream';
 import './ConnectionStatus.css';
 
 /**
  * LED Indicator de conexión con Exchange
  * Verde: Conectado | Rojo: Desconectado | Amarillo: Reconectando
+ * Estado por el stream SSE compartido (sin polling)
  */
-export default function ConnectionStatus({ api }) {
+export default function ConnectionStatus({ api, token }) {
     const [status, setStatus] = useState('disconnected');
     const [source, setSource] = useState('Unknown');
     const [latency, setLatency] = useState(0);
 
     useEffect(() => {
-        const checkConnection = async () => {
-            try {
-                const response = await api.getConnectionStatus();
-                
-                if (response.success) {
-                    setStatus(response.status);
-                    setSource(response.source);
-                    setLatency(response.latency_ms);
-                } else {
-                    setStatus('disconnected');
-                }
-            } catch (err) {
-                setStatus('error');
+        const applyStatus = (connection) => {
+            if (!connection) {
+                return;
             }
+            setStatus(connection.status);
+            setSource(connection.source);
+            setLatency(connection.latency_ms);
         };
 
-        checkConnection();
-        const interval = setInterval(checkConnection, 3000);
-
-        return () => clearInterval(interval);
-    }, []);
+        return subscribeStream(token, (type, data) => {
+            if (type === 'snapshot') {
+                applyStatus(data.connection);
+            } else if (type === 'connection') {
+                applyStatus(data);
+            } else if (type === 'error') {
+                setStatus('error');  // el stream reconecta solo y manda snapshot
+            }
+        });
+    }, [token]);
 
     const getStatusIcon = () => {
         switch (status) {
@@ -12,7 +12,8 @@ export default function EquityCurve({ api, token }) {
     useEffect(() => {
         const fetchEquityCurve = async () => {
             try {
-                const response = await api.getEquityCurve(token, 24);
+                // ~1 point per 2px of sparkline
+                const response = await api.getEquityCurve(token, 24, 100);
                 
                 if (response.success && response.equity_curve.length > 0) {
                     setEquityData(response.equity_curve);
@@ -1,53 +1,39 @@
 import React, { useState, useEffect } from 'react';
+import { subscribeStream } from '../stream';
 import './PriceTicker.css';
 
 /**
  * Price Ticker con colores en tiempo real
  * Verde si sube, Rojo si baja, Gris si sin cambio
+ * Precios por el stream SSE compartido (sin polling por ticker)
  */
 export default function PriceTicker({ ticker, api, token }) {
     const [price, setPrice] = useState(null);
     const [color, setColor] = useState('gray');
-    const [prevPrice, setPrevPrice] = useState(null);
 
     useEffect(() => {
-        const fetchPrice = async () => {
-            try {
-                const response = await api.getRealtimePrices(token);
-                if (response.success && response.prices[ticker]) {
-                    const priceData = response.prices[ticker];
-                    
-                    // Calcular color basado en precio anterior
-                    setPrice(prevPriceValue => {
-                        if (prevPriceValue !== null && prevPriceValue !== priceData.price) {
-                            if (priceData.price > prevPriceValue) {
-                                setColor('green');
-                            } else if (priceData.price < prevPriceValue) {
-                                setColor('red');
-                            }
-                        } else if (prevPriceValue === null) {
-                            setColor('gray');
-                        }
-                        
-                        setPrevPrice(priceData.price);
-                        return priceData.price;
-                    });
-                } else {
-                    console.warn(`No price data for ticker: ${ticker}`);
-                }
-            } catch (err) {
-                console.error('Error fetching real-time price:', err);
+        let prevPrice = null;
+
+        const applyPrice = (priceData) => {
+            if (!priceData) {
+                return;
+            }
+            // Calcular color basado en precio anterior
+            if (prevPrice !== null && prevPrice !== priceData.price) {
+                setColor(priceData.price > prevPrice ? 'green' : 'red');
+            } else if (prevPrice === null) {
+                setColor('gray');
             }
+            prevPrice = priceData.price;
+            setPrice(priceData.price);
         };
 
-        // Fetch inmediato
-        fetchPrice();
-
-        // Actualizar cada 2 segundos (más eficiente)
-        const interval = setInterval(fetchPrice, 2000);
-
-        return () => clearInterval(interval);
-    }, [ticker, api, token]);
+        return subscribeStream(token, (type, data) => {
+            if (type === 'snapshot' || type === 'prices') {
+                applyPrice((type === 'snapshot' ? data.prices : data)[ticker]);
+            }
+        });
+    }, [ticker, token]);
 
     if (!price) {
         return <span className="price-ticker loading">--</span>;
@@ -1,30 +1,77 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { api } from '../api';
+import { subscribeStream, applyPositionDelta, sortPositions } from '../stream';
 import PanicButton from '../components/PanicButton';
 
 export default function Dashboard({ token }) {
     const [stats, setStats] = useState(null);
     const [positions, setPositions] = useState([]);
+    const [closedPositions, setClosedPositions] = useState([]);
+    const [closedCursor, setClosedCursor] = useState(null);
+    const [closedHasMore, setClosedHasMore] = useState(false);
+    const [closedLoaded, setClosedLoaded] = useState(false);
+    const [loadingClosed, setLoadingClosed] = useState(false);
     const [webhooks, setWebhooks] = useState([]);
     const [loading, setLoading] = useState(true);
     const [lastUpdate, setLastUpdate] = useState(null);
 
+    const knownPositionIds = useRef(new Set());
+    const statsRefreshTimer = useRef(null);
+
     useEffect(() => {
         loadData();
-        // Reload data every 10 seconds
-        const interval = setInterval(loadData, 10000);
-        return () => clearInterval(interval);
-    }, []);
+        // Live prices/PnL/position changes are pushed over SSE (no polling);
+        // stats and webhooks are only re-fetched when a position opens or closes
+        const unsubscribe = subscribeStream(token, (type, data) => {
+            if (type === 'snapshot') {
+                setPositions(sortPositions(data.positions));
+                knownPositionIds.current = new Set(data.positions.map(pos => pos.id));
+                setLastUpdate(new Date());
+            } else if (type === 'positions') {
+                setPositions(current => applyPositionDelta(current, data));
+                const opened = data.upserted.some(pos => !knownPositionIds.current.has(pos.id));
+                data.upserted.forEach(pos => knownPositionIds.current.add(pos.id));
+                data.removed.forEach(id => knownPositionIds.current.delete(id));
+                if (opened || data.removed.length > 0) {
+                    scheduleStatsRefresh();
+                }
+                setLastUpdate(new Date());
+            }
+        });
+        return () => {
+            unsubscribe();
+            clearTimeout(statsRefreshTimer.current);
+        };
+    }, [token]);
+
+    // Coalesce bursts (one signal fans out to many positions) into one refresh
+    const scheduleStatsRefresh = () => {
+        if (statsRefreshTimer.current) {
+            return;
+        }
+        statsRefreshTimer.current = setTimeout(async () => {
+            statsRefreshTimer.current = null;
+            try {
+                const [snapshot, webhooksData] = await Promise.all([
+                    api.getSnapshot(token),
+                    api.getWebhooks(token)
+                ]);
+                setStats(snapshot.stats);
+                setWebhooks(webhooksData.webhooks || []);
+            } catch (err) {
+                console.error('Error refreshing stats:', err);
+            }
+        }, 1000);
+    };
 
     const loadData = async () => {
         try {
-            const [statsData, positionsData, webhooksData] = await Promise.all([
-                api.getStats(token),
-                api.getPositions(token),
+            const [snapshot, webhooksData] = await Promise.all([
+                api.getSnapshot(token),
                 api.getWebhooks(token)
             ]);
-            setStats(statsData);
-            setPositions(positionsData.positions || []);
+            setStats(snapshot.stats);
+            setPositions(snapshot.positions?.positions || []);
             setWebhooks(webhooksData.webhooks || []);
             setLastUpdate(new Date());
         } catch (err) {
@@ -34,6 +81,26 @@ export default function Dashboard({ token }) {
         }
     };
 
+    // Closed history is only fetched on demand, one keyset page at a time
+    const loadClosedPositions = async (reset = false) => {
+        try {
+            setLoadingClosed(true);
+            const page = await api.getPositions(token, {
+                status: 'closed',
+                limit: 50,
+                cursor: reset ? null : closedCursor
+            });
+            setClosedPositions(reset ? (page.positions || []) : [...closedPositions, ...(page.positions || [])]);
+            setClosedCursor(page.next_cursor || null);
+            setClosedHasMore(Boolean(page.has_more));
+            setClosedLoaded(true);
+        } catch (err) {
+            console.error('Error loading closed positions:', err);
+        } finally {
+            setLoadingClosed(false);
+        }
+    };
+
     const handleToggleBot = async () => {
         try {
             setLoading(true);
@@ -60,6 +127,9 @@ export default function Dashboard({ token }) {
         try {
             await api.closePosition(token, positionId);
             await loadData(); // Reload positions
+            if (closedLoaded) {
+                await loadClosedPositions(true);
+            }
         } catch (err) {
             alert(err.message || 'Failed to close position');
         }
@@ -157,7 +227,7 @@ export default function Dashboard({ token }) {
                 </div>
                 <div className="stat-card">
                     <h3>Closed Positions</h3>
-                    <div className="value">{positions.filter(p => p.status === 'closed').length}</div>
+                    <div className="value">{stats?.closed_positions || 0}</div>
                 </div>
             </div>
 
@@ -234,7 +304,7 @@ export default function Dashboard({ token }) {
             <div className="card">
                 <h2>Active Positions</h2>
                 {positions.length === 0 ? (
-                    <p>No positions yet</p>
+                    <p>No open positions</p>
                 ) : (
                     <table className="positions-table">
                         <thead>
@@ -321,6 +391,68 @@ export default function Dashboard({ token }) {
                     </table>
                 )}
             </div>
+
+            <div className="card">
+                <h2>Closed Positions</h2>
+                {!closedLoaded ? (
+                    <button onClick={() => loadClosedPositions(true)} className="btn" disabled={loadingClosed}>
+                        {loadingClosed ? 'Loading...' : `Load closed history (${stats?.closed_positions || 0})`}
+                    </button>
+                ) : closedPositions.length === 0 ? (
+                    <p>No closed positions</p>
+                ) : (
+                    <>
+                        <table className="positions-table">
+                            <thead>
+                                <tr>
+                                    <th>Symbol</th>
+                                    <th>Side</th>
+                                    <th>Qty</th>
+                                    <th>Entry</th>
+                                    <th>Exit</th>
+                                    <th>PnL</th>
+                                    <th>Closed At</th>
+                                </tr>
+                            </thead>
+                            <tbody>
+                                {closedPositions.map((pos) => {
+                                    const pnl = pos.pnl || 0;
+                                    return (
+                                        <tr key={pos.id} style={{ backgroundColor: '#f5f5f5' }}>
+                                            <td><strong>{pos.symbol}</strong></td>
+                                            <td>
+                                                <span style={{
+                                                    color: pos.side === 'BUY' ? '#28a745' : '#dc3545',
+                                                    fontWeight: 'bold'
+                                                }}>
+                                                    {pos.side}
+                                                </span>
+                                            </td>
+                                            <td>{pos.quantity}</td>
+                                            <td>${pos.entry_price?.toFixed(2)}</td>
+                                            <td>${pos.current_price?.toFixed(2)}</td>
+                                            <td style={{ color: pnl >= 0 ? '#28a745' : '#dc3545', fontWeight: 'bold' }}>
+                                                {pnl >= 0 ? '+' : ''}${pnl.toFixed(2)}
+                                            </td>
+                                            <td>{pos.closed_at ? new Date(pos.closed_at).toLocaleString() : '-'}</td>
+                                        </tr>
+                                    );
+                                })}
+                            </tbody>
+                        </table>
+                        {closedHasMore && (
+                            <button
+                                onClick={() => loadClosedPositions(false)}
+                                className="btn"
+                                disabled={loadingClosed}
+                                style={{ marginTop: '1rem' }}
+                            >
+                                {loadingClosed ? 'Loading...' : 'Load more'}
+                            </button>
+                        )}
+                    </>
+                )}
+            </div>
         </div>
     );
 }
@@ -1,5 +1,6 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { api } from '../api';
+import { subscribeStream, applyPositionDelta, sortPositions } from '../stream';
 import ConnectionStatus from '../components/ConnectionStatus';
 import EquityCurve from '../components/EquityCurve';
 import PriceTicker from '../components/PriceTicker';
@@ -12,24 +13,65 @@ export default function Dashboard({ token }) {
     const [loading, setLoading] = useState(true);
     const [lastUpdate, setLastUpdate] = useState(null);
 
+    const knownPositionIds = useRef(new Set());
+    const statsRefreshTimer = useRef(null);
+
     useEffect(() => {
         loadData();
-        // Reload data every 10 seconds
-        const interval = setInterval(loadData, 10000);
-        return () => clearInterval(interval);
-    }, []);
+        // Live prices/PnL/position changes are pushed over SSE (no polling);
+        // stats, analytics and webhooks are only re-fetched when a position opens or closes
+        const unsubscribe = subscribeStream(token, (type, data) => {
+            if (type === 'snapshot') {
+                setPositions(sortPositions(data.positions));
+                knownPositionIds.current = new Set(data.positions.map(pos => pos.id));
+                setLastUpdate(new Date());
+            } else if (type === 'positions') {
+                setPositions(current => applyPositionDelta(current, data));
+                const opened = data.upserted.some(pos => !knownPositionIds.current.has(pos.id));
+                data.upserted.forEach(pos => knownPositionIds.current.add(pos.id));
+                data.removed.forEach(id => knownPositionIds.current.delete(id));
+                if (opened || data.removed.length > 0) {
+                    scheduleStatsRefresh();
+                }
+                setLastUpdate(new Date());
+            }
+        });
+        return () => {
+            unsubscribe();
+            clearTimeout(statsRefreshTimer.current);
+        };
+    }, [token]);
+
+    // Coalesce bursts (one signal fans out to many positions) into one refresh
+    const scheduleStatsRefresh = () => {
+        if (statsRefreshTimer.current) {
+            return;
+        }
+        statsRefreshTimer.current = setTimeout(async () => {
+            statsRefreshTimer.current = null;
+            try {
+                const [snapshot, webhooksData] = await Promise.all([
+                    api.getSnapshot(token),
+                    api.getWebhooks(token)
+                ]);
+                setStats(snapshot.stats);
+                setAnalytics(snapshot.analytics || {});
+                setWebhooks(webhooksData.webhooks || []);
+            } catch (err) {
+                console.error('Error refreshing stats:', err);
+            }
+        }, 1000);
+    };
 
     const loadData = async () => {
         try {
-            const [statsData, analyticsData, positionsData, webhooksData] = await Promise.all([
-                api.getStats(token),
-                api.getAdvancedAnalytics(token),
-                api.getPositions(token),
+            const [snapshot, webhooksData] = await Promise.all([
+                api.getSnapshot(token),
                 api.getWebhooks(token)
             ]);
-            setStats(statsData);
-            setAnalytics(analyticsData.analytics || {});
-            setPositions(positionsData.positions || []);
+            setStats(snapshot.stats);
+            setAnalytics(snapshot.analytics || {});
+            setPositions(snapshot.positions?.positions || []);
             setWebhooks(webhooksData.webhooks || []);
             setLastUpdate(new Date());
         } catch (err) {
@@ -68,7 +110,7 @@ export default function Dashboard({ token }) {
             <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '1rem' }}>
                 <h1>Trading Dashboard</h1>
                 <div style={{ display: 'flex', gap: '1rem', alignItems: 'center' }}>
-                    <ConnectionStatus api={api} />
+                    <ConnectionStatus api={api} token={token} />
                     <button 
                         onClick={loadData} 
                         className="btn" 
@@ -0,0 +1,97 @@
+import { api } from './api';
+
+/**
+ * Dashboard push channel (Server-Sent Events)
+ * One EventSource per tab shared by every component (PriceTicker, ConnectionStatus,
+ * dashboards) instead of one polling timer each. The latest prices/connection are
+ * kept here so a component that mounts later renders immediately.
+ *
+ * Events: snapshot {prices, positions, connection} on (re)connect, then deltas:
+ * prices {symbol: price}, positions {upserted, removed}, connection {...}
+ */
+let source = null;
+let sourceToken = null;
+const listeners = new Set();
+const state = { prices: {}, connection: null, positions: null };
+
+const emit = (type, data) => {
+    listeners.forEach(listener => listener(type, data));
+};
+
+const open = (token) => {
+    source = api.openStream(token);
+    sourceToken = token;
+
+    source.addEventListener('snapshot', (e) => {
+        const data = JSON.parse(e.data);
+        state.prices = data.prices || {};
+        state.connection = data.connection;
+        state.positions = data.positions || [];
+        emit('snapshot', data);
+    });
+    source.addEventListener('prices', (e) => {
+        const data = JSON.parse(e.data);
+        state.prices = { ...state.prices, ...data };
+        emit('prices', data);
+    });
+    source.addEventListener('positions', (e) => {
+        const data = JSON.parse(e.data);
+        state.positions = applyPositionDelta(state.positions || [], data);
+        emit('positions', data);
+    });
+    source.addEventListener('connection', (e) => {
+        state.connection = JSON.parse(e.data);
+        emit('connection', state.connection);
+    });
+    // EventSource reconnects by itself; the server sends a fresh snapshot
+    source.onerror = () => emit('error', null);
+};
+
+const close = () => {
+    if (source) {
+        source.close();
+    }
+    source = null;
+    sourceToken = null;
+    state.prices = {};
+    state.connection = null;
+    state.positions = null;
+};
+
+/**
+ * listener(type, data) for 'snapshot' | 'prices' | 'positions' | 'connection' | 'error'
+ * Returns the unsubscribe function (the stream closes with the last listener).
+ */
+export function subscribeStream(token, listener) {
+    if (source && sourceToken !== token) {
+        close();
+    }
+    listeners.add(listener);
+    if (!source) {
+        open(token);
+    } else if (state.positions !== null) {
+        listener('snapshot', { prices: state.prices, positions: state.positions, connection: state.connection });
+    }
+
+    return () => {
+        listeners.delete(listener);
+        if (listeners.size === 0) {
+            close();
+        }
+    };
+}
+
+// Merge a positions delta into a list (REST rows keep their extra columns)
+export function applyPositionDelta(positions, delta) {
+    const removed = new Set(delta.removed);
+    const byId = new Map(positions.filter(pos => !removed.has(pos.id)).map(pos => [pos.id, pos]));
+    delta.upserted.forEach(pos => byId.set(pos.id, { ...byId.get(pos.id), ...pos }));
+    return sortPositions([...byId.values()]);
+}
+
+// Newest positions first, like GET /dashboard/positions
+export function sortPositions(positions) {
+    return [...positions].sort((a, b) =>
+        (b.opened_at || '').localeCompare(a.opened_at || '') || b.id - a.id
+    );
+}